@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Maintenance of the incident analytics rollups.
+
+The rollups behind /api/analytics/incidents are kept up to date as
+incidents are recorded, reviewed and deleted. Run --backfill once after
+upgrading (incidents recorded before the rollups existed are not counted
+yet) or after editing the incidents table by hand, and --verify to compare
+the rollups with a full scan of the incidents table.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path to import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, db, analytics
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify the incident analytics rollups')
+    parser.add_argument('--backfill', action='store_true', help='Rebuild the rollups from the incidents table')
+    parser.add_argument('--verify', action='store_true', help='Compare the rollups with a full scan of the incidents table')
+    args = parser.parse_args()
+    if not (args.backfill or args.verify):
+        parser.error('choose --backfill and/or --verify')
+    
+    with app.app_context():
+        db.create_all()
+        
+        if args.backfill:
+            start = time.perf_counter()
+            count = analytics.backfill()
+            print(f"Rollups rebuilt from {count} incidents in {time.perf_counter() - start:.2f} s")
+        
+        if args.verify:
+            mismatches = analytics.verify()
+            for key, stored, expected in mismatches[:20]:
+                print(f"Mismatch {key}: stored {stored}, expected {expected}")
+            if mismatches:
+                print(f"{len(mismatches)} rollup rows differ from the incidents table")
+                return 1
+            print("Rollups match the incidents table")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Offline violence analysis for recorded footage.
+
+Video files are split into segments that are decoded and scored in parallel
+by a pool of worker processes, with batched model inference and no annotation
+or JPEG encoding. Scores are then smoothed with the same state machine as the
+live pipeline and written out as a timeline with detected incident intervals.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from utils.detector import ViolenceDetector
+from utils.smoothing import TemporalSmoother
+from utils.calibration import safe_name, save_scores
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+
+# Detector instance owned by each worker process
+_worker_detector = None
+
+def _init_worker(model_path):
+    """Load the model once per worker process."""
+    global _worker_detector
+    _worker_detector = ViolenceDetector(model_path, face_detection=False)
+
+def collect_videos(paths):
+    """
+    Expand files and directories into a sorted list of video files.
+    
+    Args:
+        paths: Files or directories given on the command line
+    
+    Returns:
+        videos: List of video file paths
+    """
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"Skipping missing path: {path}")
+    return videos
+
+def probe_video(video_path):
+    """Get (frame_count, fps) for a video file."""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        return 0, 0.0
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    capture.release()
+    return frame_count, fps
+
+def plan_segments(video_path, segment_seconds, stride=1):
+    """
+    Split a video into frame ranges of roughly segment_seconds each.
+    
+    Segment lengths are a multiple of stride, so every segment starts on a
+    scored frame and scored frames stay evenly spaced across boundaries.
+    
+    Returns:
+        segments: List of (video_path, start_frame, end_frame) tuples
+        frame_count: Total frames in the video
+        fps: Frames per second reported by the container
+    """
+    frame_count, fps = probe_video(video_path)
+    if frame_count <= 0:
+        return [], frame_count, fps
+    
+    segment_frames = max(1, int(round(segment_seconds * fps / stride))) * stride
+    segments = [(video_path, start, min(start + segment_frames, frame_count))
+                for start in range(0, frame_count, segment_frames)]
+    return segments, frame_count, fps
+
+def seek(capture, video_path, frame):
+    """
+    Position a capture exactly at a frame.
+    
+    Many codecs only seek to a nearby keyframe, so the position is read back
+    and the capture decodes forward to the frame when it landed before it.
+    When it landed after the frame (or the position cannot be read), the file
+    is reopened and read forward from the start.
+    
+    Returns:
+        capture: The capture positioned at frame (possibly a new one)
+    """
+    if not frame:
+        return capture
+    capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    position = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+    if not 0 <= position <= frame:
+        capture.release()
+        capture = cv2.VideoCapture(video_path)
+        position = 0
+    for _ in range(frame - position):
+        if not capture.grab():
+            break
+    return capture
+
+def analyze_segment(video_path, start_frame, end_frame, stride=1, batch_size=32):
+    """
+    Score every stride-th frame of a segment (runs inside a worker process).
+    
+    Args:
+        video_path: Video file to read
+        start_frame: First frame of the segment
+        end_frame: Frame after the last one in the segment
+        stride: Score one frame in every stride frames
+        batch_size: Frames per model call
+    
+    Returns:
+        frame_indices: List of scored frame numbers
+        scores: List of violence probabilities
+    
+    Raises:
+        RuntimeError: If the worker could not load the model (scores would all be 0)
+    """
+    detector = _worker_detector
+    if detector.model is None:
+        raise RuntimeError("the model could not be loaded")
+    capture = seek(cv2.VideoCapture(video_path), video_path, start_frame)
+    
+    frame_indices = []
+    scores = []
+    batch = []
+    batch_indices = []
+    
+    for index in range(start_frame, end_frame):
+        # grab() skips the decode for frames that will not be scored; the phase is
+        # global so it does not restart at segment boundaries
+        if index % stride:
+            if not capture.grab():
+                break
+            continue
+        
+        success, frame = capture.read()
+        if not success:
+            break
+        
+        batch.append(detector.preprocess_frame(frame))
+        batch_indices.append(index)
+        
+        if len(batch) == batch_size:
+            scores.extend(detector.predict_batch(batch).tolist())
+            frame_indices.extend(batch_indices)
+            batch = []
+            batch_indices = []
+    
+    if batch:
+        scores.extend(detector.predict_batch(batch).tolist())
+        frame_indices.extend(batch_indices)
+    
+    capture.release()
+    return frame_indices, scores
+
+def build_timeline(frame_indices, scores, fps, smoother_settings):
+    """
+    Smooth raw scores and extract incident intervals.
+    
+    Args:
+        frame_indices: Scored frame numbers in ascending order
+        scores: Raw violence probabilities
+        fps: Video frame rate, used to convert frames to seconds
+        smoother_settings: Keyword arguments for TemporalSmoother
+    
+    Returns:
+        timeline: List of per-frame dictionaries
+        incidents: List of {start, end, peak_confidence} dictionaries (seconds)
+    """
+    smoother = TemporalSmoother(**smoother_settings)
+    timeline = []
+    incidents = []
+    current = None
+    
+    for frame_index, score in zip(frame_indices, scores):
+        seconds = frame_index / fps
+        confidence, state = smoother.update('video', score, now=seconds)
+        timeline.append({
+            'frame': frame_index,
+            'time': round(seconds, 3),
+            'score': round(float(score), 4),
+            'confidence': round(confidence, 4),
+            'state': state
+        })
+        
+        if state == 'ALERT':
+            if current is None:
+                current = {'start': round(seconds, 3), 'end': round(seconds, 3), 'peak_confidence': confidence}
+            current['end'] = round(seconds, 3)
+            current['peak_confidence'] = max(current['peak_confidence'], confidence)
+        elif current is not None:
+            current['peak_confidence'] = round(current['peak_confidence'], 4)
+            incidents.append(current)
+            current = None
+    
+    if current is not None:
+        current['peak_confidence'] = round(current['peak_confidence'], 4)
+        incidents.append(current)
+    
+    return timeline, incidents
+
+def analyze_videos(videos, model_path='models/modelnew.h5', workers=None, segment_seconds=60,
+                   stride=1, batch_size=32, smoother_settings=None):
+    """
+    Analyze a set of video files with a process pool.
+    
+    Returns:
+        results: Dictionary keyed by video path with timeline, incidents and timing
+        summary: Totals, including failed_segments (segments that could not be scored)
+    """
+    smoother_settings = smoother_settings or {}
+    workers = workers or os.cpu_count() or 1
+    
+    plans = {}
+    segments = []
+    for video_path in videos:
+        video_segments, frame_count, fps = plan_segments(video_path, segment_seconds, stride)
+        if not video_segments:
+            print(f"Could not read {video_path}, skipping")
+            continue
+        plans[video_path] = {'frames': frame_count, 'fps': fps, 'parts': {}}
+        segments.extend(video_segments)
+    
+    start_time = time.time()
+    failed = 0
+    
+    # Spawned workers avoid inheriting a forked TensorFlow runtime
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = {
+            pool.submit(analyze_segment, video_path, start, end, stride, batch_size): (video_path, start)
+            for video_path, start, end in segments
+        }
+        for future in as_completed(futures):
+            video_path, start = futures[future]
+            try:
+                plans[video_path]['parts'][start] = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error analyzing {video_path} from frame {start}: {e}")
+    
+    elapsed = time.time() - start_time
+    
+    results = {}
+    for video_path, plan in plans.items():
+        frame_indices = []
+        scores = []
+        for start in sorted(plan['parts']):
+            indices, segment_scores = plan['parts'][start]
+            frame_indices.extend(indices)
+            scores.extend(segment_scores)
+        
+        timeline, incidents = build_timeline(frame_indices, scores, plan['fps'], smoother_settings)
+        duration = plan['frames'] / plan['fps'] if plan['fps'] else 0.0
+        results[video_path] = {
+            'fps': plan['fps'],
+            'frames': plan['frames'],
+            'duration': round(duration, 3),
+            'incidents': incidents,
+            'timeline': timeline
+        }
+    
+    total_duration = sum(result['duration'] for result in results.values())
+    summary = {
+        'videos': len(results),
+        'footage_seconds': round(total_duration, 3),
+        'analysis_seconds': round(elapsed, 3),
+        'speedup': round(total_duration / elapsed, 2) if elapsed else 0.0,
+        'failed_segments': failed
+    }
+    return results, summary
+
+def write_json(output_path, results, summary):
+    """Write results and summary as a single JSON document."""
+    with open(output_path, 'w') as f:
+        json.dump({'summary': summary, 'videos': results}, f, indent=2)
+
+def write_csv(output_path, results):
+    """Write the timeline to output_path and incidents to <output>_incidents.csv."""
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Video', 'Frame', 'Time', 'Score', 'Confidence', 'State'])
+        for video_path, result in results.items():
+            for row in result['timeline']:
+                writer.writerow([video_path, row['frame'], row['time'], row['score'],
+                                 row['confidence'], row['state']])
+    
+    incidents_path = os.path.splitext(output_path)[0] + '_incidents.csv'
+    with open(incidents_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Video', 'Start', 'End', 'Peak Confidence'])
+        for video_path, result in results.items():
+            for incident in result['incidents']:
+                writer.writerow([video_path, incident['start'], incident['end'], incident['peak_confidence']])
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyze recorded video files for violence')
+    parser.add_argument('paths', nargs='+', help='Video files or directories')
+    parser.add_argument('--model', default='models/modelnew.h5', help='Path to the trained model')
+    parser.add_argument('--output', default='analysis.json', help='Output file (.json or .csv)')
+    parser.add_argument('--format', choices=['json', 'csv'], default=None, help='Output format (default: from extension)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--segment-seconds', type=float, default=60, help='Length of the segments handed to workers')
+    parser.add_argument('--stride', type=int, default=1, help='Score one frame in every N')
+    parser.add_argument('--batch-size', type=int, default=32, help='Frames per model call')
+    parser.add_argument('--history-size', type=int, default=10, help='Smoothing window in scored frames')
+    parser.add_argument('--warning-threshold', type=float, default=0.70, help='Confidence that enters WARNING')
+    parser.add_argument('--alert-threshold', type=float, default=0.85, help='Confidence that enters ALERT')
+    parser.add_argument('--save-scores', default=None, metavar='DIR',
+                        help='Also write each video\'s raw scores to DIR/<video>.npy for calibrate.py')
+    
+    args = parser.parse_args()
+    if not os.path.isfile(args.model):
+        parser.error(f"model not found: {args.model}")
+    
+    videos = collect_videos(args.paths)
+    if not videos:
+        print("No videos to analyze")
+        return 1
+    
+    smoother_settings = {
+        'history_size': args.history_size,
+        'warning_threshold': args.warning_threshold,
+        'alert_threshold': args.alert_threshold
+    }
+    
+    print(f"Analyzing {len(videos)} video(s)...")
+    results, summary = analyze_videos(videos, args.model, args.workers, args.segment_seconds,
+                                      max(1, args.stride), args.batch_size, smoother_settings)
+    
+    # Gaps in the timeline would read as footage without violence
+    if summary['failed_segments']:
+        print(f"{summary['failed_segments']} segment(s) could not be analyzed; no results written")
+        return 1
+    
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'json')
+    if output_format == 'csv':
+        write_csv(args.output, results)
+    else:
+        write_json(args.output, results, summary)
+    
+    if args.save_scores:
+        os.makedirs(args.save_scores, exist_ok=True)
+        for video_path, result in results.items():
+            name = safe_name(os.path.splitext(os.path.basename(video_path))[0])
+            save_scores(os.path.join(args.save_scores, f"{name}.npy"),
+                        [point['time'] for point in result['timeline']],
+                        [point['score'] for point in result['timeline']])
+        print(f"Scores written to {args.save_scores}")
+    
+    for video_path, result in results.items():
+        print(f"{os.path.basename(video_path)}: {len(result['incidents'])} incident(s) "
+              f"in {result['duration']:.1f}s of footage")
+    print(f"Analyzed {summary['footage_seconds']:.1f}s of footage in {summary['analysis_seconds']:.1f}s "
+          f"({summary['speedup']}x real time)")
+    print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
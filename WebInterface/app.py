@@ -1,34 +1,74 @@
-from flask import Flask, render_template, Response, request, jsonify, redirect, url_for, flash
-import cv2
 import os
+import hmac
+import base64
+
+# ASYNC_MODE=gevent serves every viewer and Socket.IO client as a greenlet
+# instead of a thread; patching has to happen before anything else is imported
+ASYNC_MODE = os.environ.get('ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import Flask, render_template, Response, request, jsonify, redirect, url_for, flash, send_from_directory, has_request_context
+import re
+import itertools
+import cv2
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import numpy as np
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
-from threading import Thread
-from flask_socketio import SocketIO, emit
+from threading import Thread, Lock
+from flask_socketio import SocketIO, emit, join_room
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+from sqlalchemy.engine import Engine
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash
+from werkzeug.security import generate_password_hash, safe_join
 from utils.camera import Camera
 from utils.detector import ViolenceDetector
+from utils.sequence import SequenceViolenceDetector
 from utils.notifier import EmailNotifier, Notification, NotificationManager
-from models import db, User, Camera as CameraModel, Incident as IncidentModel, Face as FaceModel
+from utils.streaming import FramePacket, encode_frame, encode_jpeg, message_frame, scale_to_width
+from utils.export import incidents_to_csv
+from utils.metrics import metrics
+from utils.sources import open_source, parse_source
+from utils.faces import FaceStore
+from utils.face_index import FaceEmbedder, FaceIndex
+from utils.media import MediaStore
+from utils.enhance import FaceEnhancer, enhanced_path
+from utils.privacy import PrivacyFilter, blur_regions
+from utils.snapshot import SnapshotCache
+from utils.hub import IMAGE, FrameHub, run_blocking
+from utils.mosaic import MAX_TILES, MosaicProducer, mosaic_id, parse_size
+from utils.ws_stream import SocketFrameStream, stream_width
+from utils.retention import RetentionService
+from utils.cache import TTLCache
+from utils.registry import ModelRegistry, ModelSwitcher
+from utils.event_log import EventLog
+from utils.analytics import IncidentAnalytics
+from utils.calibration import ScoreRecorder
+from utils.workers import CameraSupervisor, STATE_SEVERITY, decode_jpeg
+from utils.correlation import IncidentCorrelator
+from models import db, User, Camera as CameraModel, Incident as IncidentModel, Face as FaceModel, IncidentRollup
+from models import IncidentEvidence as IncidentEvidenceModel
 from forms import LoginForm, RegistrationForm, CameraForm, ProfileForm
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Request bodies are forms and edge agent events; larger ones are refused with 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
 
 # Initialize database
 db.init_app(app)
 
 # Initialize Socket.IO
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
 # Initialize login manager
 login_manager = LoginManager()
@@ -36,12 +76,52 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
+# Users loaded per request are cached, so status polls and stream connections
+# skip the user query; routes changing a user invalidate its entry
+user_cache = TTLCache('users', max_size=int(os.environ.get('USER_CACHE_SIZE', 1024)),
+                      ttl=float(os.environ.get('USER_CACHE_TTL', 60)))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        # Keep a detached copy: commits in this request must not expire the cached one
+        db.session.expunge(user)
+        user_cache.put(user_id, user)
+    # Attach a per-request copy to this session without querying, so routes can still modify it
+    return db.session.merge(user, load=False)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count database queries per request endpoint (background work counts as 'background')."""
+    endpoint = (request.endpoint or 'unknown') if has_request_context() else 'background'
+    metrics.db_queries_total.inc(endpoint=endpoint)
+
+# Initialize the violence detector (DETECTOR_MODE=sequence enables the temporal head)
+if os.environ.get('DETECTOR_MODE', 'frame') == 'sequence':
+    detector = SequenceViolenceDetector(
+        window_size=int(os.environ.get('SEQUENCE_WINDOW', 16))
+    )
+else:
+    detector = ViolenceDetector()
 
-# Initialize the violence detector
-detector = ViolenceDetector()
+# Per-camera confidence samples and state transitions, written in batches off the detection loop
+event_log = EventLog(os.environ.get('EVENT_LOG_PATH', 'event_log.db'),
+                     sample_interval=float(os.environ.get('EVENT_LOG_SAMPLE_INTERVAL', 1.0)),
+                     max_age_days=float(os.environ.get('EVENT_LOG_DAYS', 30)))
+detector.event_log = event_log
+
+# Raw per-frame scores for offline threshold calibration (calibrate.py), when SCORE_RECORD_DIR is set
+if os.environ.get('SCORE_RECORD_DIR'):
+    detector.score_recorder = ScoreRecorder(os.environ['SCORE_RECORD_DIR'])
+
+# Available model variants; switching loads and warms the new one in the background
+model_registry = ModelRegistry(os.environ.get('MODELS_DIR', 'models'))
+model_switcher = ModelSwitcher(model_registry, detector, socketio.start_background_task)
 
 # Dictionary to store registered cameras
 cameras = {}
@@ -49,6 +129,216 @@ cameras = {}
 # Dictionary to store incidents
 incidents = []
 
+# Incident ids stay unique even after retention removes older incidents and across restarts
+incident_counter = None
+incident_counter_lock = Lock()
+
+def new_incident_id():
+    """Next incident id, continuing after the highest one stored in the database."""
+    global incident_counter
+    with incident_counter_lock:
+        if incident_counter is None:
+            with app.app_context():
+                stored = [external_id for (external_id,) in
+                          db.session.query(IncidentModel.external_id).filter(IncidentModel.external_id.like('incident_%'))]
+            numbers = [int(external_id[len('incident_'):]) for external_id in stored + [i['id'] for i in incidents]
+                       if external_id[len('incident_'):].isdigit()]
+            incident_counter = itertools.count(max(numbers, default=0) + 1)
+        return f"incident_{next(incident_counter)}"
+
+# Searchable index of face embeddings across incident history
+try:
+    face_index = FaceIndex(os.environ.get('FACE_INDEX_DIR', os.path.join(app.instance_path, 'face_index')),
+                           FaceEmbedder(os.environ.get('FACE_EMBEDDING_MODEL', 'models/face_recognition_sface.onnx')))
+except Exception as e:
+    print(f"Face search disabled: {e}")
+    face_index = None
+
+# Blur faces on outgoing streams (raw frames are still used for incident evidence)
+privacy_blur = os.environ.get('PRIVACY_BLUR', '').lower() in ('1', 'true', 'yes')
+
+# Latest still of every streaming camera, served by /cameras/<id>/snapshot.jpg
+snapshots = SnapshotCache(interval=float(os.environ.get('SNAPSHOT_INTERVAL', 0.5)))
+
+# Content-addressed incident and face images with background thumbnails
+media = MediaStore(os.path.join('static', 'uploads'))
+
+# Background enhancement of saved face crops (stored next to each crop as .enhanced.jpg)
+face_enhancer = FaceEnhancer(os.path.join('static', 'uploads'),
+                             sharpen=float(os.environ.get('IMAGE_ENHANCEMENT_LEVEL', 1.3)))
+
+# Deduplicating store for incident face crops
+face_store = FaceStore(os.path.join('static', 'uploads'), face_index=face_index, media=media)
+
+# Incidents from cameras at the same location (or grouped/adjacent in CORRELATION_CONFIG) within
+# CORRELATION_WINDOW seconds of each other are merged into one incident; 0 turns merging off
+correlator = IncidentCorrelator.from_file(os.environ.get('CORRELATION_CONFIG'),
+                                          window=float(os.environ.get('CORRELATION_WINDOW', 30)))
+
+def gigabytes(name):
+    """Read an optional size limit in GB from the environment, as bytes."""
+    value = os.environ.get(name)
+    return int(float(value) * 1024 ** 3) if value else None
+
+def sync_incident_row(incident, moves):
+    """Keep database rows in step with files moved by the retention service."""
+    with app.app_context():
+        row = IncidentModel.query.filter_by(external_id=incident['id']).first()
+        if row is None:
+            return
+        row.image_path = incident.get('image_path')
+        for face in row.faces:
+            face.image_path = moves.get(face.image_path, face.image_path)
+        for evidence in row.evidence:
+            relative = (evidence.image_path or '')[len('uploads/'):]
+            if relative in moves:
+                evidence.image_path = 'uploads/' + moves[relative]
+        db.session.commit()
+
+def delete_incident_row(incident):
+    """Delete the database rows of an incident removed by the retention service."""
+    with app.app_context():
+        row = IncidentModel.query.filter_by(external_id=incident['id']).first()
+        if row is None:
+            return
+        for face in row.faces:
+            db.session.delete(face)
+        for evidence in row.evidence:
+            db.session.delete(evidence)
+        analytics.delete(row)
+
+def find_camera_row(incident, camera_id):
+    """Database row of the camera an incident comes from, added if new (inside an app context)."""
+    camera = cameras.get(camera_id, {})
+    name = camera.get('name', incident['location'])
+    url = camera.get('url', '0' if camera_id == 'webcam' else camera_id)
+    camera_row = CameraModel.query.filter_by(name=name, url=url).first()
+    if camera_row is None:
+        camera_row = CameraModel(name=name, url=url, location=camera.get('location', incident.get('camera_location', '')),
+                                 status='active')
+        db.session.add(camera_row)
+    return camera_row
+
+def save_incident_row(incident, camera_id):
+    """Store a recorded incident, its faces and its camera in the database and count it in the rollups."""
+    with app.app_context():
+        camera_row = find_camera_row(incident, camera_id)
+        
+        row = IncidentModel(
+            external_id=incident['id'],
+            timestamp=datetime.utcfromtimestamp(incident['created_at']),
+            location=incident['location'],
+            camera=camera_row,
+            image_path=incident.get('image_path'),
+            faces_detected=incident['faces_detected'],
+            confidence_score=incident.get('confidence')
+        )
+        row.faces = [FaceModel(image_path=path) for path in incident['face_paths']]
+        analytics.add(row)
+
+def save_evidence_row(primary, incident, camera_id, evidence, face_paths):
+    """Store another camera's evidence and new faces under the database row of the incident it was merged into."""
+    with app.app_context():
+        row = IncidentModel.query.filter_by(external_id=primary['id']).first()
+        if row is None:
+            return
+        row.evidence.append(IncidentEvidenceModel(
+            camera=find_camera_row(incident, camera_id),
+            timestamp=datetime.utcfromtimestamp(evidence['created_at']),
+            location=evidence['location'],
+            image_path=evidence['image_path'],
+            confidence_score=evidence.get('confidence')
+        ))
+        row.faces.extend(FaceModel(image_path=path) for path in face_paths)
+        row.faces_detected = primary['faces_detected']
+        db.session.commit()
+
+def relative_upload(path):
+    """Path of a stored image relative to static/uploads."""
+    return path[len('uploads/'):] if path.startswith('uploads/') else path
+
+def incident_from_row(row):
+    """In-memory incident dict of a stored incident."""
+    created_at = row.timestamp.replace(tzinfo=pytz.utc).timestamp()
+    incident = {
+        'id': row.external_id,
+        'timestamp': datetime.fromtimestamp(created_at, pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S'),
+        'location': row.location,
+        'created_at': created_at,
+        'image_path': row.image_path,
+        'confidence': row.confidence_score,
+        'reviewed': bool(row.reviewed),
+        'faces_detected': bool(row.faces_detected),
+        'face_paths': [face.image_path for face in row.faces]
+    }
+    if row.evidence:
+        incident['evidence'] = [{
+            'location': evidence.location,
+            'created_at': evidence.timestamp.replace(tzinfo=pytz.utc).timestamp(),
+            'timestamp': evidence.timestamp.replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S'),
+            'image_path': evidence.image_path,
+            'confidence': evidence.confidence_score
+        } for evidence in row.evidence]
+    return incident
+
+def load_incidents():
+    """Fill the incident list from the database (at startup, before retention runs)."""
+    with app.app_context():
+        rows = (IncidentModel.query.options(selectinload(IncidentModel.faces), selectinload(IncidentModel.evidence))
+                .order_by(IncidentModel.timestamp).all())
+        known = {incident['id'] for incident in incidents}
+        incidents[:0] = [incident_from_row(row) for row in rows if row.external_id not in known]
+    print(f"Loaded {len(rows)} incidents from the database")
+
+def stored_incident_files():
+    """Upload paths the incident, face and evidence rows refer to (kept by the orphan sweep)."""
+    with app.app_context():
+        paths = [path for (path,) in db.session.query(IncidentModel.image_path)]
+        paths += [path for (path,) in db.session.query(FaceModel.image_path)]
+        paths += [path for (path,) in db.session.query(IncidentEvidenceModel.image_path)]
+    return {relative_upload(path) for path in paths if path}
+
+# Incident counts per hour/day, camera and review status for the dashboard charts
+analytics = IncidentAnalytics(db, IncidentRollup, IncidentModel, CameraModel)
+
+# Retention and compaction of static/uploads (started with the app)
+retention = RetentionService(
+    os.path.join('static', 'uploads'), incidents,
+    media=media, face_store=face_store, face_index=face_index,
+    max_bytes=gigabytes('RETENTION_MAX_GB'),
+    camera_max_bytes=gigabytes('RETENTION_CAMERA_MAX_GB'),
+    max_age_days=float(os.environ.get('RETENTION_DAYS', 30)),
+    reviewed_max_age_days=float(os.environ.get('RETENTION_REVIEWED_DAYS', 180)),
+    recompress_after_days=float(os.environ.get('RETENTION_RECOMPRESS_DAYS', 7)),
+    interval=float(os.environ.get('RETENTION_INTERVAL', 3600)),
+    on_update=sync_incident_row,
+    on_delete=delete_incident_row,
+    stored_files=stored_incident_files
+)
+
+# Content-addressed file names (see MediaStore) never change, so they can be cached forever
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{20}(\.\w+)?\.\w+$')
+# Raw content-addressed face crop stem, the only source /media renders an enhanced copy of
+RAW_FACE_STEM = re.compile(r'^[0-9a-f]{20}$')
+
+@app.template_global()
+def media_url(path, kind=None):
+    """
+    URL for a stored incident or face image.
+    
+    Args:
+        path: Image path relative to static/uploads (a leading 'uploads/' is accepted)
+        kind: Thumbnail kind (see utils.media.THUMBNAIL_SIZES), 'enhanced' for the
+            enhanced copy of a face, or None for the full image
+    """
+    if path.startswith('uploads/'):
+        path = path[len('uploads/'):]
+    if kind == 'enhanced':
+        path = enhanced_path(path)
+    elif kind:
+        path = media.thumbnail_path(path, kind)
+    return url_for('media_file', filename=path)
+
 # Initialize notification manager
 notification_manager = NotificationManager()
 
@@ -84,6 +374,7 @@ def login():
             # Update last login time
             user.last_login = datetime.utcnow()
             db.session.commit()
+            user_cache.invalidate(user.id)
             
             # Redirect to the requested page or the index page
             next_page = request.args.get('next')
@@ -95,6 +386,8 @@ def login():
 
 @app.route('/logout')
 def logout():
+    if current_user.is_authenticated:
+        user_cache.invalidate(current_user.id)
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
@@ -164,6 +457,7 @@ def profile():
         
         # Save changes
         db.session.commit()
+        user_cache.invalidate(current_user.id)
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('profile'))
     
@@ -183,19 +477,112 @@ def camera_page():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html', cameras=cameras)
+    # ?transport=websocket streams the feeds over Socket.IO instead of MJPEG
+    stream_transport = 'websocket' if request.args.get('transport') == 'websocket' else 'mjpeg'
+    # ?view=mosaic shows every camera in one server-composed stream
+    mosaic = request.args.get('view') == 'mosaic'
+    return render_template('dashboard.html', cameras=cameras, stream_transport=stream_transport, mosaic=mosaic)
 
 @app.route('/incidents')
 @login_required
 def view_incidents():
     return render_template('incidents.html', incidents=incidents)
 
+def stream_privacy(raw_requested):
+    """Whether a stream for the current user is blurred (admins may ask for raw frames)."""
+    return privacy_blur and not (current_user.is_admin and raw_requested)
+
+@app.template_global()
+def media_privacy():
+    """
+    Whether stored incident media is redacted for the current user.
+    
+    The stream rule applied to evidence: with PRIVACY_BLUR, raw incident frames
+    and face crops are for admins, so others get pixelated incident images and
+    no faces.
+    """
+    return stream_privacy(True)
+
+def is_face_media(filename):
+    """Whether an uploads path is a face crop or derived from one (thumbnail, enhanced copy)."""
+    return filename.startswith(('faces/', 'thumbs/faces/'))
+
 @app.route('/video_feed')
 @login_required
 def video_feed():
     """Video streaming route."""
     camera_id = request.args.get('camera_id', 'webcam')
-    return Response(gen_frames(camera_id),
+    privacy = stream_privacy(request.args.get('raw') == '1')
+    return Response(gen_frames(camera_id, privacy),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/cameras/<camera_id>/snapshot.jpg')
+@login_required
+def camera_snapshot(camera_id):
+    """
+    Latest still of a camera, served from memory without touching the camera.
+    
+    Snapshots are taken while the camera is being streamed. Supports
+    If-None-Match/If-Modified-Since, ?width= (snapped to the stream widths)
+    and ?raw=1 for admins when privacy blur is on.
+    """
+    if camera_id != 'webcam' and camera_id not in cameras:
+        return Response('Camera not found\n', status=404, mimetype='text/plain')
+    
+    width = stream_width(request.args.get('width', 0, type=int))
+    snapshot = run_blocking(snapshots.get, camera_id, width, stream_privacy(request.args.get('raw') == '1'))
+    if snapshot is None:
+        # Nothing has streamed this camera since startup
+        response = Response('No snapshot yet\n', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    jpeg, timestamp, etag = snapshot
+    response = Response(jpeg, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.last_modified = datetime.utcfromtimestamp(timestamp)
+    response.headers['X-Snapshot-Age'] = f"{max(0.0, time.time() - timestamp):.1f}"
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/cameras/<camera_id>/timeline')
+@login_required
+def camera_timeline(camera_id):
+    """A camera's confidence samples and state transitions between two epoch-millisecond times."""
+    try:
+        end = int(request.args.get('end', time.time() * 1000))
+        start = int(request.args.get('start', end - 3600 * 1000))
+        limit = min(int(request.args.get('limit', 10000)), 100000)
+    except ValueError:
+        return jsonify({'error': 'start, end and limit must be integers'}), 400
+    if start >= end or limit < 1:
+        return jsonify({'error': 'start must be before end and limit positive'}), 400
+    
+    return jsonify(event_log.timeline(camera_id, start, end, limit))
+
+@app.route('/mosaic_feed')
+@login_required
+def mosaic_feed():
+    """
+    Stream several cameras composed into one grid.
+    
+    Query parameters: cameras (comma-separated ids, default all; at most
+    MAX_TILES), size (WIDTHxHEIGHT, default 1280x720) and raw=1 (admins,
+    unblurred).
+    """
+    requested = request.args.get('cameras')
+    # Repeated ids would only add tiles (and a producer per distinct list)
+    camera_ids = (list(dict.fromkeys(camera_id for camera_id in requested.split(',') if camera_id in cameras))
+                  if requested else list(cameras)[:MAX_TILES])
+    if not camera_ids:
+        return jsonify({'success': False, 'message': 'No cameras selected'}), 404
+    if len(camera_ids) > MAX_TILES:
+        return jsonify({'success': False, 'message': f'A mosaic shows at most {MAX_TILES} cameras'}), 400
+    
+    variant = 'private' if stream_privacy(request.args.get('raw') == '1') else 'raw'
+    channel_id = mosaic_id(variant, parse_size(request.args.get('size')), camera_ids)
+    return Response(gen_mosaic(channel_id, variant),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/api/status')
@@ -204,7 +591,11 @@ def get_status():
     """API endpoint to get current detection status."""
     # Get current detector state (if available)
     try:
-        current_state = detector.current_state.lower() if hasattr(detector, 'current_state') else 'monitoring'
+        current_state = detector.current_state if hasattr(detector, 'current_state') else 'MONITORING'
+        if camera_supervisor is not None:
+            # Cameras analyzed in worker processes count too; report the most severe state
+            current_state = max([current_state, *camera_supervisor.states().values()], key=STATE_SEVERITY.get)
+        current_state = current_state.lower()
         
         # Get the most recent incident
         last_incident = incidents[-1] if incidents else None
@@ -222,6 +613,170 @@ def get_status():
             'alert_count': len(incidents)
         })
 
+@app.route('/media/<path:filename>')
+@login_required
+def media_file(filename):
+    """Serve incident images and thumbnails with long-lived caching for content-addressed names."""
+    uploads_dir = os.path.join(app.root_path, 'static', 'uploads')
+    full_path = safe_join(uploads_dir, filename)
+    if full_path is None:
+        return Response('Not found\n', status=404, mimetype='text/plain')
+    
+    if media_privacy() and is_face_media(filename):
+        return Response('Face images are only available to administrators\n', status=403, mimetype='text/plain')
+    
+    # Thumbnails and enhanced faces not yet rendered by the background workers are rendered now
+    if not os.path.exists(full_path):
+        if filename.startswith('faces/') and filename.endswith('.enhanced.jpg'):
+            # Only raw crops: enhancing an enhanced copy would chain new files the retention sweep never removes
+            stem = filename[:-len('.enhanced.jpg')]
+            rendered = (RAW_FACE_STEM.match(os.path.basename(stem)) is not None
+                        and face_enhancer.render(stem + '.jpg'))
+        else:
+            source = media.source_for_thumbnail(filename)
+            rendered = source is not None and media.render_thumbnail(*source)
+        if not rendered:
+            return Response('Not found\n', status=404, mimetype='text/plain')
+    
+    if media_privacy():
+        # Pixelated whole, like a private snapshot without face tracks; never cached, since
+        # the same URL serves the raw image to admins
+        image = cv2.imread(full_path)
+        jpeg = encode_jpeg(blur_regions(image, [(0, 0, image.shape[1], image.shape[0])])) if image is not None else None
+        if not jpeg:
+            return Response('Not found\n', status=404, mimetype='text/plain')
+        response = Response(jpeg, mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    
+    name = os.path.basename(filename)
+    if not CONTENT_ADDRESSED.match(name):
+        # Legacy names such as incident_1.jpg can be reused, so always revalidate
+        response = send_from_directory(uploads_dir, filename, max_age=0)
+    else:
+        # Evidence is only for logged-in users: browsers may keep it, shared caches must not
+        response = send_from_directory(uploads_dir, filename, max_age=31536000, etag=name)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+    if privacy_blur:
+        # Users sharing a browser get different bytes for the same URL
+        response.vary.add('Cookie')
+    return response
+
+@app.route('/api/faces/similar')
+@login_required
+def similar_faces():
+    """API endpoint to find faces from other incidents that resemble a saved face."""
+    face_path = request.args.get('path', '')
+    k = min(max(request.args.get('k', 12, type=int), 1), 100)
+    
+    if face_index is None:
+        return jsonify({'error': 'Face search is not available'}), 503
+    if media_privacy():
+        return jsonify({'error': 'Face search is only available to administrators'}), 403
+    
+    start = time.perf_counter()
+    results = face_index.similar_to(face_path, k)
+    if results is None:
+        return jsonify({'error': 'Face is not indexed'}), 404
+    
+    for result in results:
+        result['url'] = media_url(result['path'])
+        result['thumbnail_url'] = media_url(result['path'], 'face')
+    
+    return jsonify({
+        'query': face_path,
+        'results': results,
+        'indexed_faces': len(face_index),
+        # False when the SFace model is missing and faces are compared by appearance only
+        'embedding_model': face_index.embedder.name,
+        'identity_search': face_index.embedder.identity,
+        'search_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+def bearer_token_matches(token):
+    """Whether the request carries `Authorization: Bearer <token>`, compared in constant time."""
+    header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(header.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Pipeline metrics in the Prometheus text exposition format."""
+    # Scrapers cannot log in, so they present METRICS_TOKEN as a bearer token; without
+    # a token configured only logged-in users can read the metrics
+    token = os.environ.get('METRICS_TOKEN')
+    if not current_user.is_authenticated and not (token and bearer_token_matches(token)):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# Largest base64 image accepted from an edge agent (the whole event is also capped by MAX_CONTENT_LENGTH)
+EDGE_MAX_IMAGE_BYTES = int(os.environ.get('EDGE_MAX_IMAGE_BYTES', 4 * 1024 * 1024))
+# Oldest and furthest-in-the-future start times accepted from an edge agent, in seconds from now
+# (agents retry for minutes, and their clocks may be slightly off)
+EDGE_MAX_EVENT_AGE = float(os.environ.get('EDGE_MAX_EVENT_AGE', 86400))
+EDGE_MAX_CLOCK_SKEW = float(os.environ.get('EDGE_MAX_CLOCK_SKEW', 300))
+
+def decode_image(data):
+    """Decode base64 JPEG text from an edge event (None if invalid or too large)."""
+    if not isinstance(data, str) or len(data) > EDGE_MAX_IMAGE_BYTES:
+        return None
+    try:
+        buffer = np.frombuffer(base64.b64decode(data, validate=True), dtype=np.uint8)
+    except (TypeError, ValueError):
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+
+@app.route('/api/edge/incidents', methods=['POST'])
+def edge_incident():
+    """Record an incident reported by an edge agent (edge_agent.py)."""
+    # Agents cannot log in, so they authenticate with the shared EDGE_TOKEN; unset disables the endpoint
+    token = os.environ.get('EDGE_TOKEN')
+    if not token:
+        return jsonify({'error': 'Edge agents are not enabled'}), 404
+    if not bearer_token_matches(token):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    image = decode_image(data.get('image'))
+    if image is None:
+        return jsonify({'error': f'image must be a base64 JPEG of at most {EDGE_MAX_IMAGE_BYTES} bytes'}), 400
+    
+    device_id = str(data.get('device_id') or 'edge')[:64]
+    camera_id = f"edge:{device_id}"
+    now = time.time()
+    try:
+        created_at = float(data.get('started_at') or now)
+        confidence = float(data.get('confidence') or 0.0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'started_at and confidence must be numbers'}), 400
+    if not (np.isfinite(created_at) and now - EDGE_MAX_EVENT_AGE <= created_at <= now + EDGE_MAX_CLOCK_SKEW):
+        return jsonify({'error': f'started_at must be an epoch time within {EDGE_MAX_EVENT_AGE:.0f} s before '
+                                 f'and {EDGE_MAX_CLOCK_SKEW:.0f} s after the server time'}), 400
+    if not (np.isfinite(confidence) and 0.0 <= confidence <= 1.0):
+        return jsonify({'error': 'confidence must be between 0 and 1'}), 400
+    
+    # Crops arrive already cut out, so each one is a single full-size detection
+    crops = []
+    for encoded in (data.get('faces') or [])[:10]:
+        crop = decode_image(encoded)
+        if crop is not None:
+            height, width = crop.shape[:2]
+            crops.append((crop, [{'box': [0, 0, width, height], 'confidence': 1.0}]))
+    
+    try:
+        incident = record_reported_incident(camera_id, str(data.get('camera_name') or device_id)[:100], created_at,
+                                            image, crops, source='edge', device_id=device_id,
+                                            camera_location=str(data.get('location') or '')[:200],
+                                            confidence=confidence)
+    except Exception as e:
+        print(f"Error saving edge incident: {e}")
+        return jsonify({'error': 'Could not save incident'}), 500
+    
+    print(f"Edge incident recorded: {incident['id']} from {device_id}")
+    return jsonify({'id': incident['id']}), 201
+
 @app.route('/add_camera', methods=['POST'])
 @login_required
 def add_camera():
@@ -233,6 +788,12 @@ def add_camera():
     if not all([camera_name, camera_url, camera_location]):
         return jsonify({'success': False, 'message': 'Missing required fields'})
     
+    # Virtual source parameters size what the source allocates, so bounds are checked up front
+    try:
+        parse_source(camera_url)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     camera_id = f"camera_{len(cameras) + 1}"
     cameras[camera_id] = {
         'id': camera_id,
@@ -241,35 +802,53 @@ def add_camera():
         'location': camera_location,
         'status': 'active'
     }
+    if camera_supervisor is not None:
+        camera_supervisor.add_camera(camera_id, camera_url)
     
     return redirect(url_for('dashboard'))
 
+@app.route('/incidents/<incident_id>/review', methods=['POST'])
+@login_required
+def review_incident(incident_id):
+    """Mark an incident as reviewed."""
+    incident = next((i for i in incidents if i['id'] == incident_id), None)
+    row = IncidentModel.query.filter_by(external_id=incident_id).first()
+    if incident is None and row is None:
+        return jsonify({'error': 'Incident not found'}), 404
+    
+    if row is not None:
+        analytics.review(row, current_user.id)
+    if incident is not None:
+        incident['reviewed'] = True
+    return jsonify({'success': True, 'id': incident_id})
+
+@app.route('/api/analytics/incidents')
+@login_required
+def incident_analytics():
+    """Chart data from the incident rollups: incidents and review latency per hour, day, camera or location."""
+    group = request.args.get('by', 'hour')
+    try:
+        days = float(request.args.get('days', 2 if group == 'hour' else 30))
+    except ValueError:
+        return jsonify({'error': 'days must be a number'}), 400
+    if not 0 < days <= 366:
+        return jsonify({'error': 'days must be between 0 and 366'}), 400
+    
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    try:
+        rows = analytics.chart(group, start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'by': group, 'start': start.isoformat() + 'Z', 'end': end.isoformat() + 'Z', 'rows': rows})
+
 @app.route('/export_incidents', methods=['GET'])
 @login_required
 def export_incidents():
     """Export incidents as CSV file."""
-    import csv
-    from io import StringIO
-    
-    # Create a CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['ID', 'Timestamp', 'Location', 'Faces Detected'])
-    
-    # Write data
-    for incident in incidents:
-        writer.writerow([
-            incident['id'],
-            incident['timestamp'],
-            incident['location'],
-            'Yes' if incident.get('faces_detected', False) else 'No'
-        ])
-    
     # Prepare response
     response = Response(
-        output.getvalue(),
+        incidents_to_csv(incidents),
         mimetype='text/csv',
         headers={
             'Content-Disposition': 'attachment; filename=incidents_report.csv',
@@ -279,6 +858,74 @@ def export_incidents():
     
     return response
 
+@app.route('/api/retention')
+@login_required
+def retention_status():
+    """API endpoint reporting the last retention pass (admins only)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify({
+        'last_report': retention.last_report,
+        'interval': retention.interval
+    })
+
+@app.route('/api/workers')
+@login_required
+def worker_status():
+    """API endpoint listing the camera worker processes, their cameras and load (admins only)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    if camera_supervisor is None:
+        return jsonify({'enabled': False, 'workers': []})
+    return jsonify(dict(camera_supervisor.status(), enabled=True))
+
+@app.route('/api/correlation')
+@login_required
+def correlation_status():
+    """API endpoint with the incident correlation settings, open groups and recent merge decisions (admins only)."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify(correlator.status())
+
+@app.route('/api/models')
+@login_required
+def list_models():
+    """API endpoint listing the model variants, the active one and any switch in progress."""
+    return jsonify({
+        'active': detector.model_name,
+        'switch': model_switcher.status,
+        'variants': model_registry.list()
+    })
+
+@app.route('/api/models/activate', methods=['POST'])
+@login_required
+def activate_model():
+    """
+    API endpoint switching the detection model without restarting (admins only).
+    
+    Accepts {"name": variant} or {"budget_ms": milliseconds per frame} to pick
+    the most accurate variant within a latency budget.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        if data.get('budget_ms') is not None:
+            started = model_switcher.auto_select(float(data['budget_ms']))
+        else:
+            model_registry.refresh()
+            started = model_switcher.activate(data.get('name', ''))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not started:
+        return jsonify({'error': 'A model switch is already in progress', 'switch': model_switcher.status}), 409
+    return jsonify({'switch': model_switcher.status}), 202
+
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def notification_settings():
@@ -338,6 +985,7 @@ def toggle_admin(user_id):
     
     user.is_admin = not user.is_admin
     db.session.commit()
+    user_cache.invalidate(user.id)
     
     flash(f"Admin status for {user.username} has been {'granted' if user.is_admin else 'revoked'}.", 'success')
     return redirect(url_for('admin_users'))
@@ -359,12 +1007,355 @@ def delete_user(user_id):
     
     db.session.delete(user)
     db.session.commit()
+    user_cache.invalidate(user_id)
     
     flash(f"User {user.username} has been deleted.", 'success')
     return redirect(url_for('admin_users'))
 
-def gen_frames(camera_id='webcam'):
-    """Generate frames from the specified camera."""
+def gen_frames(camera_id='webcam', privacy=False):
+    """
+    Generate frames from the specified camera.
+    
+    Every viewer of a camera streams from the same producer through the frame
+    hub, so adding viewers does not add capture, detection or encoding work.
+    
+    Args:
+        camera_id: Registered camera id, or 'webcam'
+        privacy: Blur faces in the streamed frames
+    """
+    if camera_id != 'webcam' and camera_id not in cameras:
+        # Return a default frame if camera not found
+        yield encode_frame(message_frame("Camera not found"))
+        return
+    for packet in frame_hub.frames(camera_id, ('private' if privacy else 'raw', None)):
+        metrics.stream_frames_sent_total.inc(camera=camera_id, transport='mjpeg')
+        yield packet.mjpeg
+
+def gen_mosaic(channel_id, variant):
+    """Stream a mosaic to one viewer; viewers of the same mosaic share its producer."""
+    for packet in mosaic_hub.frames(channel_id, (variant, None)):
+        metrics.stream_frames_sent_total.inc(camera='mosaic', transport='mjpeg')
+        yield packet.mjpeg
+
+def record_incident(incident, image, camera_id):
+    """
+    Save, list and announce a finished incident.
+    
+    Shared by the camera producers, the camera workers and the edge agent
+    endpoint. Faces must already be in face_store under the incident's id.
+    An incident the correlator relates to one just recorded by another
+    camera is added to that incident as evidence instead (see
+    merge_incident).
+    
+    Args:
+        incident: Incident dict (id, timestamp, location, camera_id, created_at, ...)
+        image: Representative BGR frame of the incident
+        camera_id: Camera label for metrics
+    
+    Returns:
+        incident: The recorded incident, or the one it was merged into
+    """
+    camera = cameras.get(camera_id, {})
+    group, merged = correlator.correlate(incident, {
+        'id': camera_id,
+        'name': camera.get('name', incident['location']),
+        'location': camera.get('location', incident.get('camera_location', ''))
+    }, incident['created_at'], incident.get('ended_at', incident['created_at']))
+    if merged:
+        return merge_incident(group, incident, image, camera_id)
+    try:
+        record_new_incident(incident, image, camera_id)
+    except Exception:
+        if group is not None:
+            correlator.discard(group)
+        raise
+    finally:
+        if group is not None:
+            group['ready'].set()
+    return incident
+
+def broadcast_incident(event, payload):
+    """
+    Send an incident event to every dashboard.
+    
+    With PRIVACY_BLUR, face crops are evidence for admins only (see
+    media_privacy), so only the admins room gets the face URLs.
+    """
+    if not privacy_blur:
+        socketio.emit(event, payload)
+        return
+    socketio.emit(event, payload, to='admins')
+    socketio.emit(event, dict(payload, face_urls=[]), to='viewers')
+
+def record_new_incident(incident, image, camera_id):
+    """Save, list, notify and broadcast an incident (see record_incident)."""
+    # Save the incident image under its content address
+    with metrics.timer('disk_write', camera_id):
+        incident['image_path'] = 'uploads/' + run_blocking(media.save_image, image, timestamp=incident['created_at'])
+    
+    # Save one face crop per person, linking faces already on disk
+    with metrics.timer('disk_write', camera_id):
+        incident['face_paths'] = run_blocking(face_store.commit, incident['id'])
+    incident['faces_detected'] = bool(incident['face_paths'])
+    
+    # Add to incidents list and the database
+    incidents.append(incident)
+    metrics.incidents_total.inc(camera=camera_id)
+    try:
+        run_blocking(save_incident_row, incident, camera_id)
+    except Exception as e:
+        print(f"Error saving incident to database: {e}")
+    
+    # Send notifications through all enabled channels
+    notification_start = time.perf_counter()
+    notification = notification_manager.send_notification(incident)
+    
+    # Prepare face image URLs if faces were detected
+    face_urls = []
+    if incident['faces_detected'] and incident['face_paths']:
+        for face_path in incident['face_paths']:
+            try:
+                face_url = media_url(face_path, 'face')
+                face_urls.append(face_url)
+            except Exception as e:
+                print(f"Error creating face URL: {e}")
+    
+    # Emit WebSocket event for real-time notification
+    try:
+        broadcast_incident('incident_alert', {
+            'id': incident['id'],
+            'timestamp': incident['timestamp'],
+            'location': incident['location'],
+            'image_url': media_url(incident['image_path'], 'list'),
+            'full_image_url': media_url(incident['image_path']),
+            'faces_detected': incident['faces_detected'],
+            'face_urls': face_urls
+        })
+    except Exception as e:
+        print(f"Error sending WebSocket notification: {e}")
+    metrics.observe_stage('notification', camera_id, time.perf_counter() - notification_start)
+    
+    # Enhance the incident's faces in the background, after the alert is out
+    face_enhancer.submit(incident['face_paths'], camera_id)
+
+def merge_incident(group, incident, image, camera_id):
+    """
+    Add an incident to the related incident recorded before it, without a new alert.
+    
+    The image is kept as an evidence entry of the primary incident and the
+    faces are committed under the primary incident, so the operator sees
+    every camera's view in one place and nobody is notified twice.
+    
+    Returns:
+        primary: The incident the evidence was added to
+    """
+    primary = group['incident']
+    # The primary incident's camera may still be saving it
+    if not group['ready'].wait(timeout=60):
+        print(f"Incident {primary['id']} was not saved in time, merging {incident['id']} anyway")
+    if group.get('failed'):
+        record_new_incident(incident, image, camera_id)
+        return incident
+    
+    with metrics.timer('disk_write', camera_id):
+        image_path = 'uploads/' + run_blocking(media.save_image, image, timestamp=incident['created_at'])
+    
+    # Faces join the primary incident; people already seen by another camera link to the same crop
+    face_store.transfer(incident['id'], primary['id'])
+    with metrics.timer('disk_write', camera_id):
+        face_paths = [path for path in run_blocking(face_store.commit, primary['id'])
+                      if path not in primary['face_paths']]
+    primary['face_paths'] = primary['face_paths'] + face_paths
+    primary['faces_detected'] = bool(primary['face_paths'])
+    
+    evidence = {
+        'camera_id': camera_id,
+        'location': incident['location'],
+        'timestamp': incident['timestamp'],
+        'created_at': incident['created_at'],
+        'image_path': image_path,
+        'confidence': incident.get('confidence')
+    }
+    primary['evidence'] = primary.get('evidence', []) + [evidence]
+    try:
+        run_blocking(save_evidence_row, primary, incident, camera_id, evidence, face_paths)
+    except Exception as e:
+        print(f"Error saving incident evidence to database: {e}")
+    
+    # Update open incident pages without another alert
+    try:
+        broadcast_incident('incident_evidence', {
+            'id': primary['id'],
+            'location': incident['location'],
+            'timestamp': incident['timestamp'],
+            'image_url': media_url(image_path, 'list'),
+            'face_urls': [media_url(path, 'face') for path in face_paths]
+        })
+    except Exception as e:
+        print(f"Error sending WebSocket notification: {e}")
+    
+    face_enhancer.submit(face_paths, camera_id)
+    return primary
+
+def record_reported_incident(camera_id, location, started_at, image, face_samples, **details):
+    """
+    Record an incident detected outside the camera producers (edge agent or camera worker).
+    
+    Args:
+        camera_id: Camera the incident is filed under
+        location: Camera name shown with the incident
+        started_at: Epoch seconds the incident started
+        image: Representative BGR frame of the incident
+        face_samples: (BGR frame, face detections) pairs the faces are cut from
+        **details: Extra incident fields (source, device_id, confidence, ended_at, ...)
+    
+    Returns:
+        incident: The recorded incident dict, or the one it was merged into
+    """
+    incident = {
+        'id': new_incident_id(),
+        'timestamp': datetime.fromtimestamp(started_at, pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S'),
+        'location': location,
+        'camera_id': camera_id,
+        'created_at': started_at,
+        'reviewed': False,
+        'faces_detected': False,
+        'face_paths': []
+    }
+    incident.update(details)
+    try:
+        for frame, faces in face_samples:
+            run_blocking(face_store.add_faces, incident['id'], frame, faces)
+        return record_incident(incident, image, camera_id)
+    finally:
+        face_store.discard(incident['id'])
+
+def record_worker_incident(camera_id, event):
+    """Record an incident finished by a camera worker process (see CameraShard)."""
+    image = decode_jpeg(event['image'])
+    if image is None:
+        print(f"Discarded incident from {camera_id}: image could not be decoded")
+        return
+    samples = [(decode_jpeg(jpeg), faces) for jpeg, faces in event['face_samples']]
+    try:
+        incident = record_reported_incident(camera_id, cameras.get(camera_id, {}).get('name', camera_id),
+                                            event['started_at'], image,
+                                            [(frame, faces) for frame, faces in samples if frame is not None],
+                                            confidence=event['confidence'], ended_at=event['ended_at'])
+        print(f"Incident recorded: {incident['id']} with {event['frames']} frames")
+    except Exception as e:
+        print(f"Error saving incident: {e}")
+
+def publish_frame(hub, camera_id, frame, timestamp, meta, privacy_filter=None, jpeg=None):
+    """
+    Encode a frame once per stream key (variant, width) that has viewers and publish it.
+    
+    Args:
+        hub: FrameHub the frame is published to
+        camera_id: Camera the frame belongs to
+        frame: BGR frame (blurred in place for private viewers)
+        timestamp: Capture time
+        meta: Detection metadata sent with the frame
+        privacy_filter: The camera's PrivacyFilter (created for the first private viewer or,
+            with PRIVACY_BLUR, the first snapshot)
+        jpeg: The frame already encoded at full size (reused for raw full-size viewers)
+    
+    Returns:
+        privacy_filter: The camera's PrivacyFilter, or None while nothing needs private frames
+    """
+    # Keep a raw copy for snapshots before the privacy blur modifies the frame
+    snapshot = frame.copy() if snapshots.due(camera_id) else None
+    private_snapshot = None
+    
+    wanted = hub.wanted(camera_id)
+    with metrics.timer('encode', camera_id):
+        for variant in ('raw', 'private'):
+            widths = {width for key_variant, width in wanted if key_variant == variant}
+            if not widths:
+                continue
+            if variant == 'private':
+                if privacy_filter is None:
+                    privacy_filter = PrivacyFilter(lambda image: run_blocking(detector.detect_faces, image, camera_id, strict=True),
+                                                   camera_id=camera_id)
+                # Blur faces on the outgoing frame only; incident frames are copied raw
+                privacy_filter.apply(frame)
+                if snapshot is not None:
+                    private_snapshot = frame.copy()
+            for width in widths:
+                if width == IMAGE:
+                    # Unencoded frame for the mosaic; copied if the blur is still to modify it
+                    image = frame.copy() if variant == 'raw' and any(key[0] == 'private' for key in wanted) else frame
+                    hub.publish(camera_id, (variant, IMAGE), FramePacket(None, timestamp, meta, image=image))
+                    continue
+                if variant == 'raw' and width is None and jpeg is not None:
+                    hub.publish(camera_id, (variant, width), FramePacket(jpeg, timestamp, meta))
+                    continue
+                encoded = run_blocking(encode_jpeg, scale_to_width(frame, width)) or b''
+                hub.publish(camera_id, (variant, width), FramePacket(encoded, timestamp, meta))
+    
+    if snapshot is not None:
+        if privacy_blur and private_snapshot is None:
+            # Private snapshots reuse the stream's face tracks; requests never run face detection
+            if privacy_filter is None:
+                privacy_filter = PrivacyFilter(lambda image: run_blocking(detector.detect_faces, image, camera_id, strict=True),
+                                               camera_id=camera_id)
+            private_snapshot = privacy_filter.apply(snapshot.copy())
+        snapshots.update(camera_id, snapshot, timestamp, private=private_snapshot)
+    return privacy_filter
+
+def relay_producer(camera_id, hub):
+    """
+    Publish the frames of a camera that runs in a worker process (CAMERA_WORKERS).
+    
+    The worker captures, analyzes and encodes the camera; this only forwards
+    its JPEGs to the viewers, decoding a frame when a viewer needs another
+    width, the blurred variant, the mosaic or a snapshot.
+    
+    Args:
+        camera_id: Registered camera id
+        hub: FrameHub the frames are published to
+    """
+    privacy_filter = None
+    seen = 0
+    camera_supervisor.watch(camera_id, True)
+    try:
+        while hub.active(camera_id):
+            seen, jpeg, meta = run_blocking(camera_supervisor.next_frame, camera_id, seen)
+            if jpeg is None:
+                continue
+            if 'message' in meta:
+                hub.publish_all(camera_id, FramePacket(jpeg, meta=meta))
+                continue
+            
+            timestamp = meta.get('timestamp', time.time())
+            wanted = hub.wanted(camera_id)
+            if wanted <= {('raw', None)} and not snapshots.due(camera_id):
+                hub.publish(camera_id, ('raw', None), FramePacket(jpeg, timestamp, meta))
+                continue
+            frame = run_blocking(decode_jpeg, jpeg)
+            if frame is not None:
+                privacy_filter = publish_frame(hub, camera_id, frame, timestamp, meta, privacy_filter, jpeg=jpeg)
+    finally:
+        camera_supervisor.watch(camera_id, False)
+        if privacy_filter is not None:
+            privacy_filter.close()
+
+def camera_producer(camera_id, hub):
+    """
+    Capture, analyze and encode one camera's frames for all of its viewers.
+    
+    Runs as a background task (a thread, or a greenlet under gevent) until the
+    camera has had no viewers for a while. Blocking OpenCV/TensorFlow calls go
+    through run_blocking so they never stall other clients under gevent.
+    
+    Args:
+        camera_id: Registered camera id, or 'webcam'
+        hub: FrameHub the encoded frames are published to
+    """
+    # Cameras sharded to worker processes are analyzed there; only relay their frames
+    if camera_supervisor is not None and camera_supervisor.owns(camera_id):
+        return relay_producer(camera_id, hub)
+    
     # Initialize variables for frame rate control
     prev_frame_time = 0
     frame_skip = 0  # Process every frame initially
@@ -373,34 +1364,47 @@ def gen_frames(camera_id='webcam'):
     current_incident = None
     incident_frames = []  # Store frames during an incident
     max_incident_frames = 30  # Maximum frames to capture during an incident
+    face_sample_interval = 10  # Look for faces in every Nth collected incident frame
     incident_active = False
-    face_detected = False
+    camera = None
+    privacy_filter = None
+    
+    frame_number = 0
+    
+    def publish(frame, timestamp, analyzed):
+        """Publish a frame with the camera's detection metadata."""
+        nonlocal privacy_filter
+        meta = {
+            'camera_id': camera_id,
+            'frame': frame_number,
+            'timestamp': timestamp,
+            'analyzed': analyzed,
+            'state': detector.smoother.get_state(camera_id),
+            'confidence': round(detector.smoother.get_confidence(camera_id), 3),
+            'incident': current_incident['id'] if incident_active else None
+        }
+        privacy_filter = publish_frame(hub, camera_id, frame, timestamp, meta, privacy_filter)
+    
+    def publish_message(message, **kwargs):
+        """Publish a status message frame (camera errors) to every stream key."""
+        hub.publish_all(camera_id, FramePacket(encode_jpeg(message_frame(message, **kwargs)) or b'',
+                                               meta={'camera_id': camera_id, 'message': message}))
     
     try:
         # Use webcam for testing
         if camera_id == 'webcam':
-            camera = cv2.VideoCapture(0)
+            camera = run_blocking(cv2.VideoCapture, 0)
+        elif camera_id in cameras:
+            # Use the stored camera URL (device, stream or virtual source)
+            camera = run_blocking(open_source, cameras[camera_id]['url'])
         else:
-            # Use the stored camera URL
-            if camera_id in cameras:
-                camera = cv2.VideoCapture(cameras[camera_id]['url'])
-            else:
-                # Return a default frame if camera not found
-                frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                cv2.putText(frame, "Camera not found", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', frame)
-                yield (b'--frame\r\n'
-                      b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                return
+            publish_message("Camera not found")
+            return
         
         # Check if camera opened successfully
         if not camera.isOpened():
             # Return a default frame if camera failed to open
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, "Camera failed to open", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', frame)
-            yield (b'--frame\r\n'
-                  b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+            publish_message("Camera failed to open")
             return
         
         # Set camera properties if available
@@ -413,20 +1417,22 @@ def gen_frames(camera_id='webcam'):
         os.makedirs(uploads_dir, exist_ok=True)
         os.makedirs(faces_dir, exist_ok=True)
         
-        while True:
+        while hub.active(camera_id):
             try:
-                success, frame = camera.read()
+                capture_start = time.perf_counter()
+                success, frame = run_blocking(camera.read)
+                metrics.observe_stage('capture', camera_id, time.perf_counter() - capture_start)
                 if not success:
+                    metrics.frames_dropped_total.inc(camera=camera_id, reason='read_failed')
                     # If frame read failed, provide an error frame
-                    frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                    cv2.putText(frame, "Camera disconnected", (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    ret, buffer = cv2.imencode('.jpg', frame)
-                    yield (b'--frame\r\n'
-                          b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                    publish_message("Camera disconnected")
                     # Wait a bit before trying again
                     time.sleep(1)
                     continue
                 
+                metrics.frames_total.inc(camera=camera_id)
+                frame_number += 1
+                
                 # Calculate FPS
                 current_time = time.time()
                 fps = 1 / (current_time - prev_frame_time) if prev_frame_time > 0 else 30
@@ -435,15 +1441,14 @@ def gen_frames(camera_id='webcam'):
                 # Skip frames if processing is too slow (adjust based on performance)
                 frame_skip = (frame_skip + 1) % 2  # Process every other frame (adjust as needed)
                 if frame_skip != 0:
+                    metrics.frames_skipped_total.inc(camera=camera_id)
                     # Just encode the frame without processing
-                    ret, buffer = cv2.imencode('.jpg', frame)
-                    yield (b'--frame\r\n'
-                          b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                    publish(frame, current_time, False)
                     continue
                 
                 # Process the frame for violence detection
                 try:
-                    processed_frame, is_violence = detector.process_frame(frame)
+                    processed_frame, is_violence = run_blocking(detector.process_frame, frame, camera_id)
                 except Exception as e:
                     print(f"Error processing frame: {e}")
                     # If processing fails, just display the original frame with an error message
@@ -456,13 +1461,16 @@ def gen_frames(camera_id='webcam'):
                     # If no incident is active, start a new one
                     if not incident_active:
                         timestamp = datetime.now(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d %H:%M:%S')
-                        incident_id = f"incident_{len(incidents) + 1}"
+                        incident_id = new_incident_id()
                         incident_active = True
                         incident_frames = []  # Reset frames collection
                         current_incident = {
                             'id': incident_id,
                             'timestamp': timestamp,
                             'location': cameras.get(camera_id, {'name': 'Webcam'})['name'],
+                            'camera_id': camera_id,
+                            'created_at': time.time(),
+                            'reviewed': False,
                             'faces_detected': False,
                             'face_paths': []
                         }
@@ -470,134 +1478,145 @@ def gen_frames(camera_id='webcam'):
                     # Collect frames during the incident (to pick the best one)
                     if len(incident_frames) < max_incident_frames:
                         incident_frames.append(frame.copy())
-                    
-                    # Detect faces only once during the incident
-                    if not face_detected and len(incident_frames) >= 10:  # Wait for a few frames before face detection
-                        try:
-                            # Detect faces in the current frame
-                            faces = detector.detect_faces(frame)
-                            
-                            if faces:
-                                current_incident['faces_detected'] = True
-                                
-                                # Extract face images
-                                face_paths = []
-                                for i, face in enumerate(faces):
-                                    x, y, width, height = face['box']
-                                    # Extract face with some margin
-                                    margin = 20
-                                    x_start = max(0, x - margin)
-                                    y_start = max(0, y - margin)
-                                    x_end = min(frame.shape[1], x + width + margin)
-                                    y_end = min(frame.shape[0], y + height + margin)
-                                    
-                                    face_img = frame[y_start:y_end, x_start:x_end]
-                                    
-                                    # Save face image
-                                    face_filename = f"{current_incident['id']}_face_{i+1}.jpg"
-                                    face_path = os.path.join('faces', face_filename)
-                                    full_face_path = os.path.join(uploads_dir, face_path)
-                                    cv2.imwrite(full_face_path, face_img)
-                                    face_paths.append(face_path)
-                                
-                                current_incident['face_paths'] = face_paths
-                                face_detected = True
-                        except Exception as e:
-                            print(f"Error during face detection: {e}")
+                        metrics.queue_depth.set(len(incident_frames), camera=camera_id, queue='incident_frames')
+                        
+                        # Sample faces several times; the store keeps the best crop per person
+                        if len(incident_frames) % face_sample_interval == 0:
+                            try:
+                                faces = run_blocking(detector.detect_faces, frame, camera_id)
+                                if faces:
+                                    run_blocking(face_store.add_faces, current_incident['id'], frame, faces)
+                            except Exception as e:
+                                print(f"Error during face detection: {e}")
                 
                 elif incident_active:
                     # Incident has ended, finalize the recording
                     if incident_frames:
                         try:
                             # Select the middle frame as the representative image (usually clearest)
-                            best_frame = incident_frames[len(incident_frames) // 2]
-                            
-                            # Save the incident image
-                            incident_path = f"uploads/{current_incident['id']}.jpg"
-                            full_path = os.path.join('static', incident_path)
-                            cv2.imwrite(full_path, best_frame)
-                            
-                            # Add the image path to the incident
-                            current_incident['image_path'] = incident_path
-                            
-                            # Add to incidents list
-                            incidents.append(current_incident)
-                            
-                            # Send notifications through all enabled channels
-                            notification = notification_manager.send_notification(current_incident)
-                            
-                            # Prepare face image URLs if faces were detected
-                            face_urls = []
-                            if current_incident['faces_detected'] and current_incident['face_paths']:
-                                for face_path in current_incident['face_paths']:
-                                    try:
-                                        face_url = url_for('static', filename=os.path.join('uploads', face_path))
-                                        face_urls.append(face_url)
-                                    except Exception as e:
-                                        print(f"Error creating face URL: {e}")
-                            
-                            # Emit WebSocket event for real-time notification
-                            try:
-                                socketio.emit('incident_alert', {
-                                    'id': current_incident['id'],
-                                    'timestamp': current_incident['timestamp'],
-                                    'location': current_incident['location'],
-                                    'image_url': url_for('static', filename=current_incident['image_path']),
-                                    'faces_detected': current_incident['faces_detected'],
-                                    'face_urls': face_urls
-                                })
-                            except Exception as e:
-                                print(f"Error sending WebSocket notification: {e}")
+                            current_incident['ended_at'] = time.time()
+                            recorded = record_incident(current_incident, incident_frames[len(incident_frames) // 2], camera_id)
                             
                             # Print for debugging
-                            print(f"Incident recorded: {current_incident['id']} with {len(incident_frames)} frames")
+                            print(f"Incident recorded: {recorded['id']} with {len(incident_frames)} frames")
                         except Exception as e:
                             print(f"Error saving incident: {e}")
                     
                     # Reset incident state
+                    face_store.discard(current_incident['id'])
                     incident_active = False
                     incident_frames = []
-                    face_detected = False
+                    metrics.queue_depth.set(0, camera=camera_id, queue='incident_frames')
                 
                 # Add FPS to the processed frame
                 cv2.putText(processed_frame, f"FPS: {int(fps)}", 
                            (processed_frame.shape[1] - 120, processed_frame.shape[0] - 20), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
                 
-                # Encode the processed frame for streaming
-                ret, buffer = cv2.imencode('.jpg', processed_frame)
-                
-                # Yield the frame for the response
-                yield (b'--frame\r\n'
-                      b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                # Encode the processed frame and publish it to the viewers
+                publish(processed_frame, current_time, True)
             except Exception as e:
                 print(f"Error in frame processing loop: {e}")
                 # Provide an error frame if an exception occurs
-                error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                cv2.putText(error_frame, f"Error: {str(e)[:40]}", (20, 240), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                ret, buffer = cv2.imencode('.jpg', error_frame)
-                yield (b'--frame\r\n'
-                      b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                publish_message(f"Error: {str(e)[:40]}", position=(20, 240), scale=0.7)
                 time.sleep(1)  # Brief pause before continuing
     
     except Exception as e:
-        print(f"Critical error in gen_frames: {e}")
-        # Final cleanup
-        try:
-            camera.release()
-        except:
-            pass
+        print(f"Critical error in camera_producer: {e}")
+    finally:
+        # Runs when the last viewer has gone
+        if incident_active:
+            face_store.discard(current_incident['id'])
+        if privacy_filter is not None:
+            privacy_filter.close()
+        if camera is not None:
+            try:
+                camera.release()
+            except:
+                pass
+
+# One capture/detection pipeline per camera, shared by all of its viewers
+frame_hub = FrameHub(camera_producer, socketio.start_background_task)
+
+# CAMERA_WORKERS=K shards registered cameras across K worker processes, each
+# running capture, detection and incident assembly for its cameras
+camera_supervisor = None
+if int(os.environ.get('CAMERA_WORKERS', 0)) > 0:
+    camera_supervisor = CameraSupervisor(
+        workers=int(os.environ['CAMERA_WORKERS']),
+        threads=int(os.environ.get('WORKER_THREADS', 1)),
+        max_load=float(os.environ.get('WORKER_MAX_LOAD', 0.9)),
+        on_incident=record_worker_incident,
+        start_task=socketio.start_background_task
+    )
+
+# Multi-camera mosaics (/mosaic_feed), one composition per camera set and size
+mosaic_hub = FrameHub(MosaicProducer(frame_hub, fps=float(os.environ.get('MOSAIC_FPS', 10)),
+                                     label=lambda camera_id: cameras.get(camera_id, {}).get('name')),
+                      socketio.start_background_task)
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection to WebSocket."""
+    # Incident events are sent per room (see broadcast_incident)
+    if current_user.is_authenticated:
+        join_room('admins' if current_user.is_admin else 'viewers')
     print('Client connected to WebSocket')
 
+# Binary frame streams of each Socket.IO client: sid -> {camera_id: SocketFrameStream}
+socket_streams = {}
+
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection from WebSocket."""
+    for stream in socket_streams.pop(request.sid, {}).values():
+        stream.stop()
     print('Client disconnected from WebSocket')
 
+@socketio.on('stream_start')
+def handle_stream_start(data):
+    """
+    Start pushing a camera's frames to this client as binary 'frame' events.
+    
+    Expects {camera_id, max_fps, max_width, raw}. Each 'frame' event carries the
+    detection metadata and the JPEG bytes and must be acknowledged by the client.
+    """
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'message': 'Login required'}
+    
+    data = data or {}
+    camera_id = data.get('camera_id', 'webcam')
+    if camera_id != 'webcam' and camera_id not in cameras:
+        return {'status': 'error', 'message': 'Camera not found'}
+    
+    try:
+        max_fps = min(max(float(data.get('max_fps') or 15), 1.0), 30.0)
+        width = stream_width(int(data.get('max_width') or 0))
+    except (TypeError, ValueError):
+        return {'status': 'error', 'message': 'Invalid max_fps or max_width'}
+    privacy = stream_privacy(bool(data.get('raw')))
+    
+    sid = request.sid
+    streams = socket_streams.setdefault(sid, {})
+    if camera_id in streams:
+        streams.pop(camera_id).stop()
+    
+    def send(event, args, callback):
+        socketio.emit(event, args, to=sid, callback=callback)
+    
+    stream = SocketFrameStream(frame_hub, camera_id, ('private' if privacy else 'raw', width), send, max_fps=max_fps)
+    streams[camera_id] = stream
+    socketio.start_background_task(stream.run)
+    return {'status': 'ok', 'camera_id': camera_id, 'width': width, 'max_fps': max_fps, 'privacy': privacy}
+
+@socketio.on('stream_stop')
+def handle_stream_stop(data):
+    """Stop a camera stream started with stream_start."""
+    stream = socket_streams.get(request.sid, {}).pop((data or {}).get('camera_id', 'webcam'), None)
+    if stream is not None:
+        stream.stop()
+    return {'status': 'ok'}
+
 @socketio.on('test_notification')
 def handle_test_notification(data):
     """Handle test notification request."""
@@ -626,7 +1645,10 @@ def handle_test_notification(data):
 def handle_before_request():
     # This will run before every request
     # We'll perform DB initialization in the main block instead
-    pass
+    
+    # Incident images live under static/, but are only served through /media (login required)
+    if request.path.startswith('/static/uploads/'):
+        return redirect(url_for('media_file', filename=request.path[len('/static/uploads/'):]))
 
 if __name__ == '__main__':
     # Create uploads folder if it doesn't exist
@@ -670,5 +1692,22 @@ if __name__ == '__main__':
         except Exception as e:
             print(f"Could not create test image: {e}")
     
-    # Run the app with SocketIO
-    socketio.run(app, debug=True, host='0.0.0.0', allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # Background services run in the serving process only (not in the debug reloader's parent)
+    serving_process = ASYNC_MODE != 'threading' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    
+    # Start the background retention service once the stored incidents are listed
+    load_incidents()
+    if serving_process:
+        retention.start()
+    
+    # Pick the most accurate model variant that fits the per-frame latency budget
+    if os.environ.get('MODEL_LATENCY_BUDGET_MS'):
+        model_switcher.auto_select(float(os.environ['MODEL_LATENCY_BUDGET_MS']))
+    
+    # Start the camera workers
+    if camera_supervisor is not None and serving_process:
+        camera_supervisor.start()
+    
+    # Run the app with SocketIO (the debugger and reloader only in threading mode)
+    print(f"Serving in {ASYNC_MODE} mode")
+    socketio.run(app, debug=ASYNC_MODE == 'threading', host='0.0.0.0', allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the detection and streaming hot paths.
+
+Runs without a webcam or GPU: frames come from the bundled test videos (or
+synthetic noise when they cannot be decoded) and the violence model is
+replaced by a stub with configurable latency. Results are written as JSON and
+can be compared against a previous run to catch regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from utils.detector import ViolenceDetector
+from utils.notifier import EmailNotifier, Notification
+from utils.smoothing import TemporalSmoother
+from utils.streaming import encode_frame
+from utils.export import incidents_to_csv
+from utils.metrics import MetricsRegistry
+from utils.enhance import FaceEnhancer
+from utils.privacy import PrivacyFilter, blur_regions
+
+TEST_VIDEOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Violence Detection', 'Testing videos')
+
+class StubModel:
+    """Stand-in for the Keras model that sleeps for a fixed latency."""
+    
+    def __init__(self, latency=0.0, score=0.3):
+        """
+        Initialize the stub.
+        
+        Args:
+            latency: Seconds to sleep per predict() call
+            score: Violence probability returned for every frame
+        """
+        self.latency = latency
+        self.score = score
+    
+    def predict(self, batch, batch_size=None, verbose=0):
+        """Mimic keras Model.predict for a (N, H, W, C) batch."""
+        if self.latency:
+            time.sleep(self.latency)
+        return np.full((len(batch), 1), self.score, dtype=np.float32)
+
+def load_frames(count=64, width=640, height=480):
+    """
+    Load benchmark frames from the test videos, falling back to synthetic noise.
+    
+    Returns:
+        frames: List of BGR frames of the requested size
+        source: Description of where the frames came from
+    """
+    frames = []
+    for name in sorted(os.listdir(TEST_VIDEOS_DIR)) if os.path.isdir(TEST_VIDEOS_DIR) else []:
+        capture = cv2.VideoCapture(os.path.join(TEST_VIDEOS_DIR, name))
+        while len(frames) < count:
+            success, frame = capture.read()
+            if not success:
+                break
+            frames.append(cv2.resize(frame, (width, height)))
+        capture.release()
+        if len(frames) >= count:
+            return frames, 'test videos'
+    
+    rng = np.random.default_rng(0)
+    while len(frames) < count:
+        frames.append(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    return frames, 'synthetic'
+
+def measure(func, iterations, warmup):
+    """
+    Time repeated calls of func.
+    
+    Returns:
+        stats: Dictionary of latency statistics in milliseconds
+    """
+    for i in range(warmup):
+        func(i)
+    
+    timings = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        timings[i] = time.perf_counter() - start
+    
+    timings *= 1000
+    return {
+        'iterations': iterations,
+        'mean_ms': round(float(timings.mean()), 4),
+        'p50_ms': round(float(np.percentile(timings, 50)), 4),
+        'p95_ms': round(float(np.percentile(timings, 95)), 4),
+        'min_ms': round(float(timings.min()), 4),
+        'ops_per_sec': round(1000 / float(timings.mean()), 2) if timings.mean() else 0.0
+    }
+
+def build_benchmarks(args, frames):
+    """
+    Create the benchmark cases.
+    
+    Returns:
+        benchmarks: Dictionary of name -> callable taking the iteration number
+    """
+    detector = ViolenceDetector(model_path='', face_detection=not args.skip_faces)
+    detector.model = StubModel(args.model_latency)
+    
+    n = len(frames)
+    processed = [detector.preprocess_frame(frame) for frame in frames]
+    smoother = TemporalSmoother()
+    camera_ids = [f"camera_{i}" for i in range(16)]
+    scores = np.random.default_rng(1).random((n, len(camera_ids)))
+    
+    notifier = EmailNotifier()
+    notifier.set_credentials('bench@example.com', 'unused')
+    incident = {
+        'id': 'incident_bench',
+        'timestamp': '2024-01-01 00:00:00',
+        'location': 'Benchmark',
+        'faces_detected': False,
+        'image_path': 'uploads/test_incident.jpg'
+    }
+    incidents = [dict(incident, id=f"incident_{i}") for i in range(args.export_rows)]
+    
+    # Face-sized crops (small enough to be upscaled) for the enhancement stage
+    enhancer = FaceEnhancer()
+    crops = [frame[100:196, 200:276].copy() for frame in frames]
+    
+    # Privacy blur on a working copy, with two faces from a stub detector
+    privacy_boxes = [(200, 100, 80, 80), (400, 150, 60, 60)]
+    privacy_frame = frames[0].copy()
+    privacy = PrivacyFilter(lambda image: [{'box': [v // 2 for v in box]} for box in privacy_boxes],
+                            asynchronous=False)
+    
+    def privacy_apply(i):
+        np.copyto(privacy_frame, frames[i % n])
+        privacy.apply(privacy_frame)
+    
+    # Separate registry so instrumentation overhead is measured in isolation
+    registry = MetricsRegistry(prefix='bench')
+    
+    def timed_block(i):
+        with registry.timer('encode', camera_ids[i % 16]):
+            pass
+    
+    benchmarks = {
+        'detector.preprocess': lambda i: detector.preprocess_frame(frames[i % n]),
+        'detector.predict': lambda i: detector.predict(processed[i % n]),
+        'detector.overlay': lambda i: detector.draw_status(frames[i % n], 'ALERT', 0.9, 20, 40),
+        'detector.process_frame': lambda i: detector.process_frame(frames[i % n], 'bench'),
+        'smoother.update': lambda i: smoother.update('bench', scores[i % n, 0]),
+        'smoother.update_batch_16': lambda i: smoother.update_batch(camera_ids, scores[i % n]),
+        'stream.jpeg_encode': lambda i: encode_frame(frames[i % n]),
+        'notifier.build_message': lambda i: notifier.build_message(Notification(incident), ['ops@example.com']),
+        'export.incidents_csv': lambda i: incidents_to_csv(incidents),
+        'metrics.observe_stage': lambda i: registry.observe_stage('predict', camera_ids[i % 16], 0.004),
+        'metrics.timer': timed_block,
+        'metrics.render': lambda i: registry.render(),
+        'enhance.face': lambda i: enhancer.enhance(crops[i % n]),
+        'enhance.face_batch_4': lambda i: enhancer.enhance_batch([crops[(i + j) % n] for j in range(4)]),
+        'privacy.blur_regions': lambda i: blur_regions(privacy_frame, privacy_boxes),
+        'privacy.apply': privacy_apply
+    }
+    
+    if not args.skip_faces and detector.face_detector is not None:
+        benchmarks['detector.detect_faces'] = lambda i: detector.detect_faces(frames[i % n])
+    
+    return benchmarks
+
+def benchmark_decode(iterations):
+    """Time sequential decoding of the test videos, looping as needed."""
+    videos = [os.path.join(TEST_VIDEOS_DIR, name) for name in sorted(os.listdir(TEST_VIDEOS_DIR))] \
+        if os.path.isdir(TEST_VIDEOS_DIR) else []
+    if not videos:
+        return None
+    
+    state = {'capture': cv2.VideoCapture(videos[0]), 'video': 0}
+    
+    def decode(i):
+        success, frame = state['capture'].read()
+        if not success:
+            state['capture'].release()
+            state['video'] = (state['video'] + 1) % len(videos)
+            state['capture'] = cv2.VideoCapture(videos[state['video']])
+            state['capture'].read()
+    
+    stats = measure(decode, iterations, warmup=5)
+    state['capture'].release()
+    return stats
+
+def compare(results, baseline, tolerance):
+    """
+    Compare mean latencies against a baseline run.
+    
+    Returns:
+        regressions: List of (name, baseline_ms, current_ms) that got slower than tolerance allows
+    """
+    regressions = []
+    for name, stats in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous:
+            continue
+        if stats['mean_ms'] > previous['mean_ms'] * (1 + tolerance):
+            regressions.append((name, previous['mean_ms'], stats['mean_ms']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the detection and streaming hot paths')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed iterations per benchmark')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed warm-up iterations')
+    parser.add_argument('--model-latency', type=float, default=0.0, help='Stub model latency in seconds')
+    parser.add_argument('--export-rows', type=int, default=1000, help='Incidents in the CSV export benchmark')
+    parser.add_argument('--skip-faces', action='store_true', help='Skip MTCNN face detection')
+    parser.add_argument('--only', default=None, help='Run benchmarks whose name contains this string')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', default=None, help='Previous results to compare against')
+    parser.add_argument('--target-fps', type=float, default=30.0, help='Stream frame rate the privacy blur must sustain')
+    parser.add_argument('--tolerance', type=float, default=0.20, help='Allowed slowdown before flagging (0.2 = 20%%)')
+    
+    args = parser.parse_args()
+    
+    frames, source = load_frames()
+    print(f"Using {len(frames)} frames from {source}")
+    
+    benchmarks = build_benchmarks(args, frames)
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {
+            'iterations': args.iterations,
+            'model_latency': args.model_latency,
+            'frame_source': source
+        },
+        'benchmarks': {}
+    }
+    
+    cases = list(benchmarks.items()) + [('video.decode', None)]
+    for name, func in cases:
+        if args.only and args.only not in name:
+            continue
+        # Face detection is far slower than the rest, so run it fewer times
+        iterations = max(1, args.iterations // 10) if name == 'detector.detect_faces' else args.iterations
+        stats = benchmark_decode(iterations) if func is None else measure(func, iterations, args.warmup)
+        if stats is None:
+            continue
+        results['benchmarks'][name] = stats
+        print(f"{name:<28}{stats['mean_ms']:>10.3f} ms{stats['p95_ms']:>10.3f} ms p95{stats['ops_per_sec']:>12.1f}/s")
+    
+    # A blurred stream frame costs the blur plus the JPEG encode; it must fit the frame budget
+    stream_cases = ('privacy.apply', 'stream.jpeg_encode')
+    if all(name in results['benchmarks'] for name in stream_cases):
+        frame_ms = sum(results['benchmarks'][name]['p95_ms'] for name in stream_cases)
+        budget_ms = 1000 / args.target_fps
+        results['privacy_stream'] = {'frame_p95_ms': round(frame_ms, 4), 'budget_ms': round(budget_ms, 4),
+                                     'real_time': frame_ms <= budget_ms}
+        print(f"Blurred stream frame: {frame_ms:.3f} ms p95 of a {budget_ms:.1f} ms budget "
+              f"({'real-time' if frame_ms <= budget_ms else 'TOO SLOW'} at {args.target_fps:g} fps)")
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, previous, current in regressions:
+            print(f"REGRESSION {name}: {previous:.3f} ms -> {current:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Offline threshold calibration for the alert state machine.
+
+Replays recorded raw model scores through TemporalSmoother for every
+combination of a parameter grid at once and reports, per combination, how
+many alerts were raised, how quickly violent recordings alerted and how
+often non-violent ones did. Scores come from analyze_videos.py --save-scores
+(one file per video) or from live cameras recorded with SCORE_RECORD_DIR.
+
+    python analyze_videos.py videos/ --stride 2 --save-scores scores/
+    python calibrate.py scores/ --grid alert_threshold=0.6:0.95:0.05 --output sweep.csv
+
+Recordings named V_* are treated as violent and NV_*/nonv* as non-violent
+(the test set's naming); --label NAME:LABEL overrides that.
+"""
+
+import csv
+import json
+import time
+import argparse
+import numpy as np
+
+from utils.smoothing import TemporalSmoother
+from utils.calibration import DEFAULT_GRID, load_scores, parameter_grid, rank, replay
+
+# Column headings of the printed table
+HEADINGS = {
+    'history_size': 'history',
+    'warning_threshold': 'warning',
+    'alert_threshold': 'alert',
+    'violence_threshold': 'violence',
+    'alert_cooldown': 'cooldown',
+    'detected': 'detected',
+    'time_to_alert': 'to alert (s)',
+    'false_alerts_per_hour': 'false/hour',
+    'alerts': 'alerts'
+}
+
+def infer_label(name):
+    """Label from the test set's file naming (None if unknown)."""
+    lowered = name.lower()
+    if lowered.startswith(('nv_', 'nonv')):
+        return 0
+    if lowered.startswith('v_'):
+        return 1
+    return None
+
+def parse_grid(values):
+    """
+    Parse --grid SETTING=VALUES arguments.
+    
+    VALUES is a comma-separated list (10,20,40) or a start:stop:step range
+    with stop included (0.6:0.95:0.05).
+    """
+    grid = dict(DEFAULT_GRID)
+    for value in values or []:
+        name, _, spec = value.partition('=')
+        if name not in TemporalSmoother.SETTINGS or not spec:
+            raise argparse.ArgumentTypeError(f"expected SETTING=VALUES with SETTING one of {', '.join(TemporalSmoother.SETTINGS)}")
+        if ':' in spec:
+            start, stop, step = (float(part) for part in spec.split(':'))
+            points = np.arange(start, stop + step / 2, step).round(6).tolist()
+        else:
+            points = [float(part) for part in spec.split(',')]
+        if name in ('history_size', 'violence_threshold'):
+            points = [int(point) for point in points]
+        grid[name] = points
+    return grid
+
+def parse_label(value):
+    """Parse a NAME:LABEL command line argument."""
+    name, _, label = value.rpartition(':')
+    if not name or label not in ('0', '1'):
+        raise argparse.ArgumentTypeError('expected NAME:LABEL with LABEL 0 or 1')
+    return name, int(label)
+
+def write_results(output_path, rows):
+    """Write ranked combinations as CSV or JSON (by extension)."""
+    if output_path.lower().endswith('.csv'):
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep alert thresholds over recorded model scores')
+    parser.add_argument('paths', nargs='+', help='Score recordings (.npy) or directories of them')
+    parser.add_argument('--grid', action='append', help='SETTING=VALUES to sweep (repeatable; replaces the default values)')
+    parser.add_argument('--label', action='append', type=parse_label, help='Recording label as NAME:LABEL, 1 = violent')
+    parser.add_argument('--max-false-per-hour', type=float, default=None, help='Drop settings with more false alerts per hour')
+    parser.add_argument('--top', type=int, default=10, help='Settings to print')
+    parser.add_argument('--output', default=None, help='Write every ranked setting to a .csv or .json file')
+    args = parser.parse_args()
+    
+    try:
+        grid = parse_grid(args.grid)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+    
+    recordings = load_scores(args.paths)
+    if not recordings:
+        print("No score recordings found")
+        return
+    labels = {name: infer_label(name) for name in recordings}
+    labels.update(dict(args.label or []))
+    
+    settings = parameter_grid(grid)
+    combinations = len(next(iter(settings.values())))
+    frames = sum(len(recording) for recording in recordings.values())
+    for name, recording in recordings.items():
+        label = {1: 'violent', 0: 'non-violent'}.get(labels.get(name), 'unlabelled')
+        print(f"{name}: {len(recording)} scores, {label}")
+    
+    start = time.perf_counter()
+    results = replay(recordings, settings, labels)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {frames} scores x {combinations} settings in {elapsed:.2f}s "
+          f"({frames * combinations / elapsed / 1e6:.1f}M state updates/s)")
+    
+    rows = rank(settings, results, args.max_false_per_hour)
+    if args.output:
+        write_results(args.output, rows)
+        print(f"Results written to {args.output}")
+    
+    if not rows:
+        print("No setting meets the false alert limit")
+        return
+    columns = list(grid) + [metric for metric in ('detected', 'time_to_alert', 'false_alerts_per_hour', 'alerts')
+                            if metric in rows[0]]
+    print('  '.join(f"{HEADINGS.get(column, column):>12.12}" for column in columns))
+    for row in rows[:args.top]:
+        print('  '.join(f"{'-' if row[column] is None else row[column]:>12}" for column in columns))
+
+if __name__ == '__main__':
+    main()
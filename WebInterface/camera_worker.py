@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Camera worker process started by the web server when CAMERA_WORKERS is set.
+
+Each worker loads its own detection model and runs capture, detection and
+incident assembly for the cameras the server's CameraSupervisor assigns to
+it, reporting frames, load and incidents back over a local authenticated
+connection. It is not meant to be started by hand: the supervisor passes
+the connection address on the command line and the key in the environment,
+and restarts workers that die.
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from multiprocessing.connection import Client
+
+def configure_tensorflow(threads):
+    """Limit this process to `threads` TensorFlow threads (before the model is loaded)."""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def main():
+    parser = argparse.ArgumentParser(description='VigilEyeX camera worker')
+    parser.add_argument('--connect', required=True, help='Supervisor address')
+    parser.add_argument('--worker-id', type=int, required=True, help='Index of this worker')
+    parser.add_argument('--threads', type=int, default=1, help='TensorFlow threads')
+    parser.add_argument('--stream-fps', type=float, default=15.0, help='Frames per second sent of each watched camera')
+    parser.add_argument('--model', default=os.environ.get('WORKER_MODEL', 'models/modelnew.h5'), help='Detection model')
+    args = parser.parse_args()
+    
+    authkey = bytes.fromhex(os.environ.pop('VIGILEYEX_WORKER_KEY', ''))
+    connection = Client(args.connect, authkey=authkey)
+    connection.send(('hello', args.worker_id, os.getpid()))
+    
+    configure_tensorflow(args.threads)
+    from utils.detector import ViolenceDetector
+    from utils.sequence import SequenceViolenceDetector
+    from utils.event_log import EventLog
+    from utils.calibration import ScoreRecorder
+    from utils.workers import CameraShard
+    
+    # Same detector configuration as the web process
+    if os.environ.get('DETECTOR_MODE', 'frame') == 'sequence':
+        detector = SequenceViolenceDetector(model_path=args.model,
+                                            window_size=int(os.environ.get('SEQUENCE_WINDOW', 16)))
+    else:
+        detector = ViolenceDetector(args.model)
+    detector.event_log = EventLog(os.environ.get('EVENT_LOG_PATH', 'event_log.db'),
+                                  sample_interval=float(os.environ.get('EVENT_LOG_SAMPLE_INTERVAL', 1.0)),
+                                  max_age_days=float(os.environ.get('EVENT_LOG_DAYS', 30)))
+    if os.environ.get('SCORE_RECORD_DIR'):
+        detector.score_recorder = ScoreRecorder(os.environ['SCORE_RECORD_DIR'])
+    
+    # Build Keras' predict function before the camera threads call it concurrently
+    if detector.model is not None:
+        size = detector.input_size
+        detector.predict(np.zeros((size, size, 3), dtype=np.float32))
+    
+    shard = CameraShard(connection, args.worker_id, detector, stream_fps=args.stream_fps)
+    try:
+        shard.run()
+    finally:
+        detector.event_log.close()
+        if detector.score_recorder is not None:
+            detector.score_recorder.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the per-frame and sequence detectors on labelled test videos.
+Reports model latency per frame and frame-level accuracy for each mode.
+"""
+
+import os
+import time
+import argparse
+import cv2
+import numpy as np
+
+from utils.detector import ViolenceDetector
+from utils.sequence import SequenceViolenceDetector
+
+TEST_VIDEOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Violence Detection', 'Testing videos')
+
+DEFAULT_VIDEOS = [
+    (os.path.join(TEST_VIDEOS_DIR, 'V_19.mp4'), 1),
+    (os.path.join(TEST_VIDEOS_DIR, 'nonv.mp4'), 0)
+]
+
+def evaluate(detector, videos, max_frames=None):
+    """
+    Run a detector's model path over labelled videos.
+    
+    Args:
+        detector: ViolenceDetector (or subclass) instance
+        videos: List of (video_path, label) tuples, label 1 = violent
+        max_frames: Optional limit on frames read per video
+    
+    Returns:
+        results: Dictionary with latency and accuracy figures
+    """
+    latencies = []
+    correct = 0
+    total = 0
+    
+    for video_path, label in videos:
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            print(f"Could not open {video_path}, skipping")
+            continue
+        
+        frames_read = 0
+        while max_frames is None or frames_read < max_frames:
+            success, frame = capture.read()
+            if not success:
+                break
+            frames_read += 1
+            
+            start = time.perf_counter()
+            processed = detector.preprocess_frame(frame)
+            preds = detector.predict(processed, video_path)
+            latencies.append(time.perf_counter() - start)
+            
+            correct += int((float(preds[0]) > 0.5) == bool(label))
+            total += 1
+        
+        capture.release()
+    
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'frames': total,
+        'accuracy': correct / total if total else 0.0,
+        'mean_ms': float(latencies.mean()),
+        'p95_ms': float(np.percentile(latencies, 95))
+    }
+
+def parse_video(value):
+    """Parse a PATH:LABEL command line argument."""
+    path, _, label = value.rpartition(':')
+    if not path or label not in ('0', '1'):
+        raise argparse.ArgumentTypeError('expected PATH:LABEL with LABEL 0 or 1')
+    return path, int(label)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-frame and sequence violence detection')
+    parser.add_argument('--model', default='models/modelnew.h5', help='Path to the per-frame model')
+    parser.add_argument('--head', default='models/temporal_head.h5', help='Path to the temporal head')
+    parser.add_argument('--window', type=int, default=16, help='Sequence window size in frames')
+    parser.add_argument('--video', action='append', type=parse_video, help='Labelled video as PATH:LABEL (repeatable)')
+    parser.add_argument('--max-frames', type=int, default=None, help='Frames to read per video')
+    
+    args = parser.parse_args()
+    videos = args.video or DEFAULT_VIDEOS
+    
+    detectors = [
+        ('frame', ViolenceDetector(args.model)),
+        ('sequence', SequenceViolenceDetector(args.model, args.head, args.window))
+    ]
+    
+    print("=" * 50)
+    print(f"{'Mode':<10}{'Frames':>8}{'Accuracy':>10}{'Mean ms':>10}{'P95 ms':>10}")
+    print("-" * 50)
+    for name, detector in detectors:
+        if detector.model is None:
+            print(f"{name:<10} model not loaded")
+            continue
+        
+        results = evaluate(detector, videos, args.max_frames)
+        print(f"{name:<10}{results['frames']:>8}{results['accuracy']:>10.3f}"
+              f"{results['mean_ms']:>10.2f}{results['p95_ms']:>10.2f}")
+    print("=" * 50)
+
+if __name__ == '__main__':
+    main()
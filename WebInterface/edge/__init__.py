@@ -0,0 +1,5 @@
+# Headless edge agent: OpenCV, NumPy and a TFLite interpreter only
+from . import shared
+from . import runtime
+from . import faces
+from . import agent
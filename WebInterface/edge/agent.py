@@ -0,0 +1,244 @@
+import json
+import time
+import base64
+import queue
+import threading
+import urllib.request
+import urllib.error
+import cv2
+import numpy as np
+
+from .shared import smoothing
+
+def encode_image(image, max_width=640, quality=80):
+    """Downscale a BGR image to max_width and encode it as base64 JPEG text."""
+    height, width = image.shape[:2]
+    if width > max_width:
+        image = cv2.resize(image, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return base64.b64encode(buffer.tobytes()).decode('ascii') if ret else None
+
+class IncidentReporter:
+    """
+    Sends incident events to the central server from a background thread.
+    
+    Uploads never block the capture loop: events wait in a bounded queue
+    (the oldest is dropped when it is full) and failed uploads are retried
+    with exponential backoff.
+    """
+    
+    def __init__(self, server_url, token, max_queue=20, retries=5, timeout=15):
+        """
+        Initialize the reporter.
+        
+        Args:
+            server_url: Base URL of the VigilEyeX server (e.g. http://server:5000)
+            token: Bearer token matching the server's EDGE_TOKEN
+            max_queue: Events kept while the server is unreachable
+            retries: Upload attempts per event
+            timeout: Seconds per upload attempt
+        """
+        self.url = server_url.rstrip('/') + '/api/edge/incidents'
+        self.token = token
+        self.retries = retries
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def send(self, event):
+        """Queue an event for upload."""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.failed += 1
+                except queue.Empty:
+                    pass
+    
+    def _post(self, event):
+        """Upload one event."""
+        request = urllib.request.Request(self.url, data=json.dumps(event).encode(), method='POST', headers={
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.token}'
+        })
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read() or b'{}')
+    
+    def _worker(self):
+        """Upload queued events, retrying with backoff."""
+        while True:
+            event = self.queue.get()
+            for attempt in range(self.retries):
+                try:
+                    result = self._post(event)
+                    self.sent += 1
+                    print(f"Incident reported to server as {result.get('id')}")
+                    break
+                except urllib.error.HTTPError as e:
+                    # Rejected events (bad token, bad payload) will not succeed on retry
+                    print(f"Server rejected incident: HTTP {e.code}")
+                    if e.code < 500:
+                        self.failed += 1
+                        break
+                except Exception as e:
+                    print(f"Error reporting incident (attempt {attempt + 1}): {e}")
+                time.sleep(min(60, 2 ** attempt))
+            else:
+                self.failed += 1
+
+class EdgeAgent:
+    """
+    Headless violence detector for Raspberry Pi-class devices.
+    
+    Runs the same per-frame pipeline as the server's camera producer
+    (classify every analyze_every-th frame, smooth the scores with the
+    server's TemporalSmoother, collect frames and faces while in ALERT) but
+    keeps no web server, database or TensorFlow in the process. Finished
+    incidents are sent to the central server as compact events: one
+    downscaled JPEG of the incident and the best face crops.
+    """
+    
+    def __init__(self, capture, model, reporter=None, face_detector=None, device_id='edge',
+                 camera_name='Edge camera', location='', analyze_every=2, max_incident_frames=30,
+                 face_sample_interval=5, max_faces=5, smoother=None):
+        """
+        Initialize the agent.
+        
+        Args:
+            capture: Opened video source (cv2.VideoCapture API)
+            model: TFLiteModel (or any model with input_shape and predict)
+            reporter: IncidentReporter (None only logs incidents)
+            face_detector: Object with detect_faces(image) (None skips faces)
+            device_id: Name of this device reported to the server
+            camera_name: Camera name reported to the server
+            location: Camera location reported to the server
+            analyze_every: Run the model on every n-th frame
+            max_incident_frames: Frames kept per incident to pick the reported image
+            face_sample_interval: Run face detection on every n-th incident frame
+            max_faces: Largest face crops sent per incident
+            smoother: TemporalSmoother (defaults to the server's detector settings)
+        """
+        self.capture = capture
+        self.model = model
+        self.reporter = reporter
+        self.face_detector = face_detector
+        self.device_id = device_id
+        self.camera_name = camera_name
+        self.location = location
+        self.analyze_every = analyze_every
+        self.max_incident_frames = max_incident_frames
+        self.face_sample_interval = face_sample_interval
+        self.max_faces = max_faces
+        self.input_size = int(model.input_shape[1])
+        self.smoother = smoother or smoothing.TemporalSmoother(
+            history_size=10,
+            warning_threshold=0.70,
+            alert_threshold=0.85,
+            violence_threshold=40,
+            alert_cooldown=60
+        )
+        
+        self.frames = 0
+        self.analyzed = 0
+        self.incidents = 0
+        self.model_seconds = 0.0
+        self.state = 'MONITORING'
+    
+    def preprocess(self, frame):
+        """Same input as ViolenceDetector.preprocess_frame: RGB, resized, scaled to [0, 1]."""
+        processed = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        processed = cv2.resize(processed, (self.input_size, self.input_size)).astype(np.float32)
+        return processed / 255
+    
+    def analyze(self, frame):
+        """
+        Classify one frame and advance the alert state machine.
+        
+        Returns:
+            (confidence, state)
+        """
+        start = time.perf_counter()
+        score = float(self.model.predict(self.preprocess(frame)[np.newaxis])[0][0])
+        self.model_seconds += time.perf_counter() - start
+        self.analyzed += 1
+        confidence, self.state = self.smoother.update(self.camera_name, score)
+        return confidence, self.state
+    
+    def run(self, duration=None, on_first_analysis=None):
+        """
+        Process frames until the source ends or duration seconds have passed.
+        
+        Args:
+            duration: Seconds to run (None runs until the source ends)
+            on_first_analysis: Callable() run once after the first analyzed frame (startup timing)
+        """
+        start = time.time()
+        incident_frames = []
+        faces = []
+        peak_confidence = 0.0
+        incident_start = None
+        
+        while duration is None or time.time() - start < duration:
+            success, frame = self.capture.read()
+            if not success:
+                break
+            self.frames += 1
+            if self.frames % self.analyze_every:
+                continue
+            
+            confidence, state = self.analyze(frame)
+            if on_first_analysis is not None and self.analyzed == 1:
+                on_first_analysis()
+            
+            if state == 'ALERT':
+                if incident_start is None:
+                    incident_start = time.time()
+                    incident_frames, faces, peak_confidence = [], [], 0.0
+                peak_confidence = max(peak_confidence, confidence)
+                if len(incident_frames) < self.max_incident_frames:
+                    incident_frames.append(frame.copy())
+                    if self.face_detector is not None and len(incident_frames) % self.face_sample_interval == 0:
+                        faces.extend(self._crops(frame, self.face_detector.detect_faces(frame)))
+            elif incident_start is not None:
+                self._report(incident_frames, faces, incident_start, peak_confidence)
+                incident_start = None
+                incident_frames, faces = [], []
+        
+        if incident_start is not None:
+            self._report(incident_frames, faces, incident_start, peak_confidence)
+    
+    def _crops(self, frame, detections, margin=20):
+        """Cut detected faces (plus margin) out of a frame."""
+        crops = []
+        for face in detections:
+            x, y, width, height = face['box']
+            crop = frame[max(0, y - margin):y + height + margin, max(0, x - margin):x + width + margin]
+            if crop.size:
+                crops.append(crop.copy())
+        return crops
+    
+    def _report(self, incident_frames, faces, started_at, peak_confidence):
+        """Send a finished incident to the server."""
+        self.incidents += 1
+        # Middle frame as the representative image, like the server; largest faces first
+        image = incident_frames[len(incident_frames) // 2]
+        faces = sorted(faces, key=lambda crop: crop.shape[0] * crop.shape[1], reverse=True)[:self.max_faces]
+        event = {
+            'device_id': self.device_id,
+            'camera_name': self.camera_name,
+            'location': self.location,
+            'started_at': started_at,
+            'ended_at': time.time(),
+            'confidence': round(peak_confidence, 3),
+            'image': encode_image(image),
+            'faces': [encoded for encoded in (encode_image(face, max_width=160, quality=90) for face in faces) if encoded]
+        }
+        print(f"Incident on {self.camera_name}: confidence {peak_confidence:.2f}, {len(event['faces'])} faces")
+        if self.reporter is not None:
+            self.reporter.send(event)
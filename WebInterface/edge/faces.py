@@ -0,0 +1,58 @@
+import os
+import cv2
+
+# Cascade locations of pip (cv2.data) and distribution (apt) OpenCV builds
+CASCADE_NAME = 'haarcascade_frontalface_default.xml'
+CASCADE_DIRS = ('/usr/share/opencv4/haarcascades', '/usr/share/opencv/haarcascades')
+
+def find_cascade(name=CASCADE_NAME):
+    """Path of an OpenCV Haar cascade file (None if not installed)."""
+    data = getattr(cv2, 'data', None)
+    directories = ([data.haarcascades] if data is not None else []) + list(CASCADE_DIRS)
+    for directory in directories:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+class HaarFaceDetector:
+    """
+    Lightweight face detector for the edge agent.
+    
+    Uses the Haar cascade bundled with OpenCV, so it needs no TensorFlow
+    (unlike MTCNN) and no model download. Detection runs on a downscaled
+    grayscale frame; results use MTCNN's format ({'box', 'confidence'}) so
+    they can be handled like the server's detections.
+    """
+    
+    def __init__(self, scale=0.5, min_size=24, cascade_path=None):
+        """
+        Initialize the detector.
+        
+        Args:
+            scale: Resize factor of the frame detection runs on
+            min_size: Smallest face to detect, in downscaled pixels
+            cascade_path: Haar cascade file (defaults to OpenCV's frontal face cascade)
+        
+        Raises:
+            FileNotFoundError: If no cascade file can be found
+        """
+        cascade_path = cascade_path or find_cascade()
+        if cascade_path is None:
+            raise FileNotFoundError(f"OpenCV cascade {CASCADE_NAME} not found")
+        self.classifier = cv2.CascadeClassifier(cascade_path)
+        self.scale = scale
+        self.min_size = min_size
+    
+    def detect_faces(self, image):
+        """
+        Detect faces in a BGR image.
+        
+        Returns:
+            faces: List of {'box': [x, y, width, height], 'confidence': 1.0} in image coordinates
+        """
+        small = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        boxes = self.classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                                 minSize=(self.min_size, self.min_size))
+        return [{'box': [int(v / self.scale) for v in box], 'confidence': 1.0} for box in boxes]
@@ -0,0 +1,110 @@
+import threading
+import numpy as np
+
+def load_interpreter(path, num_threads=None):
+    """
+    Create a TFLite interpreter, preferring the small tflite-runtime package.
+    
+    Args:
+        path: .tflite model file
+        num_threads: CPU threads for inference (None lets TFLite decide)
+    
+    Returns:
+        interpreter: TFLite Interpreter
+    
+    Raises:
+        ImportError: If neither tflite-runtime nor TensorFlow is installed
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        except ImportError:
+            raise ImportError("A TFLite interpreter is required: pip install tflite-runtime")
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+class TFLiteModel:
+    """
+    TFLite model with the subset of the Keras model API the detectors use.
+    
+    input_shape and predict() behave like a Keras model's, so a .tflite file
+    can stand in for the .h5 model both on the edge agent and in the
+    server's model registry. Quantized inputs and outputs are converted
+    from and to float transparently. The interpreter is not thread-safe, so
+    calls are serialized.
+    """
+    
+    def __init__(self, path, num_threads=None):
+        """
+        Load the model.
+        
+        Args:
+            path: .tflite model file
+            num_threads: CPU threads for inference
+        """
+        self.path = path
+        self.interpreter = load_interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple([None] + [int(d) for d in self.input['shape'][1:]])
+        self.lock = threading.Lock()
+    
+    def _quantize(self, sample):
+        """Convert a float input sample to the model's input type."""
+        dtype = self.input['dtype']
+        if dtype == np.float32:
+            return sample.astype(np.float32)
+        scale, zero_point = self.input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(sample / scale + zero_point), info.min, info.max).astype(dtype)
+    
+    def _dequantize(self, values):
+        """Convert a raw output tensor to float."""
+        if self.output['dtype'] == np.float32:
+            return values
+        scale, zero_point = self.output['quantization']
+        return (values.astype(np.float32) - zero_point) * scale
+    
+    def predict(self, batch, verbose=0, batch_size=None):
+        """
+        Run the model on a batch of inputs, one sample at a time.
+        
+        Args:
+            batch: Array of shape (n, height, width, channels), floats in [0, 1]
+        
+        Returns:
+            preds: Array of shape (n, outputs)
+        """
+        results = []
+        with self.lock:
+            for sample in batch:
+                self.interpreter.set_tensor(self.input['index'], self._quantize(sample[np.newaxis]))
+                self.interpreter.invoke()
+                results.append(self._dequantize(self.interpreter.get_tensor(self.output['index']))[0])
+        return np.array(results)
+
+def convert_model(keras_path, tflite_path, quantize=True):
+    """
+    Convert a Keras model to TFLite (run on a workstation; needs TensorFlow).
+    
+    Args:
+        keras_path: Trained Keras model (.h5 or .keras)
+        tflite_path: Where to write the .tflite model
+        quantize: Apply dynamic-range quantization (weights stored as int8, about 4x smaller)
+    
+    Returns:
+        size: Size of the written model in bytes
+    """
+    import tensorflow as tf
+    
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    data = converter.convert()
+    with open(tflite_path, 'wb') as f:
+        f.write(data)
+    return len(data)
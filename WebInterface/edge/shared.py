@@ -0,0 +1,27 @@
+import os
+import importlib.util
+
+UTILS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils')
+
+def load_utils_module(name):
+    """
+    Load one of the server's utils modules by file, without the utils package.
+    
+    Importing the package runs utils/__init__.py, which loads the Keras
+    detector and with it TensorFlow; the modules loaded here import nothing
+    beyond OpenCV and NumPy, so the edge agent shares their code as is.
+    
+    Args:
+        name: Module name inside utils (e.g. 'smoothing')
+    
+    Returns:
+        module: The loaded module
+    """
+    spec = importlib.util.spec_from_file_location(f"edge_shared_{name}", os.path.join(UTILS_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Same alert state machine and camera sources as the server
+smoothing = load_utils_module('smoothing')
+sources = load_utils_module('sources')
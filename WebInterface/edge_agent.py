@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Headless edge agent for Raspberry Pi-class devices.
+
+Runs violence detection on one camera with only OpenCV, NumPy and a TFLite
+interpreter (no TensorFlow, MTCNN, Flask or database in the process) and
+reports finished incidents to a central VigilEyeX server, which records,
+notifies and displays them like its own cameras' incidents.
+
+Convert the trained model once on a workstation with TensorFlow installed:
+
+    python edge_agent.py --convert models/modelnew.h5 models/modelnew.tflite
+
+Then on the device (pip install opencv-python-headless numpy tflite-runtime):
+
+    EDGE_TOKEN=secret python edge_agent.py --source 0 --model models/modelnew.tflite \\
+        --server http://server:5000 --camera-name "Gate 2" --location "North gate"
+
+The server accepts events when it runs with the same EDGE_TOKEN. --report
+prints the agent's footprint (startup time, RSS, FPS) as JSON when it exits.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+
+STARTED = time.time()
+
+from edge.agent import EdgeAgent, IncidentReporter
+from edge.faces import HaarFaceDetector
+from edge.runtime import TFLiteModel, convert_model
+from edge.shared import sources
+
+def memory_usage():
+    """Current and peak resident set size of this process in MB (Linux only)."""
+    usage = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key = 'rss_mb' if line.startswith('VmRSS') else 'peak_rss_mb'
+                    usage[key] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
+
+def main():
+    parser = argparse.ArgumentParser(description='VigilEyeX edge agent')
+    parser.add_argument('--source', default='0', help='Camera index, stream URL or virtual source (loop:///video.mp4)')
+    parser.add_argument('--model', default='models/modelnew.tflite', help='TFLite model')
+    parser.add_argument('--threads', type=int, default=None, help='TFLite inference threads')
+    parser.add_argument('--server', default=None, help='Central server URL (omit to only log incidents)')
+    parser.add_argument('--token', default=os.environ.get('EDGE_TOKEN'), help='Server EDGE_TOKEN')
+    parser.add_argument('--device-id', default=socket.gethostname(), help='Name of this device')
+    parser.add_argument('--camera-name', default='Edge camera', help='Camera name shown on the server')
+    parser.add_argument('--location', default='', help='Camera location shown on the server')
+    parser.add_argument('--analyze-every', type=int, default=2, help='Run the model on every n-th frame')
+    parser.add_argument('--no-faces', action='store_true', help='Skip face detection')
+    parser.add_argument('--face-cascade', default=None, help='Haar cascade file (defaults to the one shipped with OpenCV)')
+    parser.add_argument('--duration', type=float, default=None, help='Seconds to run (default: until the source ends)')
+    parser.add_argument('--report', action='store_true', help='Print startup time, RSS and FPS as JSON on exit')
+    parser.add_argument('--convert', nargs=2, metavar=('KERAS_MODEL', 'TFLITE_MODEL'),
+                        help='Convert a Keras model to quantized TFLite and exit (needs TensorFlow)')
+    parser.add_argument('--no-quantize', action='store_true', help='Keep float32 weights when converting')
+    args = parser.parse_args()
+    
+    if args.convert:
+        size = convert_model(args.convert[0], args.convert[1], quantize=not args.no_quantize)
+        print(f"Wrote {args.convert[1]} ({size / 1024 / 1024:.1f} MB)")
+        return 0
+    
+    if args.server and not args.token:
+        parser.error('--token (or EDGE_TOKEN) is required with --server')
+    
+    model = TFLiteModel(args.model, num_threads=args.threads)
+    capture = sources.open_source(args.source)
+    if not capture.isOpened():
+        print(f"Could not open camera source {args.source}")
+        return 1
+    
+    face_detector = None
+    if not args.no_faces:
+        try:
+            face_detector = HaarFaceDetector(cascade_path=args.face_cascade)
+        except FileNotFoundError as e:
+            print(f"{e}; reporting incidents without faces")
+    
+    agent = EdgeAgent(
+        capture,
+        model,
+        reporter=IncidentReporter(args.server, args.token) if args.server else None,
+        face_detector=face_detector,
+        device_id=args.device_id,
+        camera_name=args.camera_name,
+        location=args.location,
+        analyze_every=args.analyze_every
+    )
+    
+    timings = {}
+    def first_analysis():
+        timings['startup_seconds'] = round(time.time() - STARTED, 2)
+        print(f"Edge agent running ({timings['startup_seconds']} s after start)")
+    
+    run_start = time.time()
+    try:
+        agent.run(duration=args.duration, on_first_analysis=first_analysis)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+    elapsed = max(time.time() - run_start, 1e-6)
+    
+    if args.report:
+        report = dict(timings, **memory_usage())
+        report.update({
+            'frames': agent.frames,
+            'fps': round(agent.frames / elapsed, 1),
+            'analyzed_fps': round(agent.analyzed / elapsed, 1),
+            'model_ms': round(agent.model_seconds / max(agent.analyzed, 1) * 1000, 1),
+            'incidents': agent.incidents,
+            'tensorflow_loaded': 'tensorflow' in sys.modules
+        })
+        print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Multi-camera load generator for capacity planning.
+
+Registers N virtual cameras backed by looped video files on a running VigilEyeX
+server, opens M concurrent MJPEG clients on /video_feed (logged in through the
+real /login form) and measures, for every (N, M) combination:
+
+- detection FPS and dropped frames per camera (from /metrics)
+- frames delivered to clients and end-to-end frame latency (X-Capture-Time)
+- server CPU and RSS (from /proc, when --server-pid is given)
+
+With --async-clients the viewers are multiplexed on one asyncio loop sharing
+a single login, so thousands of concurrent viewers can be simulated to compare
+serving modes (e.g. ASYNC_MODE=threading against ASYNC_MODE=gevent).
+
+The resulting capacity curve is written as JSON so releases can be compared.
+
+Run it against a throwaway server only. The server has no way to remove a
+camera, so the virtual cameras stay registered until it restarts. With
+CAMERA_WORKERS they keep being captured and analyzed even without viewers.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import threading
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+TEST_VIDEO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Violence Detection', 'Testing videos', 'V_19.mp4')
+
+METRIC_LINE = re.compile(r'^(?P<name>\w+)\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+
+class Session:
+    """Logged-in HTTP session against a VigilEyeX server."""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+    
+    def url(self, path, **params):
+        """Build an absolute URL."""
+        query = f"?{urllib.parse.urlencode(params)}" if params else ''
+        return f"{self.base_url}{path}{query}"
+    
+    def open(self, path, data=None, timeout=10, **params):
+        """Issue a GET (or form POST when data is given)."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        return self.opener.open(self.url(path, **params), body, timeout=timeout)
+    
+    def login(self, username, password):
+        """Log in through the /login form, including its CSRF token."""
+        page = self.open('/login').read().decode('utf-8', 'replace')
+        match = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page)
+        form = {'username': username, 'password': password}
+        if match:
+            form['csrf_token'] = match.group(1)
+        
+        response = self.open('/login', form)
+        if '/login' in response.geturl():
+            raise RuntimeError(f"Login failed for {username}")
+    
+    def add_camera(self, name, url, location):
+        """Register a camera through the dashboard form."""
+        self.open('/add_camera', {'name': name, 'url': url, 'location': location}).read()
+    
+    def scrape_metrics(self):
+        """
+        Fetch /metrics and index the per-camera counters.
+        
+        Returns:
+            values: Dictionary of (metric name, camera) -> summed value
+        """
+        values = {}
+        text = self.open('/metrics').read().decode()
+        for line in text.splitlines():
+            match = METRIC_LINE.match(line)
+            if not match:
+                continue
+            labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match['labels']))
+            key = (match['name'], labels.get('camera'))
+            values[key] = values.get(key, 0.0) + float(match['value'])
+        return values
+
+class StreamClient(threading.Thread):
+    """Reads one MJPEG stream and records frame arrivals and latencies."""
+    
+    def __init__(self, session, camera_id, stop_event):
+        super().__init__(daemon=True)
+        self.session = session
+        self.camera_id = camera_id
+        self.stop_event = stop_event
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+        self.error = None
+    
+    def run(self):
+        try:
+            response = self.session.open('/video_feed', timeout=30, camera_id=self.camera_id)
+            while not self.stop_event.is_set():
+                headers = self._read_headers(response)
+                if headers is None:
+                    break
+                length = int(headers.get('content-length', 0))
+                payload = response.read(length)
+                response.readline()  # trailing CRLF after the JPEG
+                
+                self.frames += 1
+                self.bytes += len(payload)
+                if 'x-capture-time' in headers:
+                    self.latencies.append(time.time() - float(headers['x-capture-time']))
+            response.close()
+        except Exception as e:
+            self.error = str(e)
+    
+    def _read_headers(self, response):
+        """Skip to the next part boundary and parse its headers."""
+        line = response.readline()
+        while line and not line.startswith(b'--frame'):
+            line = response.readline()
+        if not line:
+            return None
+        
+        headers = {}
+        while True:
+            line = response.readline().strip()
+            if not line:
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+class ClientStats:
+    """Frames and latencies received by one asyncio client."""
+    
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+        self.error = None
+
+class AsyncStreamClients(threading.Thread):
+    """
+    Many MJPEG clients on one asyncio event loop, sharing one login.
+    
+    Requests use HTTP/1.0 so the stream is not chunk-encoded and parts can be
+    read by Content-Length. Each client is tracked by a ClientStats with the
+    same frames/latencies/error attributes as StreamClient.
+    """
+    
+    def __init__(self, session, camera_ids, count, stop_event):
+        super().__init__(daemon=True)
+        parsed = urllib.parse.urlsplit(session.base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.cookie = '; '.join(f"{cookie.name}={cookie.value}" for cookie in session.cookies)
+        self.camera_ids = camera_ids
+        self.stop_event = stop_event
+        self.clients = [ClientStats() for _ in range(count)]
+    
+    def run(self):
+        asyncio.run(self._main())
+    
+    async def _main(self):
+        tasks = [asyncio.create_task(self._stream(client, self.camera_ids[i % len(self.camera_ids)]))
+                 for i, client in enumerate(self.clients)]
+        while not self.stop_event.is_set():
+            await asyncio.sleep(0.2)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    async def _stream(self, client, camera_id):
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, limit=1 << 20)
+            writer.write((f"GET /video_feed?camera_id={camera_id} HTTP/1.0\r\n"
+                          f"Host: {self.host}\r\nCookie: {self.cookie}\r\n\r\n").encode())
+            await writer.drain()
+            await reader.readuntil(b'\r\n\r\n')
+            while True:
+                await reader.readuntil(b'--frame\r\n')
+                headers = {}
+                for line in (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n'):
+                    name, _, value = line.partition(':')
+                    if value:
+                        headers[name.strip().lower()] = value.strip()
+                payload = await reader.readexactly(int(headers.get('content-length', 0)))
+                
+                client.frames += 1
+                client.bytes += len(payload)
+                if 'x-capture-time' in headers:
+                    client.latencies.append(time.time() - float(headers['x-capture-time']))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            client.error = str(e) or type(e).__name__
+        finally:
+            if writer is not None:
+                writer.close()
+
+def read_process_stats(pid):
+    """
+    Read cumulative CPU seconds and RSS for a process from /proc.
+    
+    Returns:
+        (cpu_seconds, rss_bytes), or None if unavailable
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+        
+        with open(f'/proc/{pid}/status') as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        return cpu_seconds, rss_kb * 1024
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None
+
+def run_scenario(args, session, camera_ids, num_clients):
+    """
+    Stream from the given cameras with num_clients clients for args.duration seconds.
+    
+    Returns:
+        result: Dictionary of measurements for this scenario
+    """
+    stop_event = threading.Event()
+    if args.async_clients:
+        runner = AsyncStreamClients(session, camera_ids, num_clients, stop_event)
+        runner.start()
+        clients = runner.clients
+    else:
+        clients = []
+        for i in range(num_clients):
+            client_session = Session(args.url)
+            client_session.login(args.username, args.password)
+            clients.append(StreamClient(client_session, camera_ids[i % len(camera_ids)], stop_event))
+        
+        for client in clients:
+            client.start()
+    
+    # Let the capture loops spin up before measuring
+    time.sleep(args.warmup)
+    before = session.scrape_metrics()
+    process_before = read_process_stats(args.server_pid) if args.server_pid else None
+    frames_before = [client.frames for client in clients]
+    latency_marks = [len(client.latencies) for client in clients]
+    start = time.time()
+    
+    time.sleep(args.duration)
+    
+    elapsed = time.time() - start
+    after = session.scrape_metrics()
+    process_after = read_process_stats(args.server_pid) if args.server_pid else None
+    frames_received = [client.frames - previous for client, previous in zip(clients, frames_before)]
+    latencies = np.array([latency for client, mark in zip(clients, latency_marks)
+                          for latency in client.latencies[mark:]])
+    
+    stop_event.set()
+    for client in ([runner] if args.async_clients else clients):
+        client.join(timeout=5)
+    
+    def delta(name, camera_id):
+        return after.get((name, camera_id), 0.0) - before.get((name, camera_id), 0.0)
+    
+    cameras = {}
+    for camera_id in camera_ids:
+        cameras[camera_id] = {
+            'detection_fps': round(delta('vigileyex_frames_processed_total', camera_id) / elapsed, 2),
+            'capture_fps': round(delta('vigileyex_frames_total', camera_id) / elapsed, 2),
+            'dropped_frames': int(delta('vigileyex_frames_dropped_total', camera_id)),
+            'skipped_frames': int(delta('vigileyex_frames_skipped_total', camera_id))
+        }
+    
+    result = {
+        'cameras': len(camera_ids),
+        'clients': num_clients,
+        'duration': round(elapsed, 2),
+        'per_camera': cameras,
+        'mean_detection_fps': round(float(np.mean([c['detection_fps'] for c in cameras.values()])), 2),
+        'client_fps': round(sum(frames_received) / elapsed / max(1, num_clients), 2),
+        # The slowest 5% of viewers show whether the server keeps up with all of them
+        'client_fps_p05': round(float(np.percentile(frames_received, 5)) / elapsed, 2) if frames_received else 0.0,
+        'client_errors': sum(1 for client in clients if client.error),
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 1) if len(latencies) else None,
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 1) if len(latencies) else None
+    }
+    
+    if process_before and process_after:
+        result['cpu_percent'] = round((process_after[0] - process_before[0]) / elapsed * 100, 1)
+        result['rss_mb'] = round(process_after[1] / (1024 * 1024), 1)
+    
+    return result
+
+def parse_counts(value):
+    """Parse a comma separated list of positive integers."""
+    return [int(part) for part in value.split(',') if part.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test camera streaming and detection capacity')
+    parser.add_argument('--url', default='http://localhost:5000', help='Server base URL')
+    parser.add_argument('--username', default=os.environ.get('ADMIN_USERNAME', 'admin'), help='Login username')
+    parser.add_argument('--password', default=os.environ.get('ADMIN_PASSWORD', 'admin123'), help='Login password')
+    parser.add_argument('--video', default=TEST_VIDEO, help='Video file backing the virtual cameras')
+    parser.add_argument('--source-url', default='loop://{video}',
+                        help='Camera URL template; {video} and {index} are substituted')
+    parser.add_argument('--cameras', type=parse_counts, default=[1, 2, 4], help='Camera counts to test (e.g. 1,2,4)')
+    parser.add_argument('--clients', type=parse_counts, default=[1, 4, 16], help='Client counts to test (e.g. 1,4,16)')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds to wait before measuring')
+    parser.add_argument('--server-pid', type=int, default=None, help='Server PID for CPU/RSS sampling')
+    parser.add_argument('--async-clients', action='store_true',
+                        help='Multiplex clients on one asyncio loop (for thousands of viewers)')
+    parser.add_argument('--label', default=None, help='Free-form label stored with the results (e.g. the serving mode)')
+    parser.add_argument('--output', default='capacity.json', help='Where to write the capacity curve')
+    
+    args = parser.parse_args()
+    
+    session = Session(args.url)
+    session.login(args.username, args.password)
+    
+    # Register the largest camera set once; smaller scenarios use a prefix of it
+    run_tag = datetime.now().strftime('%H%M%S')
+    for index in range(max(args.cameras)):
+        source = args.source_url.format(video=os.path.abspath(args.video), index=index)
+        session.add_camera(f"Load {run_tag}-{index + 1}", source, 'Load Test')
+    
+    # New cameras are appended last on the dashboard
+    dashboard = session.open('/dashboard').read().decode('utf-8', 'replace')
+    registered = re.findall(r'camera_id=(camera_\d+)', dashboard)
+    camera_ids = list(dict.fromkeys(registered))[-max(args.cameras):]
+    
+    print(f"{'Cameras':>8}{'Clients':>8}{'Det FPS':>9}{'Client FPS':>11}{'p05 FPS':>9}{'p95 ms':>9}{'Errors':>8}"
+          f"{'Dropped':>9}{'CPU %':>8}{'RSS MB':>8}")
+    results = []
+    for num_cameras in args.cameras:
+        for num_clients in args.clients:
+            result = run_scenario(args, session, camera_ids[:num_cameras], num_clients)
+            results.append(result)
+            dropped = sum(c['dropped_frames'] for c in result['per_camera'].values())
+            print(f"{num_cameras:>8}{num_clients:>8}{result['mean_detection_fps']:>9}{result['client_fps']:>11}"
+                  f"{result['client_fps_p05']:>9}{str(result['latency_p95_ms']):>9}{result['client_errors']:>8}"
+                  f"{dropped:>9}{str(result.get('cpu_percent', '-')):>8}"
+                  f"{str(result.get('rss_mb', '-')):>8}")
+    
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'url': args.url,
+            'label': args.label,
+            'video': args.video,
+            'scenarios': results
+        }, f, indent=2)
+    print(f"Capacity curve written to {args.output}")
+    print(f"{len(camera_ids)} load test camera(s) stay registered until the server restarts: {', '.join(camera_ids)}")
+
+if __name__ == '__main__':
+    main()
@@ -81,6 +81,42 @@ class Incident(db.Model):
     def __repr__(self):
         return f'<Incident {self.external_id}>'
 
+class IncidentRollup(db.Model):
+    """Incident counts per period bucket, camera and review status (see utils/analytics.py)."""
+    
+    __tablename__ = 'incident_rollups'
+    
+    period = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)  # UTC start of the period
+    camera = db.Column(db.String(100), primary_key=True)
+    location = db.Column(db.String(200), primary_key=True)
+    reviewed = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    review_seconds = db.Column(db.Float, nullable=False, default=0.0)  # Summed time to review
+    
+    def __repr__(self):
+        return f'<IncidentRollup {self.period} {self.bucket} {self.camera}>'
+
+class IncidentEvidence(db.Model):
+    """Another camera's view of an incident, merged into it by the correlation stage (see utils/correlation.py)."""
+    
+    __tablename__ = 'incident_evidence'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    incident_id = db.Column(db.Integer, db.ForeignKey('incidents.id'), nullable=False)
+    camera_id = db.Column(db.Integer, db.ForeignKey('cameras.id'), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    location = db.Column(db.String(100), nullable=False)
+    image_path = db.Column(db.String(255), nullable=True)
+    confidence_score = db.Column(db.Float, nullable=True)
+    
+    # Relationships
+    incident = db.relationship('Incident', backref=db.backref('evidence', lazy=True))
+    camera = db.relationship('Camera')
+    
+    def __repr__(self):
+        return f'<IncidentEvidence {self.id} for Incident {self.incident_id}>'
+
 class Face(db.Model):
     """Face model for storing detected faces in incidents."""
     
@@ -24,6 +24,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Listen for incident alerts
     socket.on('incident_alert', handleIncidentAlert);
     
+    // Other cameras' views merged into an incident (no new alert)
+    socket.on('incident_evidence', handleIncidentEvidence);
+    
     // Update connection status
     socket.on('connect', function() {
         console.log('Connected to alert system');
@@ -103,6 +106,22 @@ function handleIncidentAlert(data) {
     updateCameraPageUI(data);
 }
 
+/**
+ * Add another camera's view to the alert banner of the incident it was merged into
+ * @param {Object} data - Evidence data
+ */
+function handleIncidentEvidence(data) {
+    console.log('Received incident evidence:', data);
+    
+    const banner = document.getElementById('alert-banner');
+    if (!banner || banner.dataset.incidentId !== data.id) return;
+    
+    const content = banner.querySelector('.alert-banner-content');
+    const line = document.createElement('p');
+    line.innerHTML = `<strong>Also seen by:</strong> ${data.location}`;
+    content.insertBefore(line, content.querySelector('.alert-banner-link'));
+}
+
 /**
  * Update camera page UI with alert info
  * @param {Object} data - Alert data
@@ -167,6 +186,7 @@ function showAlertBanner(data) {
     }
     
     // Update banner content
+    banner.dataset.incidentId = data.id;
     const content = banner.querySelector('.alert-banner-content');
     
     // Build face thumbnail HTML if faces are detected
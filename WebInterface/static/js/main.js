@@ -18,6 +18,25 @@ document.addEventListener('DOMContentLoaded', function() {
     // Camera status update simulation (for demonstration)
     simulateCameraStatuses();
     
+    // Camera feeds streamed over Socket.IO instead of MJPEG
+    startSocketStreams();
+    
+    // "Find similar" buttons on incident faces
+    document.querySelectorAll('.btn-similar-faces').forEach(button => {
+        button.addEventListener('click', function(e) {
+            e.preventDefault();
+            findSimilarFaces(this);
+        });
+    });
+    
+    // "Mark Reviewed" buttons on the incidents page
+    document.querySelectorAll('.btn-mark-reviewed').forEach(button => {
+        button.addEventListener('click', function(e) {
+            e.preventDefault();
+            markReviewed(this);
+        });
+    });
+    
     // Add event listeners for fullscreen view
     const fullscreenButtons = document.querySelectorAll('.btn-fullscreen');
     fullscreenButtons.forEach(button => {
@@ -156,4 +175,131 @@ function filterIncidents() {
         // Show or hide row
         row.style.display = visible ? '' : 'none';
     });
-}
\ No newline at end of file
+}
+
+/**
+ * Mark an incident as reviewed and update its status badge
+ */
+function markReviewed(button) {
+    const incidentId = button.getAttribute('data-incident-id');
+    button.disabled = true;
+    
+    fetch(`/incidents/${encodeURIComponent(incidentId)}/review`, {method: 'POST'})
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                button.disabled = false;
+                alert(data.error || 'Could not mark the incident as reviewed');
+                return;
+            }
+            const badge = button.closest('tr').querySelector('.badge');
+            badge.className = 'badge bg-secondary';
+            badge.textContent = 'Reviewed';
+        })
+        .catch(error => {
+            button.disabled = false;
+            alert(`Could not mark the incident as reviewed: ${error}`);
+        });
+}
+
+/**
+ * Search the face index for faces resembling an incident face and show them
+ * below the incident's face gallery
+ */
+function findSimilarFaces(button) {
+    const facePath = button.getAttribute('data-face-path');
+    const container = button.closest('.modal-body').querySelector('.similar-faces');
+    
+    container.innerHTML = '<p class="text-muted mt-3">Searching...</p>';
+    
+    fetch(`/api/faces/similar?path=${encodeURIComponent(facePath)}&k=12`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                container.innerHTML = `<div class="alert alert-warning mt-3">${data.error}</div>`;
+                return;
+            }
+            
+            if (data.results.length === 0) {
+                container.innerHTML = '<p class="text-muted mt-3">No similar faces found.</p>';
+                return;
+            }
+            
+            let html = `<h6 class="mt-3">Similar faces (${data.indexed_faces} indexed, ${data.search_ms} ms)</h6>`;
+            if (!data.identity_search) {
+                html += '<div class="alert alert-warning py-1 small">The face recognition model is not installed: ' +
+                        'these faces look alike, they are not matched by identity.</div>';
+            }
+            html += '<div class="row face-gallery">';
+            data.results.forEach(result => {
+                html += `
+                    <div class="col-md-2 col-sm-3 col-4 mb-3">
+                        <div class="face-card">
+                            <a href="${result.url}" target="_blank"><img src="${result.thumbnail_url}" class="img-fluid face-image" alt="Similar Face"></a>
+                            <div class="face-caption">${(result.incident_ids || [result.incident_id]).join(', ')}<br>${(result.score * 100).toFixed(0)}%</div>
+                        </div>
+                    </div>`;
+            });
+            html += '</div>';
+            container.innerHTML = html;
+        })
+        .catch(error => {
+            container.innerHTML = `<div class="alert alert-danger mt-3">Search failed: ${error}</div>`;
+        });
+}
+
+/**
+ * Stream camera feeds marked data-stream-transport="websocket" over Socket.IO.
+ * Frames arrive as binary JPEG with detection metadata and are acknowledged
+ * once displayed, so the server never sends more than this page can show.
+ * Streams are paused while the tab is hidden.
+ */
+function startSocketStreams() {
+    const feeds = document.querySelectorAll('img.camera-feed[data-stream-transport="websocket"]');
+    if (feeds.length === 0 || typeof io === 'undefined') return;
+    
+    const socket = io();
+    const feedsByCamera = {};
+    feeds.forEach(img => { feedsByCamera[img.getAttribute('data-camera-id')] = img; });
+    
+    function startAll() {
+        Object.entries(feedsByCamera).forEach(([cameraId, img]) => {
+            socket.emit('stream_start', {
+                camera_id: cameraId,
+                max_fps: Number(img.getAttribute('data-max-fps') || 15),
+                max_width: Math.round(img.clientWidth * (window.devicePixelRatio || 1))
+            });
+        });
+    }
+    
+    function stopAll() {
+        Object.keys(feedsByCamera).forEach(cameraId => socket.emit('stream_stop', {camera_id: cameraId}));
+    }
+    
+    socket.on('frame', function(meta, jpeg, ack) {
+        const img = feedsByCamera[meta.camera_id];
+        if (!img) {
+            if (ack) ack();
+            return;
+        }
+        
+        const url = URL.createObjectURL(new Blob([jpeg], {type: 'image/jpeg'}));
+        img.onload = img.onerror = function() {
+            URL.revokeObjectURL(url);
+            if (ack) ack();
+        };
+        img.src = url;
+        
+        const latency = Date.now() / 1000 - meta.timestamp;
+        img.title = meta.message || `${meta.state} (${(meta.confidence * 100).toFixed(0)}%), ${Math.round(latency * 1000)} ms`;
+    });
+    
+    socket.on('connect', startAll);
+    document.addEventListener('visibilitychange', function() {
+        if (document.hidden) {
+            stopAll();
+        } else if (socket.connected) {
+            startAll();
+        }
+    });
+}
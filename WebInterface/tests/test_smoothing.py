@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+
+from utils.smoothing import TemporalSmoother
+
+# Analyzed frames per second of a 30 FPS camera (every other frame is analyzed)
+FPS = 15.0
+
+class LegacyLoop:
+    """
+    The smoothing and state logic ViolenceDetector.process_frame ran before
+    TemporalSmoother, for one camera, with time passed in instead of read.
+    """
+    
+    def __init__(self):
+        self.violence_counter = 0
+        self.violence_threshold = 40
+        self.last_alert_time = 0
+        self.alert_cooldown = 60
+        self.confidence_history = []
+        self.history_size = 10
+        self.current_state = "MONITORING"
+        self.warning_threshold = 0.70
+        self.alert_threshold = 0.85
+    
+    def update(self, confidence_score, now):
+        self.confidence_history.append(confidence_score)
+        if len(self.confidence_history) > self.history_size:
+            self.confidence_history.pop(0)
+        
+        smoothed_confidence = sum(self.confidence_history) / len(self.confidence_history)
+        
+        is_violence = smoothed_confidence > 0.50
+        is_warning = smoothed_confidence > self.warning_threshold
+        is_alert = smoothed_confidence > self.alert_threshold
+        
+        if is_violence:
+            self.violence_counter += 1
+        else:
+            self.violence_counter = max(0, self.violence_counter - 0.5)
+        
+        should_alert = (self.violence_counter >= self.violence_threshold and
+                        (now - self.last_alert_time) > self.alert_cooldown)
+        
+        if should_alert or is_alert:
+            self.current_state = "ALERT"
+            self.last_alert_time = now
+            self.violence_counter = self.violence_threshold // 2
+        elif is_warning:
+            self.current_state = "WARNING"
+        else:
+            self.current_state = "MONITORING"
+        return smoothed_confidence
+
+def noisy(rng, level, spread, frames):
+    """Scores around a level, clipped to [0, 1]."""
+    return np.clip(rng.normal(level, spread, frames), 0.0, 1.0)
+
+def traces(seed=7):
+    """Score traces shaped like recorded footage, one per scenario."""
+    rng = np.random.default_rng(seed)
+    return {
+        # Empty corridor: low scores only
+        'quiet': noisy(rng, 0.1, 0.05, 900),
+        # A 30 s fight between quiet stretches
+        'fight': np.concatenate([noisy(rng, 0.1, 0.05, 150), noisy(rng, 0.9, 0.08, 450), noisy(rng, 0.1, 0.05, 300)]),
+        # Several minutes of scuffling: evidence-counter alerts paced by the cooldown
+        'sustained': np.concatenate([noisy(rng, 0.62, 0.05, 2700), noisy(rng, 0.2, 0.05, 300)]),
+        # Scores hovering around the warning and alert thresholds
+        'flicker': noisy(rng, 0.78, 0.15, 1500),
+        'random': rng.random(1200)
+    }
+
+def legacy_run(scores, start=1000.0):
+    """States, confidences and counters of the legacy loop over one trace."""
+    loop = LegacyLoop()
+    rows = []
+    for frame, score in enumerate(scores):
+        confidence = loop.update(float(score), start + frame / FPS)
+        rows.append((loop.current_state, confidence, loop.violence_counter))
+    return rows
+
+@pytest.mark.parametrize('name', sorted(traces()))
+def test_matches_legacy_loop(name):
+    scores = traces()[name]
+    smoother = TemporalSmoother(release_margin=0.0)
+    
+    for frame, (score, (state, confidence, counter)) in enumerate(zip(scores, legacy_run(scores))):
+        smoothed, new_state = smoother.update('camera_1', float(score), 1000.0 + frame / FPS)
+        assert new_state == state, f"frame {frame}"
+        assert smoothed == pytest.approx(confidence, abs=1e-9), f"frame {frame}"
+        assert smoother.get_counter('camera_1') == counter, f"frame {frame}"
+
+def test_legacy_traces_alert():
+    """The scenarios exercise both alert paths and the cooldown."""
+    states = {name: [row[0] for row in legacy_run(scores)] for name, scores in traces().items()}
+    assert 'ALERT' not in states['quiet']
+    assert 'ALERT' in states['fight']
+    # Mean 0.62 never crosses alert_threshold, so these alerts come from the evidence counter
+    alerts = [frame for frame, state in enumerate(states['sustained']) if state == 'ALERT']
+    assert len(alerts) >= 2
+    assert all(later - earlier > 60 * FPS for earlier, later in zip(alerts, alerts[1:]))
+
+def test_batch_matches_legacy_loop_per_camera():
+    """Interleaved cameras in one update_batch each behave like their own legacy loop."""
+    all_traces = traces()
+    names = sorted(all_traces)
+    frames = min(len(scores) for scores in all_traces.values())
+    expected = {name: legacy_run(all_traces[name][:frames]) for name in names}
+    
+    smoother = TemporalSmoother(release_margin=0.0)
+    for frame in range(frames):
+        confidence, states = smoother.update_batch(names, [all_traces[name][frame] for name in names],
+                                                   1000.0 + frame / FPS)
+        for column, name in enumerate(names):
+            state, legacy_confidence, counter = expected[name][frame]
+            assert ('MONITORING', 'WARNING', 'ALERT')[states[column]] == state, f"{name} frame {frame}"
+            assert confidence[column] == pytest.approx(legacy_confidence, abs=1e-9)
+            assert smoother.get_counter(name) == counter
+
+@pytest.mark.parametrize('history_size', [1, 3, 64])
+def test_window_mean(history_size):
+    scores = traces()['random']
+    smoother = TemporalSmoother(history_size=history_size)
+    for frame, score in enumerate(scores):
+        confidence, _ = smoother.update('camera_1', float(score), float(frame))
+        window = scores[max(0, frame + 1 - history_size):frame + 1]
+        assert confidence == pytest.approx(window.mean(), abs=1e-9)
+
+@pytest.mark.parametrize('history_size', [1, 10])
+def test_ema_is_seeded_once(history_size):
+    """The EMA starts from the first score only, whatever the window size."""
+    scores = traces()['flicker'][:200]
+    smoother = TemporalSmoother(history_size=history_size, ema_alpha=0.3)
+    ema = None
+    for frame, score in enumerate(scores):
+        confidence, _ = smoother.update('camera_1', float(score), float(frame))
+        ema = score if ema is None else 0.3 * score + 0.7 * ema
+        assert confidence == pytest.approx(ema, abs=1e-9)
+    
+    smoother.reset('camera_1')
+    confidence, _ = smoother.update('camera_1', 0.4, 1000.0)
+    assert confidence == pytest.approx(0.4)
+
+def test_hysteresis_holds_state_within_margin():
+    smoother = TemporalSmoother(history_size=1, release_margin=0.05)
+    assert smoother.update('camera_1', 0.9, 0.0)[1] == 'ALERT'
+    # Below alert_threshold but within the margin: still ALERT
+    assert smoother.update('camera_1', 0.82, 1.0)[1] == 'ALERT'
+    assert smoother.update('camera_1', 0.79, 2.0)[1] == 'WARNING'
+    assert smoother.update('camera_1', 0.67, 3.0)[1] == 'WARNING'
+    assert smoother.update('camera_1', 0.6, 4.0)[1] == 'MONITORING'
+
+def test_concurrent_cameras():
+    """Cameras updated from their own threads get distinct rows and lose no scores, across growth."""
+    import threading
+    
+    smoother = TemporalSmoother(history_size=64, max_history=64, capacity=1)
+    cameras = [f'camera_{i}' for i in range(32)]
+    start = threading.Barrier(len(cameras))
+    
+    def run(camera_id):
+        start.wait()
+        for frame in range(50):
+            smoother.update(camera_id, 1.0, float(frame))
+            smoother.get_state(cameras[0])
+    
+    threads = [threading.Thread(target=run, args=(camera_id,)) for camera_id in cameras]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(smoother.slots.values()) == list(range(len(cameras)))
+    for camera_id in cameras:
+        index = smoother.slots[camera_id]
+        assert smoother.counts[index] == 50
+        assert smoother.sums[index] == pytest.approx(50.0)
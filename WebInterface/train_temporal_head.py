@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Train the temporal head used by DETECTOR_MODE=sequence.
+
+The per-frame model is kept frozen: every stride-th frame of each labelled
+video is embedded once by its MobileNetV2 backbone, the embeddings are cut
+into overlapping windows of --window frames, and a small LSTM is trained on
+the windows to score the whole window. The head is saved where
+SequenceViolenceDetector looks for it.
+
+    python train_temporal_head.py "Real Life Violence Dataset/" --output models/temporal_head.h5
+
+Videos in Violence/ and NonViolence/ directories (the training dataset's
+layout) or named V_* and NV_*/nonv* (the test set's naming) are labelled
+automatically; --label NAME:LABEL overrides that. Videos are split into
+training and validation sets as a whole, so windows of one video never end up
+in both.
+"""
+
+import os
+import sys
+import argparse
+import cv2
+import numpy as np
+
+from utils.detector import ViolenceDetector
+from utils.sequence import SequenceViolenceDetector
+from analyze_videos import collect_videos
+from calibrate import infer_label, parse_label
+
+def video_label(video_path):
+    """Label from the dataset directory or the file naming (None if unknown)."""
+    directory = os.path.basename(os.path.dirname(os.path.abspath(video_path))).lower()
+    if directory == 'nonviolence':
+        return 0
+    if directory == 'violence':
+        return 1
+    return infer_label(os.path.basename(video_path))
+
+def embed_video(detector, backbone, video_path, stride=2, batch_size=32, max_frames=None):
+    """
+    Embed every stride-th frame of a video.
+    
+    Args:
+        detector: ViolenceDetector used for preprocessing
+        backbone: Pooled backbone of the per-frame model
+        video_path: Video file to read
+        stride: Embed one frame in every N (the live pipeline analyzes every 2nd frame)
+        batch_size: Frames per backbone call
+        max_frames: Optional limit on embedded frames
+    
+    Returns:
+        embeddings: Array of shape (frames, embedding_dim)
+    """
+    capture = cv2.VideoCapture(video_path)
+    embeddings = []
+    batch = []
+    index = 0
+    while max_frames is None or len(embeddings) + len(batch) < max_frames:
+        # grab() skips the decode for frames that will not be embedded
+        if index % stride:
+            index += 1
+            if not capture.grab():
+                break
+            continue
+        success, frame = capture.read()
+        index += 1
+        if not success:
+            break
+        batch.append(detector.preprocess_frame(frame))
+        if len(batch) == batch_size:
+            embeddings.extend(np.asarray(backbone(np.stack(batch), training=False)))
+            batch = []
+    if batch:
+        embeddings.extend(np.asarray(backbone(np.stack(batch), training=False)))
+    capture.release()
+    return np.array(embeddings, dtype=np.float32)
+
+def make_windows(embeddings, window_size, step):
+    """
+    Cut a video's embeddings into overlapping windows.
+    
+    Returns:
+        windows: Array of shape (count, window_size, embedding_dim)
+    """
+    if len(embeddings) < window_size:
+        return np.zeros((0, window_size, embeddings.shape[-1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+    starts = range(0, len(embeddings) - window_size + 1, step)
+    return np.stack([embeddings[start:start + window_size] for start in starts])
+
+def build_head(window_size, embedding_dim, units=64):
+    """LSTM over a window of embeddings with one sigmoid output, like the per-frame classifier."""
+    from keras.layers import Input, LSTM, Dropout, Dense
+    from keras.models import Model
+    
+    inputs = Input(shape=(window_size, embedding_dim))
+    outputs = Dense(1, activation='sigmoid')(Dropout(0.3)(LSTM(units)(inputs)))
+    head = Model(inputs=inputs, outputs=outputs)
+    head.compile(loss='binary_crossentropy', optimizer='adam', metrics=['accuracy'])
+    return head
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the temporal head for sequence-mode detection')
+    parser.add_argument('paths', nargs='+', help='Labelled video files or directories')
+    parser.add_argument('--model', default='models/modelnew.h5', help='Path to the per-frame model')
+    parser.add_argument('--output', default='models/temporal_head.h5', help='Where to save the head')
+    parser.add_argument('--label', action='append', type=parse_label, help='Video label as NAME:LABEL, 1 = violent')
+    parser.add_argument('--window', type=int, default=16, help='Window size in frames (SEQUENCE_WINDOW)')
+    parser.add_argument('--window-step', type=int, default=None, help='Frames between window starts (default: half a window)')
+    parser.add_argument('--stride', type=int, default=2, help='Embed one frame in every N (2 matches the live pipeline)')
+    parser.add_argument('--max-frames', type=int, default=None, help='Frames embedded per video')
+    parser.add_argument('--validation', type=float, default=0.2, help='Fraction of the videos held out for validation')
+    parser.add_argument('--epochs', type=int, default=30, help='Maximum training epochs')
+    parser.add_argument('--units', type=int, default=64, help='LSTM units')
+    parser.add_argument('--seed', type=int, default=73, help='Seed of the train/validation split')
+    
+    args = parser.parse_args()
+    if not os.path.isfile(args.model):
+        parser.error(f"model not found: {args.model}")
+    
+    overrides = dict(args.label or [])
+    videos = []
+    for video_path in collect_videos(args.paths):
+        label = overrides.get(os.path.basename(video_path), video_label(video_path))
+        if label is None:
+            print(f"Skipping unlabelled video: {video_path}")
+            continue
+        videos.append((video_path, label))
+    if not videos:
+        print("No labelled videos to train on")
+        return 1
+    
+    detector = ViolenceDetector(args.model, face_detection=False)
+    if detector.model is None:
+        print("The per-frame model could not be loaded")
+        return 1
+    backbone, _, embedding_dim = SequenceViolenceDetector.split_model(detector.model)
+    step = args.window_step or max(1, args.window // 2)
+    
+    print(f"Embedding {len(videos)} video(s)...")
+    windows = []
+    for video_path, label in videos:
+        embeddings = embed_video(detector, backbone, video_path, max(1, args.stride), max_frames=args.max_frames)
+        video_windows = make_windows(embeddings, args.window, step)
+        print(f"{os.path.basename(video_path)}: {len(embeddings)} frames, {len(video_windows)} windows, "
+              f"{'violent' if label else 'non-violent'}")
+        if len(video_windows):
+            windows.append((video_windows, label))
+    if not windows:
+        print(f"No video has the {args.window} frames a window needs")
+        return 1
+    
+    # Hold out whole videos, at least one if there are two or more
+    order = np.random.default_rng(args.seed).permutation(len(windows))
+    held_out = min(len(windows) - 1, int(round(len(windows) * args.validation)))
+    if args.validation > 0 and len(windows) > 1:
+        held_out = max(held_out, 1)
+    validation = [windows[i] for i in order[:held_out]]
+    training = [windows[i] for i in order[held_out:]]
+    
+    def stack(videos):
+        x = np.concatenate([video_windows for video_windows, _ in videos])
+        y = np.concatenate([np.full(len(video_windows), label, dtype=np.float32) for video_windows, label in videos])
+        return x, y
+    
+    x_train, y_train = stack(training)
+    validation_data = stack(validation) if validation else None
+    print(f"Training on {len(x_train)} windows of {len(training)} video(s), "
+          f"validating on {len(validation_data[0]) if validation_data else 0} windows of {len(validation)} video(s)")
+    
+    from keras.callbacks import EarlyStopping
+    head = build_head(args.window, embedding_dim, args.units)
+    callbacks = [EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)] if validation_data else []
+    # Violent and non-violent windows weigh the same however many of each there are
+    positives = float(y_train.mean())
+    class_weight = {0: 0.5 / (1 - positives), 1: 0.5 / positives} if 0 < positives < 1 else None
+    head.fit(x_train, y_train, validation_data=validation_data, epochs=args.epochs, batch_size=64,
+             class_weight=class_weight, callbacks=callbacks, verbose=2)
+    
+    if validation_data:
+        loss, accuracy = head.evaluate(*validation_data, verbose=0)
+        print(f"Validation accuracy {accuracy:.3f} (loss {loss:.3f})")
+    
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    head.save(args.output)
+    print(f"Temporal head saved to {args.output}; run the server with DETECTOR_MODE=sequence SEQUENCE_WINDOW={args.window}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,29 @@
 from . import detector
 from . import camera
 from . import notifier
+from . import sequence
+from . import smoothing
+from . import streaming
+from . import export
+from . import metrics
+from . import sources
+from . import faces
+from . import face_index
+from . import media
+from . import retention
+from . import enhance
+from . import privacy
+from . import hub
+from . import ws_stream
+from . import cache
+from . import mosaic
+from . import snapshot
+from . import registry
+from . import event_log
+from . import analytics
+from . import calibration
+from . import workers
+from . import correlation
 
 # Version
 __version__ = '1.0.0'
\ No newline at end of file
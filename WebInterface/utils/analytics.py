@@ -0,0 +1,242 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+
+PERIODS = ('hour', 'day')
+GROUPS = ('hour', 'day', 'camera', 'location')
+
+def bucket_start(timestamp, period):
+    """Start of the hour or day (UTC) a naive UTC datetime falls in."""
+    if period == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def review_seconds(incident):
+    """Seconds from an incident to its review (0 while unreviewed)."""
+    if not incident.reviewed or incident.reviewed_at is None or incident.timestamp is None:
+        return 0.0
+    return max(0.0, (incident.reviewed_at - incident.timestamp).total_seconds())
+
+def rollup_keys(incident):
+    """
+    Rollup rows an incident is counted in.
+    
+    Cameras are keyed by their row id (as a string, '' without a camera),
+    so renaming a camera keeps its history and equally named cameras stay apart.
+    
+    Returns:
+        keys: One (period, bucket, camera, location, reviewed) tuple per period
+    """
+    camera = str(incident.camera_id) if incident.camera_id is not None else ''
+    location = incident.camera.location if incident.camera is not None else ''
+    return [(period, bucket_start(incident.timestamp, period), camera, location, bool(incident.reviewed))
+            for period in PERIODS]
+
+class IncidentAnalytics:
+    """
+    Incremental incident rollups for the dashboard charts.
+    
+    Incident counts and summed review latency are kept per hour and per day,
+    camera and review status in the incident_rollups table. Every write of
+    an incident (new, reviewed, deleted) adjusts its rollup rows in the same
+    transaction, so chart queries read a number of rows that depends on the
+    requested range and the camera count, never on the size of the history.
+    """
+    
+    def __init__(self, db, rollup_model, incident_model, camera_model):
+        """
+        Initialize the analytics.
+        
+        Args:
+            db: Flask-SQLAlchemy instance
+            rollup_model: IncidentRollup model
+            incident_model: Incident model
+            camera_model: Camera model (names of the cameras in camera breakdowns)
+        """
+        self.db = db
+        self.Rollup = rollup_model
+        self.Incident = incident_model
+        self.Camera = camera_model
+        # Serializes read-modify-write of rollup rows between threads of this process
+        self.lock = threading.Lock()
+    
+    def _adjust(self, incident, sign):
+        """Add (sign=1) or remove (sign=-1) an incident from its rollup rows, without committing."""
+        seconds = review_seconds(incident)
+        for key in rollup_keys(incident):
+            row = self.db.session.get(self.Rollup, key)
+            if row is None:
+                period, bucket, camera, location, reviewed = key
+                row = self.Rollup(period=period, bucket=bucket, camera=camera, location=location,
+                                  reviewed=reviewed, count=0, review_seconds=0.0)
+                self.db.session.add(row)
+            row.count = (row.count or 0) + sign
+            row.review_seconds = (row.review_seconds or 0.0) + sign * seconds
+    
+    def add(self, incident):
+        """
+        Store a new incident row and count it.
+        
+        Args:
+            incident: Incident model instance (not yet added to the session)
+        """
+        with self.lock:
+            self.db.session.add(incident)
+            self.db.session.flush()
+            self._adjust(incident, 1)
+            self.db.session.commit()
+    
+    def review(self, incident, reviewer_id=None, reviewed_at=None):
+        """
+        Mark an incident reviewed and move it to the reviewed rollups.
+        
+        Returns:
+            changed: False if the incident was already reviewed
+        """
+        with self.lock:
+            if incident.reviewed:
+                return False
+            self._adjust(incident, -1)
+            incident.reviewed = True
+            incident.reviewed_by = reviewer_id
+            incident.reviewed_at = reviewed_at or datetime.utcnow()
+            self._adjust(incident, 1)
+            self.db.session.commit()
+            return True
+    
+    def delete(self, incident):
+        """Delete an incident row and uncount it (related rows must be deleted first)."""
+        with self.lock:
+            self._adjust(incident, -1)
+            self.db.session.delete(incident)
+            self.db.session.commit()
+    
+    def backfill(self, batch_size=1000):
+        """
+        Rebuild all rollups from the incidents table.
+        
+        Args:
+            batch_size: Incidents loaded per query batch
+        
+        Returns:
+            incidents: Number of incidents counted
+        """
+        totals = self.scan(batch_size)
+        with self.lock:
+            self.Rollup.query.delete()
+            self.db.session.bulk_save_objects([
+                self.Rollup(period=period, bucket=bucket, camera=camera, location=location,
+                            reviewed=reviewed, count=count, review_seconds=seconds)
+                for (period, bucket, camera, location, reviewed), (count, seconds) in totals.items()
+            ])
+            self.db.session.commit()
+        return sum(count for key, (count, seconds) in totals.items() if key[0] == PERIODS[0])
+    
+    def scan(self, batch_size=1000):
+        """
+        Reference rollups computed by scanning every incident.
+        
+        Returns:
+            totals: {(period, bucket, camera, location, reviewed): (count, review_seconds)}
+        """
+        totals = defaultdict(lambda: [0, 0.0])
+        query = self.Incident.query.options(joinedload(self.Incident.camera)).order_by(self.Incident.id)
+        for incident in query.yield_per(batch_size):
+            if incident.timestamp is None:
+                continue
+            seconds = review_seconds(incident)
+            for key in rollup_keys(incident):
+                totals[key][0] += 1
+                totals[key][1] += seconds
+        return {key: tuple(value) for key, value in totals.items()}
+    
+    def verify(self, tolerance=1e-3):
+        """
+        Compare the stored rollups with a full scan of the incidents table.
+        
+        Returns:
+            mismatches: List of (key, stored, expected) tuples; empty when consistent
+        """
+        expected = self.scan()
+        stored = {(row.period, row.bucket, row.camera, row.location, row.reviewed): (row.count, row.review_seconds)
+                  for row in self.Rollup.query.filter(self.Rollup.count != 0)}
+        mismatches = []
+        for key in sorted(set(expected) | set(stored), key=str):
+            have = stored.get(key, (0, 0.0))
+            want = expected.get(key, (0, 0.0))
+            if have[0] != want[0] or abs(have[1] - want[1]) > tolerance:
+                mismatches.append((key, have, want))
+        return mismatches
+    
+    def chart(self, group, start, end):
+        """
+        Chart data for incidents between two times.
+        
+        Hourly and daily series include empty buckets; camera and location
+        breakdowns are read from the daily rollups, so their range is rounded
+        out to whole days.
+        
+        Args:
+            group: 'hour', 'day', 'camera' or 'location'
+            start: Range start (naive UTC datetime)
+            end: Range end (naive UTC datetime, exclusive)
+        
+        Returns:
+            rows: List of {'key', 'incidents', 'reviewed', 'unreviewed', 'avg_review_seconds'};
+                camera rows key on the camera's current name and add its 'camera_id'
+        
+        Raises:
+            ValueError: If group is unknown
+        """
+        if group not in GROUPS:
+            raise ValueError(f"group must be one of {', '.join(GROUPS)}")
+        
+        period = group if group in PERIODS else 'day'
+        Rollup = self.Rollup
+        key = Rollup.bucket if group in PERIODS else getattr(Rollup, group)
+        reviewed_count = func.sum(case((Rollup.reviewed == True, Rollup.count), else_=0))
+        query = (self.db.session.query(key, func.sum(Rollup.count), reviewed_count, func.sum(Rollup.review_seconds))
+                 .filter(Rollup.period == period,
+                         Rollup.bucket >= bucket_start(start, period),
+                         Rollup.bucket < end)
+                 .group_by(key))
+        
+        totals = {}
+        for value, count, reviewed, seconds in query:
+            totals[value] = (int(count or 0), int(reviewed or 0), float(seconds or 0.0))
+        
+        if group in PERIODS:
+            # Continuous time axis for the charts
+            step = timedelta(hours=1) if period == 'hour' else timedelta(days=1)
+            keys = []
+            bucket = bucket_start(start, period)
+            while bucket < end:
+                keys.append(bucket)
+                bucket += step
+        else:
+            keys = sorted(totals, key=lambda value: -totals[value][0])
+        
+        names = {}
+        if group == 'camera':
+            ids = [int(value) for value in keys if value.isdigit()]
+            if ids:
+                names = {str(camera.id): camera.name for camera in self.Camera.query.filter(self.Camera.id.in_(ids))}
+        
+        rows = []
+        for value in keys:
+            count, reviewed, seconds = totals.get(value, (0, 0, 0.0))
+            row = {
+                'key': value.isoformat() + 'Z' if isinstance(value, datetime) else value,
+                'incidents': count,
+                'reviewed': reviewed,
+                'unreviewed': count - reviewed,
+                'avg_review_seconds': round(seconds / reviewed, 1) if reviewed else None
+            }
+            if group == 'camera':
+                row['key'] = names.get(value, 'Unknown')
+                row['camera_id'] = int(value) if value.isdigit() else None
+            rows.append(row)
+        return rows
@@ -0,0 +1,77 @@
+import time
+import threading
+from collections import OrderedDict
+
+from .metrics import metrics
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache with a time-to-live and LRU eviction.
+    
+    Entries expire ttl seconds after they were stored, and once max_size
+    entries are held the least recently used one is evicted. Callers that
+    change the underlying data invalidate its entry explicitly, so the TTL
+    only bounds how stale an entry changed elsewhere (another process, a
+    direct database edit) can get.
+    """
+    
+    def __init__(self, name, max_size=1024, ttl=60.0):
+        """
+        Initialize the cache.
+        
+        Args:
+            name: Cache name (label of the cache metrics)
+            max_size: Maximum number of entries
+            ttl: Seconds an entry stays valid (0 disables caching)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """
+        Look up an entry.
+        
+        Args:
+            key: Entry key
+        
+        Returns:
+            value: Cached value, or None if missing or expired
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                metrics.cache_requests_total.inc(cache=self.name, result='hit')
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+        metrics.cache_requests_total.inc(cache=self.name, result='miss')
+        return None
+    
+    def put(self, key, value):
+        """Store an entry, evicting the least recently used ones beyond max_size."""
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, key):
+        """Drop one entry (after the underlying data changed)."""
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry."""
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import itertools
+import threading
+import numpy as np
+
+from .smoothing import ALERT, TemporalSmoother
+
+# One row per analyzed frame: capture time (epoch or video seconds) and raw model score
+SCORE_DTYPE = np.dtype([('time', '<f8'), ('score', '<f4')])
+
+# Settings swept by default; every combination is replayed
+DEFAULT_GRID = {
+    'history_size': [5, 10, 15, 20, 30],
+    'warning_threshold': [0.5, 0.6, 0.7, 0.8],
+    'alert_threshold': [0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95],
+    'violence_threshold': [10, 20, 40, 60],
+    'alert_cooldown': [10, 30, 60]
+}
+
+def safe_name(name):
+    """File-name-safe version of a camera id or video name."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(name))
+
+def save_scores(path, times, scores):
+    """
+    Write a score recording.
+    
+    Args:
+        path: .npy file to write
+        times: Frame times in seconds
+        scores: Raw model scores aligned with times
+    """
+    recording = np.empty(len(times), dtype=SCORE_DTYPE)
+    recording['time'] = times
+    recording['score'] = scores
+    np.save(path, recording)
+
+def load_scores(paths):
+    """
+    Load score recordings as memory maps.
+    
+    Segments written by ScoreRecorder for the same camera (name.<start>.npy)
+    are joined into one recording; rows a segment never filled are dropped.
+    
+    Args:
+        paths: .npy files and/or directories of them
+    
+    Returns:
+        recordings: {name: structured array with 'time' and 'score'}, in time order
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.npy'))
+        else:
+            files.append(path)
+    
+    segments = {}
+    for path in files:
+        base = os.path.basename(path)[:-len('.npy')]
+        name, _, start = base.rpartition('.')
+        if not (name and start.isdigit()):
+            name, start = base, '0'
+        segments.setdefault(name, []).append((int(start), path))
+    
+    recordings = {}
+    for name, parts in segments.items():
+        arrays = []
+        for start, path in sorted(parts):
+            array = np.load(path, mmap_mode='r')
+            arrays.append(array[~np.isnan(array['time'])])
+        recordings[name] = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+    return recordings
+
+class ScoreRecorder:
+    """
+    Records raw per-frame model scores of live cameras for offline calibration.
+    
+    Each camera writes into a preallocated memory-mapped .npy segment
+    (camera.<start ms>.npy, segment_frames rows, unfilled rows NaN). A
+    record() is a store into the page cache; the kernel writes the pages
+    back in the background, so the detection loop does no file I/O.
+    """
+    
+    def __init__(self, directory, segment_frames=65536):
+        """
+        Initialize the recorder.
+        
+        Args:
+            directory: Folder for the segment files
+            segment_frames: Rows per segment (65536 rows take 768 KB)
+        """
+        self.directory = directory
+        self.segment_frames = segment_frames
+        self.segments = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _open_segment(self, camera_id, timestamp):
+        """Create a camera's next segment file."""
+        path = os.path.join(self.directory, f"{safe_name(camera_id)}.{int(timestamp * 1000)}.npy")
+        segment = np.lib.format.open_memmap(path, mode='w+', dtype=SCORE_DTYPE, shape=(self.segment_frames,))
+        segment['time'] = np.nan
+        return [segment, 0]
+    
+    def record(self, camera_id, score, timestamp=None):
+        """
+        Record one raw model score.
+        
+        Args:
+            camera_id: Camera the frame came from
+            score: Raw violence probability
+            timestamp: Epoch seconds (defaults to now)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            current = self.segments.get(camera_id)
+            if current is None or current[1] >= self.segment_frames:
+                if current is not None:
+                    current[0].flush()
+                current = self.segments[camera_id] = self._open_segment(camera_id, timestamp)
+            segment, position = current
+            segment[position] = (timestamp, score)
+            current[1] = position + 1
+    
+    def close(self):
+        """Flush all open segments to disk."""
+        with self.lock:
+            for segment, position in self.segments.values():
+                segment.flush()
+            self.segments = {}
+
+def parameter_grid(grid):
+    """
+    Expand a grid into one array per setting, one entry per combination.
+    
+    Args:
+        grid: {setting: list of values}
+    
+    Returns:
+        settings: {setting: array of length combinations}
+    """
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[name] for name in names)))
+    return {name: np.array([combination[i] for combination in combinations]) for i, name in enumerate(names)}
+
+def replay(recordings, settings, labels=None):
+    """
+    Replay recorded scores through the alert state machine for many settings at once.
+    
+    Every parameter combination is one state row of a TemporalSmoother, so
+    each recorded frame advances all combinations in a single vectorized
+    update_slots call. Each recording starts from a fresh state.
+    
+    Args:
+        recordings: {name: structured array with 'time' and 'score'}
+        settings: {setting: array}, one entry per combination (see parameter_grid)
+        labels: {name: 1 if the recording shows violence, 0 if not}; unlabelled
+            recordings only count alerts
+    
+    Returns:
+        results: Dictionary of per-combination arrays:
+            alerts: ALERT states entered over all recordings
+            detected: Fraction of violent recordings with at least one alert
+            time_to_alert: Median seconds from the start of a violent recording to its first alert
+            false_alerts: Alerts entered in non-violent recordings
+            false_alerts_per_hour: false_alerts per hour of non-violent footage
+            false_alert_rate: Fraction of non-violent recordings with at least one alert
+    """
+    labels = labels or {}
+    count = len(next(iter(settings.values())))
+    idx = np.arange(count)
+    max_history = max(int(np.max(settings.get('history_size', [10]))), 1)
+    
+    alerts = np.zeros(count, dtype=np.int64)
+    false_alerts = np.zeros(count, dtype=np.int64)
+    first_alerts = []
+    normal_alerted = []
+    normal_seconds = 0.0
+    
+    for name, recording in recordings.items():
+        if len(recording) == 0:
+            continue
+        smoother = TemporalSmoother(history_size=max_history, max_history=max_history, capacity=count)
+        for setting, values in settings.items():
+            getattr(smoother, setting)[:] = values
+        
+        times = np.asarray(recording['time'], dtype=np.float64)
+        scores = np.asarray(recording['score'], dtype=np.float64)
+        start = times[0]
+        in_alert = np.zeros(count, dtype=bool)
+        recording_alerts = np.zeros(count, dtype=np.int64)
+        first_alert = np.full(count, np.nan)
+        
+        for now, score in zip(times, scores):
+            _, states = smoother.update_slots(idx, score, now)
+            alerting = states == ALERT
+            entered = alerting & ~in_alert
+            recording_alerts += entered
+            first_alert[entered & np.isnan(first_alert)] = now - start
+            in_alert = alerting
+        
+        alerts += recording_alerts
+        label = labels.get(name)
+        if label == 1:
+            first_alerts.append(first_alert)
+        elif label == 0:
+            false_alerts += recording_alerts
+            normal_alerted.append(recording_alerts > 0)
+            normal_seconds += max(times[-1] - start, 0.0)
+    
+    results = {'alerts': alerts}
+    if first_alerts:
+        first_alerts = np.vstack(first_alerts)
+        detected = ~np.isnan(first_alerts)
+        results['detected'] = detected.mean(axis=0)
+        median = np.full(count, np.nan)
+        any_detected = detected.any(axis=0)
+        median[any_detected] = np.nanmedian(first_alerts[:, any_detected], axis=0)
+        results['time_to_alert'] = median
+    if normal_alerted:
+        results['false_alerts'] = false_alerts
+        results['false_alerts_per_hour'] = false_alerts / (normal_seconds / 3600) if normal_seconds else np.full(count, np.nan)
+        results['false_alert_rate'] = np.vstack(normal_alerted).mean(axis=0)
+    return results
+
+def rank(settings, results, max_false_alerts_per_hour=None):
+    """
+    Order combinations from best to worst.
+    
+    Highest detection rate first, then fewest false alerts per hour, then
+    fastest time to alert. Combinations above max_false_alerts_per_hour are
+    left out.
+    
+    Returns:
+        rows: List of dictionaries with the settings and metrics of each combination
+    """
+    count = len(results['alerts'])
+    detected = results.get('detected', np.zeros(count))
+    false_rate = results.get('false_alerts_per_hour', np.zeros(count))
+    time_to_alert = np.nan_to_num(results.get('time_to_alert', np.zeros(count)), nan=np.inf)
+    
+    keep = np.ones(count, dtype=bool)
+    if max_false_alerts_per_hour is not None:
+        keep &= np.nan_to_num(false_rate) <= max_false_alerts_per_hour
+    order = np.lexsort((time_to_alert, false_rate, -detected))
+    
+    rows = []
+    for i in order:
+        if not keep[i]:
+            continue
+        row = {name: values[i].item() for name, values in settings.items()}
+        for metric, values in results.items():
+            value = values[i].item()
+            if isinstance(value, float):
+                value = None if np.isnan(value) else round(value, 4)
+            row[metric] = value
+        rows.append(row)
+    return rows
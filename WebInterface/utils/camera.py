@@ -2,6 +2,8 @@ import cv2
 import threading
 import time
 
+from .sources import open_source
+
 class Camera:
     """Camera access wrapper for handling camera streams."""
     
@@ -10,7 +12,7 @@ class Camera:
         Initialize camera.
         
         Args:
-            camera_id: Camera identifier (0 for webcam, URL for IP camera)
+            camera_id: Camera identifier (0 for webcam, URL for IP camera or virtual source)
             width: Desired frame width
             height: Desired frame height
         """
@@ -37,7 +39,7 @@ class Camera:
             return
         
         # Open camera
-        self.video = cv2.VideoCapture(self.camera_id)
+        self.video = open_source(self.camera_id)
         
         # Set resolution
         self.video.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
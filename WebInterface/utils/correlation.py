@@ -0,0 +1,179 @@
+import json
+import time
+import threading
+from collections import deque
+
+from .metrics import metrics
+
+class IncidentCorrelator:
+    """
+    Merges near-simultaneous incidents from related cameras into one.
+    
+    Without it, one fight seen by three cameras becomes three incidents,
+    three alerts and three notifications. The first incident recorded opens
+    a group; an incident from a related camera whose time span comes within
+    `window` seconds of the group joins it as extra evidence instead of
+    being recorded and announced on its own. Cameras are related when they
+    share a location (by_location), are listed in the same group or are
+    listed as adjacent. A group grows camera by camera, so a fight moving
+    down a corridor of adjacent cameras stays one incident.
+    
+    Every decision is kept (the last max_decisions) for /api/correlation.
+    """
+    
+    def __init__(self, window=30.0, groups=None, adjacent=None, by_location=True, max_decisions=200):
+        """
+        Initialize the correlator.
+        
+        Args:
+            window: Seconds between incidents that may still be merged (0 disables merging)
+            groups: Lists of camera ids or names that all see the same area
+            adjacent: [camera, camera] pairs with neighbouring views
+            by_location: Relate cameras registered with the same location
+            max_decisions: Decisions kept for status()
+        """
+        self.window = window
+        self.by_location = by_location
+        self.neighbours = {}
+        for group in groups or []:
+            for camera in group:
+                self.neighbours.setdefault(str(camera), set()).update(str(other) for other in group if other != camera)
+        for first, second in adjacent or []:
+            self.neighbours.setdefault(str(first), set()).add(str(second))
+            self.neighbours.setdefault(str(second), set()).add(str(first))
+        
+        self.open = []
+        self.decisions = deque(maxlen=max_decisions)
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def from_file(cls, path, window=30.0):
+        """
+        Create a correlator from an optional JSON file.
+        
+        The file may set "window", "by_location", "groups" (lists of camera
+        ids or names) and "adjacent" (pairs of them); window is the default
+        when no file is given or it does not set one.
+        """
+        settings = {}
+        if path:
+            with open(path) as f:
+                settings = json.load(f)
+        return cls(window=float(settings.get('window', window)),
+                   groups=settings.get('groups'),
+                   adjacent=settings.get('adjacent'),
+                   by_location=settings.get('by_location', True))
+    
+    @property
+    def enabled(self):
+        """Whether incidents are merged at all."""
+        return self.window > 0
+    
+    def _relation(self, camera, member):
+        """
+        Why two cameras see the same area, or None.
+        
+        Args:
+            camera, member: Camera dicts with 'id', 'name' and 'location'
+        """
+        if camera['id'] == member['id']:
+            return None
+        location = (camera.get('location') or '').strip().lower()
+        if self.by_location and location and location == (member.get('location') or '').strip().lower():
+            return f"same location '{camera['location'].strip()}'"
+        for key in (camera['id'], camera.get('name')):
+            if key is not None and self.neighbours.get(str(key), set()) & {str(member['id']), str(member.get('name'))}:
+                return f"adjacent to {member.get('name') or member['id']}"
+        return None
+    
+    def correlate(self, incident, camera, started_at, ended_at):
+        """
+        Decide whether an incident joins an open group or opens a new one.
+        
+        The caller records a new group's incident and then sets the group's
+        'ready' event; merged incidents wait for it before adding their
+        evidence, so the primary incident is always saved first.
+        
+        Args:
+            incident: Incident dict about to be recorded
+            camera: Camera dict ('id', 'name', 'location') the incident comes from
+            started_at: Epoch seconds the incident started
+            ended_at: Epoch seconds the incident ended
+        
+        Returns:
+            group: The group dict ('incident' is its primary incident), or None when disabled
+            merged: True if the incident belongs to an existing group
+        """
+        if not self.enabled:
+            return None, False
+        
+        now = time.time()
+        with self.lock:
+            # Groups stay open for a window after their last incident was recorded
+            self.open = [group for group in self.open if group['touched'] + self.window >= now]
+            
+            for group in reversed(self.open):
+                if started_at > group['ended_at'] + self.window or ended_at < group['started_at'] - self.window:
+                    continue
+                for member in group['cameras']:
+                    reason = self._relation(camera, member)
+                    if reason is None:
+                        continue
+                    
+                    gap = max(started_at - group['ended_at'], group['started_at'] - ended_at, 0.0)
+                    group['started_at'] = min(group['started_at'], started_at)
+                    group['ended_at'] = max(group['ended_at'], ended_at)
+                    group['touched'] = now
+                    if all(member['id'] != camera['id'] for member in group['cameras']):
+                        group['cameras'].append(camera)
+                    self._decide(incident, camera, 'merged', reason, group['incident']['id'], gap)
+                    metrics.incidents_merged_total.inc(camera=camera['id'])
+                    return group, True
+            
+            group = {
+                'incident': incident,
+                'cameras': [camera],
+                'started_at': started_at,
+                'ended_at': ended_at,
+                'touched': now,
+                'ready': threading.Event()
+            }
+            self.open.append(group)
+            self._decide(incident, camera, 'new', 'no related incident within the window')
+            return group, False
+    
+    def discard(self, group):
+        """Close a group whose primary incident could not be recorded; waiting merges record on their own."""
+        with self.lock:
+            group['failed'] = True
+            if group in self.open:
+                self.open.remove(group)
+    
+    def _decide(self, incident, camera, decision, reason, primary=None, gap=None):
+        """Keep and log a correlation decision."""
+        self.decisions.append({
+            'time': time.time(),
+            'incident': incident['id'],
+            'camera': camera['id'],
+            'decision': decision,
+            'primary': primary,
+            'reason': reason,
+            'gap_seconds': None if gap is None else round(gap, 1)
+        })
+        if decision == 'merged':
+            print(f"Incident {incident['id']} from {camera['id']} merged into {primary}: {reason}, {gap:.1f}s apart")
+    
+    def status(self):
+        """Settings, open groups and recent decisions."""
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'window': self.window,
+                'by_location': self.by_location,
+                'neighbours': {camera: sorted(others) for camera, others in self.neighbours.items()},
+                'open': [{'incident': group['incident']['id'],
+                          'cameras': [camera['id'] for camera in group['cameras']],
+                          'started_at': group['started_at'],
+                          'ended_at': group['ended_at']} for group in self.open],
+                'decisions': list(reversed(self.decisions))
+            }
@@ -2,18 +2,33 @@ import cv2
 import numpy as np
 import os
 import time
-from collections import deque
 from keras.models import load_model
 from mtcnn.mtcnn import MTCNN
 import matplotlib.pyplot as plt
 from datetime import datetime
 import pytz
+from .smoothing import TemporalSmoother
+from .metrics import metrics
+
+def model_input_size(model, default=128):
+    """Square input size of an image model (default if the model does not declare one)."""
+    try:
+        return int(model.input_shape[1])
+    except (AttributeError, IndexError, TypeError):
+        return default
 
 class ViolenceDetector:
-    def __init__(self, model_path='models/modelnew.h5'):
-        """Initialize the violence detector with the trained model."""
+    def __init__(self, model_path='models/modelnew.h5', face_detection=True):
+        """
+        Initialize the violence detector with the trained model.
+        
+        Args:
+            model_path: Path to the trained Keras model
+            face_detection: Load MTCNN for detect_faces (not needed for offline scoring)
+        """
         # Load the model if it exists
         self.model = None
+        self.model_name = None
         try:
             if os.path.exists(model_path):
                 print(f"Loading model from {model_path}...")
@@ -23,6 +38,8 @@ class ViolenceDetector:
                 tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
                 
                 self.model = load_model(model_path)
+                self.model_name = os.path.splitext(os.path.basename(model_path))[0]
+                metrics.model_active.set(1, model=self.model_name)
                 print("Model loaded successfully!")
             else:
                 print(f"Model not found at {model_path}. Please ensure the model file exists.")
@@ -30,110 +47,176 @@ class ViolenceDetector:
             print(f"Error loading model: {e}")
             print("The system will run without violence detection capabilities.")
         
-        # Initialize prediction queue for smoothing
-        self.Q = deque(maxlen=128)
-        
         # Initialize MTCNN for face detection
-        self.face_detector = MTCNN()
+        self.face_detector = MTCNN() if face_detection else None
         
-        # Violence detection counters and parameters
-        self.violence_counter = 0
-        self.violence_threshold = 40  # Same as in your original code
-        self.last_alert_time = 0
-        self.alert_cooldown = 60  # Seconds between alerts
+        # Per-camera temporal smoothing and MONITORING/WARNING/ALERT state machine
+        self.smoother = TemporalSmoother(
+            history_size=10,
+            warning_threshold=0.70,  # Higher confidence for warnings
+            alert_threshold=0.85,  # Very high confidence for alerts
+            violence_threshold=40,  # Same as in your original code
+            alert_cooldown=60  # Seconds between alerts
+        )
         
-        # Create confidence history for smoothing predictions
-        self.confidence_history = []
-        self.history_size = 10
+        # State of the most recently processed camera (used by /api/status)
+        self.current_state = "MONITORING"
         
-        # Detection states
-        self.current_state = "MONITORING"  # States: MONITORING, WARNING, ALERT
-        self.warning_threshold = 0.70  # Higher confidence for warnings
-        self.alert_threshold = 0.85  # Very high confidence for alerts
+        # Optional EventLog of per-camera confidence and state transitions
+        self.event_log = None
         
-    def process_frame(self, frame):
+        # Optional ScoreRecorder of raw scores for offline calibration
+        self.score_recorder = None
+    
+    @property
+    def input_size(self):
+        """Input size of the active model."""
+        return model_input_size(self.model)
+    
+    def swap_model(self, model, name=None):
         """
-        Process a single frame for violence detection.
+        Replace the active model without interrupting the streams using it.
+        
+        The model should already be loaded and warmed up. Frames being
+        analyzed finish on the model they started with (process_frame reads
+        the model once), and the next frame uses the new one.
         
         Args:
-            frame: The input frame to process
+            model: Loaded Keras model
+            name: Variant name reported by /api/models and the metrics
+        """
+        previous = self.model_name
+        self.model = model
+        self.model_name = name
+        if previous is not None:
+            metrics.model_active.set(0, model=previous)
+        if name is not None:
+            metrics.model_active.set(1, model=name)
+        print(f"Active model: {name} (input {self.input_size}x{self.input_size})")
+    
+    def preprocess_frame(self, frame, size=None):
+        """
+        Convert a BGR frame into the normalised model input.
+        
+        Args:
+            frame: The input frame (BGR, uint8)
+            size: Model input size (defaults to the active model's)
             
         Returns:
-            processed_frame: The frame with annotations
-            is_violence: Boolean indicating if violence is detected
+            processed: size x size x 3 float32 array scaled to [0, 1]
         """
-        if self.model is None:
-            # If model isn't loaded, just return the original frame
-            return frame, False
-        
-        # Clone the frame for output
-        output = frame.copy()
-        
-        # Get frame dimensions for UI positioning
-        height, width = output.shape[:2]
-        
-        # Preprocess the frame for the model
+        size = size or self.input_size
         processed = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        processed = cv2.resize(processed, (128, 128)).astype("float32")
-        processed = processed.reshape(128, 128, 3) / 255
+        processed = cv2.resize(processed, (size, size)).astype("float32")
+        return processed.reshape(size, size, 3) / 255
+    
+    def predict(self, processed, camera_id=None, model=None):
+        """
+        Run the model on a preprocessed frame.
         
-        # Make prediction with reduced verbosity
-        try:
-            # Suppress TensorFlow warnings during prediction
-            import tensorflow as tf
-            old_level = tf.compat.v1.logging.get_verbosity()
-            tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-            
-            # Make prediction
-            preds = self.model.predict(np.expand_dims(processed, axis=0), verbose=0)[0]
+        Args:
+            processed: Output of preprocess_frame
+            camera_id: Camera the frame belongs to (unused in per-frame mode)
+            model: Model to run (defaults to the active one)
             
-            # Restore logging level
-            tf.compat.v1.logging.set_verbosity(old_level)
+        Returns:
+            preds: Array of model outputs, preds[0] is the violence probability
+        """
+        model = model or self.model
+        # TensorFlow logging is already reduced when the model is loaded
+        try:
+            preds = model.predict(np.expand_dims(processed, axis=0), verbose=0)[0]
         except Exception as e:
             print(f"Error during prediction: {e}")
             # Return a safe default if prediction fails
             preds = np.array([0.0])
+        
+        return preds
+    
+    def predict_batch(self, processed_frames):
+        """
+        Run the model on several preprocessed frames in one call.
+        
+        Args:
+            processed_frames: List of preprocess_frame outputs
             
-        # Add to prediction queue for smoothing
-        self.Q.append(preds)
+        Returns:
+            scores: Array of violence probabilities, one per frame
+        """
+        model = self.model
+        if model is None or not processed_frames:
+            return np.zeros(len(processed_frames), dtype=np.float32)
+        
+        batch = np.stack(processed_frames)
+        preds = model.predict(batch, batch_size=len(batch), verbose=0)
+        return preds[:, 0]
+    
+    def process_frame(self, frame, camera_id=None):
+        """
+        Process a single frame for violence detection.
         
-        # Get confidence score (probability of violence)
-        confidence_score = float(preds[0])
+        Args:
+            frame: The input frame to process
+            camera_id: Identifier of the camera the frame came from
+            
+        Returns:
+            processed_frame: The frame with annotations
+            is_violence: Boolean indicating if violence is detected
+        """
+        # Read the model once so a concurrent swap_model cannot change it mid-frame
+        model = self.model
+        if model is None:
+            # If model isn't loaded, just return the original frame
+            return frame, False
         
-        # Add to confidence history for temporal smoothing
-        self.confidence_history.append(confidence_score)
-        if len(self.confidence_history) > self.history_size:
-            self.confidence_history.pop(0)
+        # Preprocess the frame and run the model
+        start = time.perf_counter()
+        processed = self.preprocess_frame(frame, model_input_size(model))
+        preprocessed = time.perf_counter()
+        preds = self.predict(processed, camera_id, model)
+        predicted = time.perf_counter()
+        
+        # Smooth the confidence score and advance the camera's state machine
+        smoothed_confidence, self.current_state = self.smoother.update(camera_id, float(preds[0]))
+        if self.event_log is not None:
+            self.event_log.record(camera_id, float(preds[0]), smoothed_confidence, self.current_state)
+        if self.score_recorder is not None:
+            self.score_recorder.record(camera_id, float(preds[0]))
+        smoothed = time.perf_counter()
+        
+        # Annotate the frame with the camera's status
+        counter = self.smoother.get_counter(camera_id)
+        violence_threshold = self.smoother.get_settings(camera_id)['violence_threshold']
+        output = self.draw_status(frame, self.current_state, smoothed_confidence, counter, violence_threshold)
+        
+        # Record per-stage latencies
+        metrics.observe_stage('preprocess', camera_id, preprocessed - start)
+        metrics.observe_stage('predict', camera_id, predicted - preprocessed)
+        metrics.observe_stage('smoothing', camera_id, smoothed - predicted)
+        metrics.observe_stage('overlay', camera_id, time.perf_counter() - smoothed)
+        metrics.frames_processed_total.inc(camera=camera_id)
         
-        # Calculate smoothed confidence using recent history
-        smoothed_confidence = sum(self.confidence_history) / len(self.confidence_history)
+        return output, self.current_state == "ALERT"
+    
+    def draw_status(self, frame, state, confidence, counter, violence_threshold):
+        """
+        Draw the detection status overlay on a copy of the frame.
         
-        # Determine violence state based on smoothed confidence
-        is_violence = smoothed_confidence > 0.50
-        is_warning = smoothed_confidence > self.warning_threshold
-        is_alert = smoothed_confidence > self.alert_threshold
+        Args:
+            frame: The input frame
+            state: Detection state (MONITORING, WARNING or ALERT)
+            confidence: Smoothed violence confidence
+            counter: Current evidence counter value
+            violence_threshold: Counter value that raises an alert
+            
+        Returns:
+            output: Annotated copy of the frame
+        """
+        # Clone the frame for output
+        output = frame.copy()
         
-        # Update violence counter based on confidence
-        if is_violence:
-            self.violence_counter += 1
-        else:
-            # Decrease counter more slowly than it increases
-            self.violence_counter = max(0, self.violence_counter - 0.5)
-        
-        # Determine if we should trigger an alert
-        should_alert = (self.violence_counter >= self.violence_threshold and 
-                        (time.time() - self.last_alert_time) > self.alert_cooldown)
-        
-        # Update state based on counters and thresholds
-        if should_alert or is_alert:
-            self.current_state = "ALERT"
-            self.last_alert_time = time.time()
-            # Reset counter partially to avoid continuous alerts
-            self.violence_counter = self.violence_threshold // 2
-        elif is_warning:
-            self.current_state = "WARNING"
-        else:
-            self.current_state = "MONITORING"
+        # Get frame dimensions for UI positioning
+        height, width = output.shape[:2]
         
         # Draw background rectangle for status display
         status_bg_color = (0, 0, 0)
@@ -144,10 +227,10 @@ class ViolenceDetector:
         cv2.addWeighted(overlay, status_bg_opacity, output, 1 - status_bg_opacity, 0, output)
         
         # Set UI colors based on state
-        if self.current_state == "ALERT":
+        if state == "ALERT":
             status_color = (0, 0, 255)  # Red for alert
             status_text = "VIOLENCE ALERT!"
-        elif self.current_state == "WARNING":
+        elif state == "WARNING":
             status_color = (0, 165, 255)  # Orange for warning
             status_text = "Potential Violence Detected"
         else:
@@ -157,15 +240,15 @@ class ViolenceDetector:
         # Add status text and confidence to the output frame
         cv2.putText(output, status_text, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, status_color, 3)
         
-        confidence_text = f"Confidence: {smoothed_confidence*100:.1f}%"
+        confidence_text = f"Confidence: {confidence*100:.1f}%"
         cv2.putText(output, confidence_text, (20, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
         
         # Add counter indicator
-        counter_text = f"Alert Counter: {int(self.violence_counter)}/{self.violence_threshold}"
+        counter_text = f"Alert Counter: {int(counter)}/{violence_threshold}"
         cv2.putText(output, counter_text, (20, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
         # For alert state, add additional visual warning
-        if self.current_state == "ALERT":
+        if state == "ALERT":
             # Pulse animation based on time
             pulse = 0.7 + 0.3 * np.sin(time.time() * 5)
             
@@ -199,17 +282,24 @@ class ViolenceDetector:
             cv2.putText(output, alert_text, (text_x, text_y), 
                        alert_font, alert_scale, (0, 0, 255), alert_thickness)
         
-        return output, self.current_state == "ALERT"
+        return output
     
-    def detect_faces(self, image):
+    def detect_faces(self, image, camera_id=None, strict=False):
         """
         Detect faces in the given image using MTCNN.
         
         Args:
             image: The input image
+            camera_id: Camera the image came from (for metrics)
+            strict: Raise instead of returning no faces when detection is unavailable
+                or fails (for privacy blurring, which must not mistake a failure for
+                "no faces")
             
         Returns:
             faces: List of detected face bounding boxes
+        
+        Raises:
+            RuntimeError: In strict mode, if faces could not be detected
         """
         # Convert BGR to RGB (MTCNN expects RGB)
         if len(image.shape) == 3 and image.shape[2] == 3:
@@ -218,14 +308,24 @@ class ViolenceDetector:
             else:
                 image_rgb = image  # Assume it's already RGB
         else:
+            if strict:
+                raise RuntimeError(f"Cannot detect faces in an image of shape {image.shape}")
             return []  # Can't process this image
             
+        if self.face_detector is None:
+            if strict:
+                raise RuntimeError("Face detection is not available")
+            return []
+        
         # Detect faces
         try:
-            faces = self.face_detector.detect_faces(image_rgb)
+            with metrics.timer('face_detection', camera_id):
+                faces = self.face_detector.detect_faces(image_rgb)
             return faces
         except Exception as e:
             print(f"Error detecting faces: {e}")
+            if strict:
+                raise RuntimeError(f"Face detection failed: {e}") from e
             return []
     
     def draw_faces(self, image, faces):
@@ -254,7 +354,7 @@ class ViolenceDetector:
         
         return marked_image
     
-    def extract_face_images(self, image, faces, output_folder):
+    def extract_face_images(self, image, faces, output_folder, enhancer=None):
         """
         Extract each face as a separate image and save to output folder.
         
@@ -262,11 +362,14 @@ class ViolenceDetector:
             image: The input image
             faces: List of detected face bounding boxes
             output_folder: Folder to save extracted faces
+            enhancer: Optional FaceEnhancer; an enhanced copy of each face is
+                saved next to it as face_<timestamp>_<i>.enhanced.jpg
             
         Returns:
             face_paths: List of paths to saved face images
         """
         face_paths = []
+        face_images = []
         
         # Create output folder if it doesn't exist
         os.makedirs(output_folder, exist_ok=True)
@@ -285,5 +388,11 @@ class ViolenceDetector:
             cv2.imwrite(face_path, face_image)
             
             face_paths.append(face_path)
+            face_images.append(face_image)
+        
+        # Enhance all faces of the image as one batch
+        if enhancer is not None and face_images:
+            for face_path, enhanced in zip(face_paths, enhancer.enhance_batch(face_images)):
+                cv2.imwrite(f"{os.path.splitext(face_path)[0]}.enhanced.jpg", enhanced)
         
         return face_paths
\ No newline at end of file
@@ -0,0 +1,253 @@
+import os
+import time
+import sqlite3
+import itertools
+import threading
+from collections import deque
+
+from .metrics import metrics
+from .smoothing import MONITORING, STATE_NAMES
+
+# Row kinds
+SAMPLE = 0
+TRANSITION = 1
+
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+# Clustered on (camera, ts) so a timeline is one contiguous range scan. seq
+# numbers the transitions of a camera within one millisecond. Scores are stored
+# in thousandths, which SQLite packs into two bytes instead of eight.
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS events ('
+    'camera TEXT NOT NULL, ts INTEGER NOT NULL, kind INTEGER NOT NULL, seq INTEGER NOT NULL, '
+    'state INTEGER NOT NULL, previous INTEGER, confidence INTEGER NOT NULL, score INTEGER NOT NULL, '
+    'PRIMARY KEY (camera, ts, kind, seq)) WITHOUT ROWID',
+)
+
+# Logs written before seq existed are copied into the new table with seq 0
+MIGRATION = (
+    'ALTER TABLE events RENAME TO events_without_seq',
+) + SCHEMA + (
+    'INSERT INTO events SELECT camera, ts, kind, 0, state, previous, confidence, score FROM events_without_seq',
+    'DROP TABLE events_without_seq',
+)
+
+class EventLog:
+    """
+    Append-only log of per-camera detection state and confidence.
+    
+    Every MONITORING/WARNING/ALERT transition is logged with its exact time.
+    Confidence is down-sampled to one sample per camera and sample_interval,
+    keeping the interval's peak smoothed confidence, raw score and state, so
+    short spikes survive. record() only appends to an in-memory buffer; a
+    background writer inserts the buffer into SQLite in one transaction per
+    flush_interval, so the detection loop never waits for the disk. Rows are
+    clustered by (camera, ts) for timeline queries.
+    """
+    
+    def __init__(self, path='event_log.db', sample_interval=1.0, flush_interval=1.0,
+                 max_age_days=30, max_pending=100000):
+        """
+        Initialize the log and start its writer.
+        
+        Args:
+            path: SQLite database file
+            sample_interval: Seconds per confidence sample and camera
+            flush_interval: Seconds between batched writes
+            max_age_days: Age at which rows are deleted (None to keep)
+            max_pending: Rows buffered while the disk is slow (oldest dropped beyond)
+        """
+        self.path = path
+        self.sample_ms = int(sample_interval * 1000)
+        self.flush_interval = flush_interval
+        self.max_age_days = max_age_days
+        
+        # Camera id -> [state, bucket start, peak confidence, peak score, peak state,
+        # last transition ts, transitions logged in that millisecond]
+        self.cameras = {}
+        self.pending = deque(maxlen=max_pending)
+        # Rows taken by the writer but not committed yet, still visible to queries
+        self.writing = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.last_prune = 0.0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        # WAL lets timeline queries read while the writer appends
+        connection.execute('PRAGMA journal_mode=WAL')
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(events)')]
+        for statement in (MIGRATION if columns and 'seq' not in columns else SCHEMA):
+            connection.execute(statement)
+        connection.commit()
+        
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def _connection(self):
+        """SQLite connection of the calling thread."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+    
+    def record(self, camera_id, score, confidence, state, timestamp=None):
+        """
+        Log one analyzed frame. Never blocks on I/O.
+        
+        Args:
+            camera_id: Camera the frame came from
+            score: Raw model score
+            confidence: Smoothed confidence
+            state: State name after the frame (MONITORING, WARNING or ALERT)
+            timestamp: Epoch seconds (defaults to now)
+        """
+        ts = int((time.time() if timestamp is None else timestamp) * 1000)
+        code = STATE_CODES[state]
+        confidence = int(round(confidence * 1000))
+        score = int(round(score * 1000))
+        with self.lock:
+            camera = self.cameras.get(camera_id)
+            if camera is None:
+                camera = self.cameras[camera_id] = [MONITORING, ts, confidence, score, code, None, 0]
+            
+            if code != camera[0]:
+                # Several transitions in one millisecond each keep their own row
+                camera[6] = camera[6] + 1 if ts == camera[5] else 0
+                camera[5] = ts
+                self.pending.append((camera_id, ts, TRANSITION, camera[6], code, camera[0], confidence, score))
+                camera[0] = code
+            
+            if ts - camera[1] >= self.sample_ms:
+                # Close the finished interval and start a new one with this frame
+                self.pending.append(self._sample(camera_id, camera))
+                camera[1:5] = [ts, confidence, score, code]
+            else:
+                camera[2] = max(camera[2], confidence)
+                camera[3] = max(camera[3], score)
+                camera[4] = max(camera[4], code)
+    
+    def _sample(self, camera_id, camera):
+        """Row summarising a camera's current interval, with the interval's own peak state."""
+        return (camera_id, camera[1], SAMPLE, 0, camera[4], None, camera[2], camera[3])
+    
+    def _worker(self):
+        """Write buffered rows every flush_interval."""
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.max_age_days is not None and time.time() - self.last_prune > 3600:
+                    self.prune(time.time() - self.max_age_days * 86400)
+            except Exception as e:
+                print(f"Error writing event log: {e}")
+    
+    def _take_pending(self):
+        """Move the buffered rows to the in-flight batch and return them."""
+        with self.lock:
+            self.writing = list(self.pending)
+            self.pending.clear()
+            return self.writing
+    
+    def flush(self):
+        """
+        Write buffered rows in a single transaction.
+        
+        Returns:
+            written: Number of rows written
+        """
+        rows = self._take_pending()
+        if not rows:
+            return 0
+        connection = self._connection()
+        try:
+            with connection:
+                connection.executemany('INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        finally:
+            with self.lock:
+                self.writing = []
+        transitions = sum(1 for row in rows if row[2] == TRANSITION)
+        metrics.event_log_rows_total.inc(transitions, kind='transition')
+        metrics.event_log_rows_total.inc(len(rows) - transitions, kind='sample')
+        return len(rows)
+    
+    def prune(self, before):
+        """
+        Delete rows older than a time.
+        
+        Args:
+            before: Epoch seconds
+        
+        Returns:
+            deleted: Number of rows deleted
+        """
+        self.last_prune = time.time()
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute('DELETE FROM events WHERE ts < ?', (int(before * 1000),))
+        return cursor.rowcount
+    
+    def timeline(self, camera_id, start_ms, end_ms, limit=10000):
+        """
+        A camera's confidence samples and state transitions in a time range.
+        
+        Rows still waiting for the writer are included, so the newest seconds
+        are never missing.
+        
+        Args:
+            camera_id: Camera to read
+            start_ms: Range start (epoch milliseconds, inclusive)
+            end_ms: Range end (epoch milliseconds, exclusive)
+            limit: Maximum rows returned (the oldest are kept)
+        
+        Returns:
+            timeline: Dictionary with samples ([ts, confidence, score] lists) and
+                transitions ({'ts', 'from', 'to', 'confidence'} dicts), oldest first
+        """
+        rows = self._connection().execute(
+            'SELECT ts, kind, seq, state, previous, confidence, score FROM events '
+            'WHERE camera = ? AND ts >= ? AND ts < ? ORDER BY ts, kind, seq LIMIT ?',
+            (camera_id, start_ms, end_ms, limit)
+        ).fetchall()
+        with self.lock:
+            recent = [row[1:] for row in itertools.chain(self.writing, self.pending)
+                      if row[0] == camera_id and start_ms <= row[1] < end_ms]
+        if recent:
+            # A batch committed a moment ago can be in both; identical rows are the same event
+            rows = sorted(set(rows).union(recent), key=lambda row: row[:3])[:limit]
+        
+        samples = []
+        transitions = []
+        for ts, kind, _, state, previous, confidence, score in rows:
+            if kind == TRANSITION:
+                transitions.append({
+                    'ts': ts,
+                    'from': STATE_NAMES[previous],
+                    'to': STATE_NAMES[state],
+                    'confidence': confidence / 1000
+                })
+            else:
+                samples.append([ts, confidence / 1000, score / 1000])
+        
+        return {
+            'camera_id': camera_id,
+            'start': start_ms,
+            'end': end_ms,
+            'samples': samples,
+            'transitions': transitions,
+            'truncated': len(rows) >= limit
+        }
+    
+    def close(self):
+        """Stop the writer and write what is left, including each camera's unfinished interval."""
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        with self.lock:
+            for camera_id, camera in self.cameras.items():
+                self.pending.append(self._sample(camera_id, camera))
+            self.cameras = {}
+        self.flush()
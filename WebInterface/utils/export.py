@@ -0,0 +1,30 @@
+import csv
+from io import StringIO
+
+def incidents_to_csv(incidents):
+    """
+    Render incidents as a CSV report.
+    
+    Args:
+        incidents: List of incident dictionaries
+    
+    Returns:
+        str: CSV document with a header row
+    """
+    # Create a CSV in memory
+    output = StringIO()
+    writer = csv.writer(output)
+    
+    # Write header
+    writer.writerow(['ID', 'Timestamp', 'Location', 'Faces Detected'])
+    
+    # Write data
+    writer.writerows(
+        [incident['id'],
+         incident['timestamp'],
+         incident['location'],
+         'Yes' if incident.get('faces_detected', False) else 'No']
+        for incident in incidents
+    )
+    
+    return output.getvalue()
@@ -0,0 +1,356 @@
+import os
+import json
+import threading
+import cv2
+import numpy as np
+
+class FaceEmbedder:
+    """
+    CPU face embedding model.
+    
+    Uses OpenCV's SFace recognizer when its ONNX model is available (128-d
+    identity embeddings). Without it, falls back to a normalized 16x16
+    appearance vector, which finds near-identical crops but is not an identity
+    model: identity is False, and such matches must not be taken as the same
+    person across incidents.
+    """
+    
+    def __init__(self, model_path='models/face_recognition_sface.onnx'):
+        """
+        Initialize the embedder.
+        
+        Args:
+            model_path: Path to the SFace ONNX model
+        """
+        self.recognizer = None
+        if os.path.exists(model_path) and hasattr(cv2, 'FaceRecognizerSF'):
+            try:
+                self.recognizer = cv2.FaceRecognizerSF.create(model_path, '')
+            except cv2.error as e:
+                print(f"Error loading face embedding model: {e}")
+        if self.recognizer is None:
+            print(f"Face embedding model not found at {model_path}: face search compares appearance only")
+        
+        self.identity = self.recognizer is not None
+        self.name = 'sface' if self.identity else 'appearance16'
+        self.dim = 128 if self.recognizer is not None else 256
+        # Cosine similarity above which two crops show the same face: OpenCV's
+        # SFace threshold, or near-identical pixels for the appearance fallback
+        self.same_face_similarity = 0.363 if self.recognizer is not None else 0.9
+    
+    def embed(self, image):
+        """
+        Compute a unit-length embedding for a face crop.
+        
+        Args:
+            image: BGR face crop
+        
+        Returns:
+            embedding: float32 array of length dim
+        """
+        if self.recognizer is not None:
+            face = cv2.resize(image, (112, 112), interpolation=cv2.INTER_AREA)
+            vector = self.recognizer.feature(face).ravel().astype(np.float32)
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            small = cv2.equalizeHist(cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA))
+            vector = small.ravel().astype(np.float32)
+            vector -= vector.mean()
+        
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+class FaceIndex:
+    """
+    Append-only nearest-neighbour index of face embeddings.
+    
+    Embeddings are stored unit-normalized as float16 rows in a memory-mapped
+    file (256 bytes per face with SFace), so hundreds of thousands of faces fit
+    in a few tens of megabytes. NumPy has no fast float16 matrix product, so
+    unless cache_vectors is disabled the rows are also kept as float32 in
+    memory; an exact cosine scan over that copy takes milliseconds at that
+    scale (float16 -> float32 conversion alone would cost ~10x the scan).
+    
+    Files in the index directory:
+        vectors.f16: Embedding rows (capacity grows by doubling)
+        entries.jsonl: One {incident_id, path} line per row; its length is the row count
+        links.jsonl: One {incident_id, path} line per later incident a saved face was linked to
+        meta.json: Embedding model name and dimension
+    """
+    
+    # Rows scored per matrix product during search, bounding float32 scratch memory
+    SEARCH_CHUNK = 65536
+    
+    def __init__(self, directory='face_index', embedder=None, initial_capacity=1024, cache_vectors=True):
+        """
+        Open (or create) an index.
+        
+        Args:
+            directory: Directory holding the index files
+            embedder: FaceEmbedder (created with defaults if omitted)
+            initial_capacity: Rows allocated when the index is created
+            cache_vectors: Keep a float32 copy of the rows in memory for fast search
+        """
+        self.directory = directory
+        self.embedder = embedder or FaceEmbedder()
+        self.dim = self.embedder.dim
+        self.cache_vectors = cache_vectors
+        self.cache = None
+        self.lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.entries_path = os.path.join(directory, 'entries.jsonl')
+        self.links_path = os.path.join(directory, 'links.jsonl')
+        meta_path = os.path.join(directory, 'meta.json')
+        
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('model') != self.embedder.name or meta.get('dim') != self.dim:
+                raise ValueError(f"Face index in {directory} was built with {meta.get('model')}; "
+                                 f"remove it to rebuild with {self.embedder.name}")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({'model': self.embedder.name, 'dim': self.dim}, f)
+        
+        self.entries = []
+        if os.path.exists(self.entries_path):
+            with open(self.entries_path) as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+        self.rows_by_path = {entry['path']: row for row, entry in enumerate(self.entries)
+                             if entry['path'] is not None}
+        self.removed = len(self.entries) - len(self.rows_by_path)
+        
+        # Later incidents of faces linked to an earlier crop (see FaceStore): {path: [incident ids]}
+        self.links = {}
+        if os.path.exists(self.links_path):
+            with open(self.links_path) as f:
+                for line in f:
+                    if line.strip():
+                        link = json.loads(line)
+                        self.links.setdefault(link['path'], []).append(link['incident_id'])
+        
+        row_bytes = self.dim * np.dtype(np.float16).itemsize
+        existing = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        self._map(max(existing, initial_capacity, len(self.entries)))
+    
+    def __len__(self):
+        """Number of indexed faces."""
+        return len(self.entries) - self.removed
+    
+    def _map(self, capacity):
+        """Size the vectors file to capacity rows and memory-map it."""
+        if getattr(self, 'vectors', None) is not None:
+            self.vectors.flush()
+            del self.vectors
+        
+        row_bytes = self.dim * np.dtype(np.float16).itemsize
+        with open(self.vectors_path, 'ab') as f:
+            if f.tell() < capacity * row_bytes:
+                f.truncate(capacity * row_bytes)
+        
+        self.capacity = capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        
+        if self.cache_vectors:
+            cache = np.empty((capacity, self.dim), dtype=np.float32)
+            count = len(self.entries)
+            if self.cache is not None:
+                cache[:count] = self.cache[:count]
+            else:
+                for start in range(0, count, self.SEARCH_CHUNK):
+                    end = min(start + self.SEARCH_CHUNK, count)
+                    cache[start:end] = self.vectors[start:end]
+            self.cache = cache
+    
+    def add(self, image, incident_id, path, embedding=None):
+        """
+        Embed a face crop and append it to the index.
+        
+        Args:
+            image: BGR face crop
+            incident_id: Incident the face belongs to
+            path: Face image path relative to the uploads folder
+            embedding: The crop's embedding, if already computed
+        
+        Returns:
+            row: Row number of the new entry
+        """
+        if embedding is None:
+            embedding = self.embedder.embed(image)
+        
+        with self.lock:
+            if path in self.rows_by_path:
+                return self.rows_by_path[path]
+            
+            row = len(self.entries)
+            if row >= self.capacity:
+                self._map(2 * self.capacity)
+            
+            # Vector first: a crash before the entry line is written leaves an unused row
+            self.vectors[row] = embedding
+            self.vectors.flush()
+            if self.cache is not None:
+                self.cache[row] = self.vectors[row]
+            
+            entry = {'incident_id': incident_id, 'path': path}
+            with open(self.entries_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.entries.append(entry)
+            self.rows_by_path[path] = row
+        return row
+    
+    def link(self, path, incident_id):
+        """
+        Record that an already indexed face also appeared in another incident.
+        
+        Args:
+            path: Indexed face path
+            incident_id: Incident the face was linked to
+        
+        Returns:
+            indexed: False if the path is not indexed (add it instead)
+        """
+        with self.lock:
+            row = self.rows_by_path.get(path)
+            if row is None:
+                return False
+            if incident_id == self.entries[row]['incident_id'] or incident_id in self.links.get(path, []):
+                return True
+            with open(self.links_path, 'a') as f:
+                f.write(json.dumps({'incident_id': incident_id, 'path': path}) + '\n')
+            self.links.setdefault(path, []).append(incident_id)
+        return True
+    
+    def similarity(self, path, embedding):
+        """
+        Cosine similarity between an indexed face and an embedding.
+        
+        Returns:
+            similarity: Float, or None if the path is not indexed
+        """
+        with self.lock:
+            row = self.rows_by_path.get(path)
+            if row is None:
+                return None
+            vector = (self.cache if self.cache is not None else self.vectors)[row]
+        return float(np.asarray(vector, dtype=np.float32) @ np.asarray(embedding, dtype=np.float32))
+    
+    def same_face(self, path, embedding):
+        """Whether an indexed face and an embedding show the same person (False if not indexed)."""
+        similarity = self.similarity(path, embedding)
+        return similarity is not None and similarity >= self.embedder.same_face_similarity
+    
+    def _result(self, row, score):
+        """Search result of an index row, with every incident the face appeared in."""
+        entry = self.entries[row]
+        return dict(entry, score=round(float(score), 4),
+                    incident_ids=[entry['incident_id']] + self.links.get(entry['path'], []))
+    
+    def search(self, embedding, k=10, exclude_path=None):
+        """
+        Find the k most similar faces to an embedding.
+        
+        Args:
+            embedding: Unit-length query vector
+            k: Number of results
+            exclude_path: Face path to leave out (usually the query itself)
+        
+        Returns:
+            results: List of {incident_id, incident_ids, path, score} sorted by cosine
+                similarity; incident_ids lists every incident the face appeared in
+        """
+        with self.lock:
+            count = len(self.entries)
+            entries = self.entries[:count]
+            vectors = self.cache if self.cache is not None else self.vectors
+        
+        if not count:
+            return []
+        
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.SEARCH_CHUNK):
+            end = min(start + self.SEARCH_CHUNK, count)
+            scores[start:end] = np.asarray(vectors[start:end], dtype=np.float32) @ query
+        
+        excluded = self.rows_by_path.get(exclude_path)
+        if excluded is not None and excluded < count:
+            scores[excluded] = -np.inf
+        
+        # Removed faces keep their (zeroed) rows, so over-fetch to fill k
+        fetch = min(k + self.removed, count)
+        top = np.argpartition(-scores, fetch - 1)[:fetch]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        results = [self._result(row, scores[row])
+                   for row in top if np.isfinite(scores[row]) and entries[row]['path'] is not None]
+        return results[:k]
+    
+    def update_paths(self, moves):
+        """
+        Follow face files that were moved or deleted.
+        
+        Deleted faces keep their row (zeroed, path None) so row numbers stay
+        stable; the entries file is rewritten atomically.
+        
+        Args:
+            moves: Dictionary of old path -> new path (None when the file was deleted)
+        """
+        with self.lock:
+            changed = False
+            for old_path, new_path in moves.items():
+                row = self.rows_by_path.pop(old_path, None)
+                if row is None:
+                    continue
+                
+                changed = True
+                self.entries[row] = dict(self.entries[row], path=new_path)
+                links = self.links.pop(old_path, None)
+                if new_path is not None:
+                    self.rows_by_path[new_path] = row
+                    if links:
+                        self.links[new_path] = links
+                else:
+                    self.vectors[row] = 0
+                    if self.cache is not None:
+                        self.cache[row] = 0
+                    self.removed += 1
+            
+            if not changed:
+                return
+            
+            self.vectors.flush()
+            temp_path = self.entries_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                for entry in self.entries:
+                    f.write(json.dumps(entry) + '\n')
+            os.replace(temp_path, self.entries_path)
+            
+            temp_path = self.links_path + '.tmp'
+            with open(temp_path, 'w') as f:
+                for path, incident_ids in self.links.items():
+                    for incident_id in incident_ids:
+                        f.write(json.dumps({'incident_id': incident_id, 'path': path}) + '\n')
+            os.replace(temp_path, self.links_path)
+    
+    def similar_to(self, path, k=10):
+        """
+        Find faces similar to one already in the index.
+        
+        Args:
+            path: Indexed face path
+            k: Number of results
+        
+        Returns:
+            results: As for search(), or None if the path is not indexed; the face
+                itself comes first when it was linked to more than one incident
+        """
+        row = self.rows_by_path.get(path)
+        if row is None:
+            return None
+        results = self.search(self.vectors[row].astype(np.float32), k, exclude_path=path)
+        if self.links.get(path):
+            results = [self._result(row, 1.0)] + results[:k - 1]
+        return results
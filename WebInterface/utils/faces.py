@@ -0,0 +1,309 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+from .face_index import FaceEmbedder
+
+def face_hash(image):
+    """
+    Compute a 64-bit difference hash (dHash) of a face crop.
+    
+    Near-identical crops (the same face in neighbouring frames, small shifts,
+    recompression) differ in only a few bits, so duplicates can be found by
+    Hamming distance.
+    
+    Args:
+        image: BGR face crop
+    
+    Returns:
+        hash: Unsigned 64-bit integer
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def hamming_distances(hashes, value):
+    """
+    Hamming distance between one hash and an array of hashes.
+    
+    Args:
+        hashes: uint64 array of hashes
+        value: Hash to compare against
+    
+    Returns:
+        distances: Array of bit differences
+    """
+    differing = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(differing.view(np.uint8)).reshape(len(hashes), 64).sum(axis=1)
+
+def face_quality(image, confidence=1.0):
+    """
+    Score a face crop for keeping the best one of a set.
+    
+    Sharpness (variance of the Laplacian) weighted by crop area and detector
+    confidence, so large, in-focus, confidently detected faces win.
+    
+    Args:
+        image: BGR face crop
+        confidence: MTCNN detection confidence
+    
+    Returns:
+        quality: Non-negative score (higher is better)
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(sharpness * np.sqrt(gray.shape[0] * gray.shape[1]) * confidence)
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, width, height) boxes."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+class FaceStore:
+    """
+    Deduplicating store for incident face crops.
+    
+    Faces detected during an incident are collected as candidates, keeping only
+    the highest-quality crop per person. A new detection is proposed as the
+    same person as a candidate by perceptual hash (or by box overlap, since a
+    moving face changes its hash faster than its position), but different
+    people can have close hashes and overlapping boxes, so the match must be
+    confirmed by embedding similarity, and two detections of the same frame
+    are never merged. When the incident is committed, each remaining crop is
+    checked against an index of recently saved faces: a near-duplicate is
+    linked to the existing file instead of being written again. Links are
+    likewise confirmed by the face index, and only by an identity model (not
+    the appearance fallback), so without either every crop is saved.
+    """
+    
+    def __init__(self, uploads_dir, match_distance=12, link_distance=6, match_iou=0.3,
+                 index_size=1024, margin=20, face_index=None, media=None):
+        """
+        Initialize the face store.
+        
+        Args:
+            uploads_dir: Uploads folder; crops are written to its faces/ subfolder
+            match_distance: Max Hamming distance for the same person within an incident
+            link_distance: Max Hamming distance for reusing a face saved by an earlier incident
+                (the face index must also confirm it is the same person)
+            match_iou: Min box overlap for the same person within an incident
+            index_size: Number of saved faces remembered for linking
+            margin: Pixels added around each detection box
+            face_index: Optional FaceIndex that newly saved faces are added to and that confirms links
+                when its embedder is an identity model
+                (its embedder also confirms matches within an incident)
+            media: Optional MediaStore; faces are then saved under content-addressed names
+        """
+        self.uploads_dir = uploads_dir
+        self.faces_dir = os.path.join(uploads_dir, 'faces')
+        self.match_distance = match_distance
+        self.link_distance = link_distance
+        self.match_iou = match_iou
+        self.margin = margin
+        self.face_index = face_index
+        self.media = media
+        self.embedder = face_index.embedder if face_index is not None else FaceEmbedder()
+        
+        # Ring buffer of recently saved faces: hash -> relative path
+        self.index_hashes = np.zeros(index_size, dtype=np.uint64)
+        self.index_paths = [None] * index_size
+        self.index_position = 0
+        self.index_count = 0
+        
+        # Incident id -> list of candidate dicts (hash, box, quality, image, embedding)
+        self.pending = {}
+        self.lock = threading.Lock()
+        
+        os.makedirs(self.faces_dir, exist_ok=True)
+    
+    def crop(self, frame, face):
+        """Cut a detection box (plus margin) out of a frame."""
+        x, y, width, height = face['box']
+        x_start = max(0, x - self.margin)
+        y_start = max(0, y - self.margin)
+        x_end = min(frame.shape[1], x + width + self.margin)
+        y_end = min(frame.shape[0], y + height + self.margin)
+        return frame[y_start:y_end, x_start:x_end]
+    
+    def add_faces(self, incident_id, frame, faces):
+        """
+        Add the faces detected in one frame as candidates for an incident.
+        
+        Args:
+            incident_id: Incident the faces belong to
+            frame: BGR frame the faces were detected in
+            faces: MTCNN detections ({'box', 'confidence', ...})
+        
+        Returns:
+            added: Number of faces that started a new identity
+        """
+        # Crop, hash and embed outside the lock so other cameras are not held up
+        detections = []
+        for face in faces:
+            face_img = self.crop(frame, face)
+            if face_img.size == 0:
+                continue
+            try:
+                embedding = self.embedder.embed(face_img)
+            except Exception as e:
+                print(f"Error embedding face of {incident_id}: {e}")
+                embedding = None
+            detections.append({'hash': face_hash(face_img), 'box': face['box'],
+                               'quality': face_quality(face_img, face.get('confidence', 1.0)),
+                               'image': face_img.copy(), 'embedding': embedding})
+        
+        added = 0
+        with self.lock:
+            candidates = self.pending.setdefault(incident_id, [])
+            # Candidates already matched by a face of this frame: one person per frame
+            taken = set()
+            for detection in detections:
+                match = self._find_candidate(candidates, detection, taken)
+                if match is None:
+                    candidates.append(detection)
+                    taken.add(id(detection))
+                    added += 1
+                else:
+                    taken.add(id(match))
+                    # Follow the person so the next sample still overlaps
+                    match['box'] = detection['box']
+                    if detection['quality'] > match['quality']:
+                        match.update(hash=detection['hash'], quality=detection['quality'],
+                                     image=detection['image'], embedding=detection['embedding'])
+        return added
+    
+    def _find_candidate(self, candidates, detection, taken):
+        """
+        Find the candidate of an incident that a detection shows the same person as.
+        
+        Candidates within match_distance or match_iou of the detection are
+        proposed; the most similar one is returned if the embeddings confirm it.
+        
+        Args:
+            candidates: The incident's candidates
+            detection: Candidate dict of the new detection
+            taken: ids of candidates matched by other faces of the same frame
+        """
+        if detection['embedding'] is None:
+            return None
+        
+        best, best_similarity = None, self.embedder.same_face_similarity
+        for candidate in candidates:
+            if id(candidate) in taken or candidate['embedding'] is None:
+                continue
+            distance = hamming_distances(np.array([candidate['hash']], dtype=np.uint64), detection['hash'])[0]
+            if distance > self.match_distance and box_iou(detection['box'], candidate['box']) < self.match_iou:
+                continue
+            similarity = float(candidate['embedding'] @ detection['embedding'])
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+    
+    def commit(self, incident_id):
+        """
+        Save the best crop per person for an incident.
+        
+        Args:
+            incident_id: Incident to finalize
+        
+        Returns:
+            face_paths: Paths relative to the uploads folder, one per person
+        """
+        with self.lock:
+            candidates = self.pending.pop(incident_id, [])
+        
+        # Linking checks, encoding and writes run outside the lock so add_faces
+        # calls from other cameras are not held up by this incident
+        face_paths = []
+        written = 0
+        for candidate in candidates:
+            embedding = candidate['embedding']
+            path = self._find_linked(candidate['hash'], embedding)
+            if path is None:
+                if self.media is not None:
+                    path = self.media.save_image(candidate['image'], 'faces')
+                else:
+                    filename = f"{incident_id}_face_{written + 1}.jpg"
+                    cv2.imwrite(os.path.join(self.faces_dir, filename), candidate['image'])
+                    path = os.path.join('faces', filename)
+                self._remember(candidate['hash'], path)
+                written += 1
+            
+            # Index the face under this incident too, so face search finds repeat appearances
+            if self.face_index is not None:
+                try:
+                    if not self.face_index.link(path, incident_id):
+                        self.face_index.add(candidate['image'], incident_id, path, embedding)
+                except Exception as e:
+                    print(f"Error indexing face {path}: {e}")
+            if path not in face_paths:
+                face_paths.append(path)
+        
+        if candidates:
+            print(f"Faces for {incident_id}: {len(face_paths)} kept, {written} written")
+        return face_paths
+    
+    def transfer(self, source_id, target_id):
+        """Move the candidates of an incident merged into another one to that incident."""
+        with self.lock:
+            candidates = self.pending.pop(source_id, [])
+            if candidates:
+                self.pending.setdefault(target_id, []).extend(candidates)
+    
+    def discard(self, incident_id):
+        """Drop the candidates of an incident that will not be recorded."""
+        with self.lock:
+            self.pending.pop(incident_id, None)
+    
+    def relocate(self, moves):
+        """
+        Update the link index after saved faces were moved or deleted.
+        
+        Args:
+            moves: Dictionary of old path -> new path (None when the file was deleted)
+        """
+        with self.lock:
+            for i, path in enumerate(self.index_paths):
+                if path in moves:
+                    self.index_paths[i] = moves[path]
+    
+    def _find_linked(self, value, embedding=None):
+        """
+        Find a saved face within link_distance of a hash that the face index
+        confirms is the same person.
+        
+        Appearance embeddings only show two crops look alike, which is not
+        enough to tie incidents together, so nothing is linked without an
+        identity model.
+        
+        Args:
+            value: dHash of the new crop
+            embedding: Face index embedding of the new crop (None: nothing is linked)
+        """
+        if embedding is None or self.face_index is None or not self.face_index.embedder.identity:
+            return None
+        with self.lock:
+            if not self.index_count:
+                return None
+            distances = hamming_distances(self.index_hashes[:self.index_count], value)
+            order = np.argsort(distances, kind='stable')
+            paths = [self.index_paths[i] for i in order if distances[i] <= self.link_distance]
+        
+        for path in paths:
+            if (path is not None and os.path.exists(os.path.join(self.uploads_dir, path))
+                    and self.face_index.same_face(path, embedding)):
+                return path
+        return None
+    
+    def _remember(self, value, path):
+        """Add a saved face to the link index, evicting the oldest one when full."""
+        with self.lock:
+            self.index_hashes[self.index_position] = value
+            self.index_paths[self.index_position] = path
+            self.index_position = (self.index_position + 1) % len(self.index_paths)
+            self.index_count = min(self.index_count + 1, len(self.index_paths))
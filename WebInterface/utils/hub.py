@@ -0,0 +1,216 @@
+import sys
+import time
+import threading
+
+from .metrics import metrics
+
+# Width of stream keys carrying unencoded BGR frames, e.g. ('raw', IMAGE), for
+# consumers that compose frames themselves (the mosaic) rather than forward JPEGs
+IMAGE = 'image'
+
+def gevent_enabled():
+    """Whether the process was monkey-patched by gevent (ASYNC_MODE=gevent)."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def run_blocking(func, *args, **kwargs):
+    """
+    Run blocking OpenCV/TensorFlow work without stalling other clients.
+    
+    Under gevent every client is a greenlet on one OS thread, so the call is
+    handed to gevent's native thread pool and the calling greenlet yields until
+    it returns. In threading mode each caller already has its own thread and the
+    function is simply called.
+    """
+    if gevent_enabled():
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+class Channel:
+    """Latest frames of one camera and the viewers waiting for them."""
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.frames = {}
+        self.viewers = {}
+        self.running = False
+        self.generation = 0
+        self.idle_since = time.time()
+
+class FrameHub:
+    """
+    Shares one capture/detection/encode pipeline per camera among all viewers.
+    
+    The first viewer of a camera starts its producer as a background task; the
+    producer publishes each encoded frame once per stream key that has viewers
+    (e.g. ('raw', None), ('private', 320) for blurred faces at 320 pixels
+    wide, or ('raw', IMAGE) for the unencoded frame) and every viewer gets the
+    latest one. A slow viewer skips frames
+    instead of holding the producer back, and the producer stops once the
+    camera has had no viewers for idle_timeout seconds.
+    
+    Only threading primitives are used, so the same code runs on OS threads
+    (threading mode) and as cooperative greenlets when gevent has patched them.
+    """
+    
+    def __init__(self, producer, start_task, idle_timeout=5.0, wait_timeout=5.0):
+        """
+        Initialize the hub.
+        
+        Args:
+            producer: Callable(camera_id, hub) that captures and publishes until hub.active() is False
+            start_task: Callable(target, *args) starting a background task (socketio.start_background_task)
+            idle_timeout: Seconds without viewers before a camera's producer stops
+            wait_timeout: Seconds a viewer waits for a frame before checking the producer again
+        """
+        self.producer = producer
+        self.start_task = start_task
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.channels = {}
+        self.lock = threading.Lock()
+    
+    def _channel(self, camera_id):
+        """Get or create the channel of a camera."""
+        with self.lock:
+            channel = self.channels.get(camera_id)
+            if channel is None:
+                channel = self.channels[camera_id] = Channel()
+            return channel
+    
+    def subscribe(self, camera_id, key):
+        """Register a viewer of one stream key, starting the camera's producer if needed."""
+        # Registered under the hub lock so _run() cannot drop the channel in between
+        with self.lock:
+            channel = self.channels.get(camera_id)
+            if channel is None:
+                channel = self.channels[camera_id] = Channel()
+            with channel.condition:
+                channel.viewers[key] = channel.viewers.get(key, 0) + 1
+                if not channel.running:
+                    # Fresh producer: drop frames left over from the previous one
+                    channel.running = True
+                    channel.generation += 1
+                    channel.frames = {}
+                    self.start_task(self._run, camera_id, channel, channel.generation)
+        metrics.active_viewers.inc(camera=camera_id)
+    
+    def unsubscribe(self, camera_id, key):
+        """Remove a viewer registered with subscribe()."""
+        channel = self._channel(camera_id)
+        with channel.condition:
+            channel.viewers[key] -= 1
+            if not any(channel.viewers.values()):
+                channel.idle_since = time.time()
+        metrics.active_viewers.dec(camera=camera_id)
+    
+    def next_frame(self, camera_id, key, seen=0, timeout=None):
+        """
+        Wait for a frame newer than the one a viewer has seen.
+        
+        Args:
+            camera_id: Camera to read
+            key: Stream key the viewer subscribed to
+            seen: Sequence number of the viewer's last frame (0 for none)
+            timeout: Seconds to wait (defaults to wait_timeout)
+        
+        Returns:
+            (sequence, frame, running): frame is None if nothing newer arrived;
+            running is False once the producer has stopped
+        """
+        channel = self._channel(camera_id)
+        with channel.condition:
+            sequence, frame = channel.frames.get(key, (seen, None))
+            if sequence == seen and channel.running:
+                channel.condition.wait(self.wait_timeout if timeout is None else timeout)
+                sequence, frame = channel.frames.get(key, (seen, None))
+            if sequence == seen:
+                frame = None
+            return sequence, frame, channel.running
+    
+    def frames(self, camera_id, key):
+        """
+        Stream a camera's frames to one viewer.
+        
+        Args:
+            camera_id: Camera to stream
+            key: Stream key, e.g. ('raw', None)
+        
+        Yields:
+            frame: Latest published frame (viewers that fall behind skip frames)
+        """
+        self.subscribe(camera_id, key)
+        try:
+            seen = 0
+            while True:
+                sequence, frame, running = self.next_frame(camera_id, key, seen)
+                if frame is not None:
+                    seen = sequence
+                    yield frame
+                elif not running:
+                    return
+        finally:
+            self.unsubscribe(camera_id, key)
+    
+    def publish(self, camera_id, key, frame):
+        """Publish the latest frame of one stream key and wake its viewers."""
+        channel = self._channel(camera_id)
+        with channel.condition:
+            channel.sequence += 1
+            channel.frames[key] = (channel.sequence, frame)
+            channel.condition.notify_all()
+    
+    def publish_all(self, camera_id, frame):
+        """Publish the same frame (e.g. an error message) to every stream key."""
+        for key in self.wanted(camera_id):
+            self.publish(camera_id, key, frame)
+    
+    def wanted(self, camera_id):
+        """Stream keys that currently have viewers."""
+        channel = self._channel(camera_id)
+        with channel.condition:
+            return {key for key, count in channel.viewers.items() if count > 0}
+    
+    def active(self, camera_id):
+        """
+        Whether the producer should keep running (viewers present or recently left).
+        
+        Once this returns False the channel counts as stopped, so the next
+        viewer starts a new producer rather than waiting on one that is exiting.
+        """
+        channel = self._channel(camera_id)
+        with channel.condition:
+            if any(channel.viewers.values()) or time.time() - channel.idle_since < self.idle_timeout:
+                return True
+            channel.running = False
+            return False
+    
+    def viewer_counts(self):
+        """Number of viewers per camera."""
+        with self.lock:
+            channels = list(self.channels.items())
+        return {camera_id: sum(channel.viewers.values()) for camera_id, channel in channels}
+    
+    def _run(self, camera_id, channel, generation):
+        """Run a camera's producer, then release its viewers."""
+        try:
+            self.producer(camera_id, self)
+        except Exception as e:
+            print(f"Critical error in producer for {camera_id}: {e}")
+        finally:
+            # Viewers still attached (e.g. the camera failed to open) get the
+            # last published frame and then end their streams
+            with channel.condition:
+                if channel.generation == generation:
+                    channel.running = False
+                channel.condition.notify_all()
+            
+            # Drop the channel once nobody uses it, so every mosaic size or
+            # camera set ever requested does not keep its last frame forever
+            with self.lock:
+                with channel.condition:
+                    if (channel.generation == generation and not any(channel.viewers.values())
+                            and self.channels.get(camera_id) is channel):
+                        del self.channels[camera_id]
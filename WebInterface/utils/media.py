@@ -0,0 +1,229 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import cv2
+import numpy as np
+
+from .hub import run_blocking
+
+# Thumbnail kind -> (max width, max height)
+THUMBNAIL_SIZES = {
+    'list': (320, 240),
+    'face': (128, 128)
+}
+
+def content_hash(data):
+    """Short content address (first 20 hex digits of SHA-256) for encoded bytes."""
+    return hashlib.sha256(data).hexdigest()[:20]
+
+def write_atomic(path, data):
+    """Write bytes to path via a temporary file so readers never see partial files."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def date_folder(timestamp=None):
+    """Date shard (YYYY/MM/DD, local time) for a timestamp in epoch seconds."""
+    return time.strftime('%Y/%m/%d', time.localtime(timestamp))
+
+def fit_size(width, height, max_width, max_height):
+    """Scale (width, height) to fit inside a box, never enlarging."""
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+# IJG (libjpeg) base luminance quantization table, in the zigzag order JPEG files store it
+_LUMINANCE_TABLE = np.array([
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99
+], dtype=np.int64)
+
+def _scaled_tables():
+    """The luminance table libjpeg writes for every quality from 1 to 100."""
+    qualities = np.arange(1, 101)
+    scale = np.where(qualities < 50, 5000 // qualities, 200 - 2 * qualities)
+    return np.clip((_LUMINANCE_TABLE[None, :] * scale[:, None] + 50) // 100, 1, 255)
+
+_QUALITY_TABLES = _scaled_tables()
+
+def jpeg_quality(path):
+    """
+    Estimate the quality a JPEG file was encoded at from its header.
+    
+    Only the quantization tables are read, so this is far cheaper than
+    decoding. The luminance table is matched against the tables libjpeg
+    (and so OpenCV) writes for each quality.
+    
+    Args:
+        path: JPEG file
+    
+    Returns:
+        quality: 1-100, or None if the file has no readable luminance table
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(65536)
+    except OSError:
+        return None
+    if data[:2] != b'\xff\xd8':
+        return None
+    
+    position = 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        length = int.from_bytes(data[position + 2:position + 4], 'big')
+        if marker == 0xDA:
+            # Start of scan: no tables follow
+            return None
+        if marker == 0xDB:
+            segment = data[position + 4:position + 2 + length]
+            offset = 0
+            while offset < len(segment):
+                precision, table_id = segment[offset] >> 4, segment[offset] & 0x0F
+                size = 128 if precision else 64
+                values = segment[offset + 1:offset + 1 + size]
+                if len(values) < size:
+                    return None
+                if table_id == 0:
+                    table = np.frombuffer(values, dtype='>u2' if precision else np.uint8).astype(np.int64)
+                    errors = np.abs(_QUALITY_TABLES - table[None, :]).sum(axis=1)
+                    return int(np.argmin(errors)) + 1
+                offset += 1 + size
+        position += 2 + length
+    return None
+
+class MediaStore:
+    """
+    Content-addressed storage for incident and face images with thumbnails.
+    
+    Images are saved as <folder>/<YYYY>/<MM>/<DD>/<sha256 prefix>.jpg under the
+    uploads folder, so a name never refers to different bytes and can be cached
+    forever, and no single directory grows without bound.
+    Thumbnails are derived from the source name (thumbs/<folder>/<hash>.<kind>.<ext>)
+    and rendered by a background thread; a request that arrives before the
+    worker gets to it renders the thumbnail inline.
+    """
+    
+    def __init__(self, uploads_dir, quality=90, thumbnail_quality=80):
+        """
+        Initialize the store and start the thumbnail worker.
+        
+        Args:
+            uploads_dir: Root folder for stored images (static/uploads)
+            quality: JPEG quality for full-size images
+            thumbnail_quality: Quality for thumbnails
+        """
+        self.uploads_dir = uploads_dir
+        self.quality = quality
+        self.thumbnail_quality = thumbnail_quality
+        
+        # Prefer WebP thumbnails when this OpenCV build can encode them
+        probe = np.zeros((8, 8, 3), dtype=np.uint8)
+        try:
+            self.thumbnail_ext = '.webp' if cv2.imencode('.webp', probe)[0] else '.jpg'
+        except cv2.error:
+            self.thumbnail_ext = '.jpg'
+        
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def save_image(self, image, folder='', timestamp=None, quality=None):
+        """
+        Store an image under its content address and queue its thumbnails.
+        
+        Args:
+            image: BGR image
+            folder: Subfolder of the uploads folder (e.g. 'faces')
+            timestamp: Epoch seconds choosing the date folder (defaults to now)
+            quality: JPEG quality (defaults to the store's quality)
+        
+        Returns:
+            path: Path relative to the uploads folder (e.g. 'faces/2024/05/01/3f2a...jpg')
+        """
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality or self.quality])
+        if not ret:
+            raise ValueError("Could not encode image")
+        data = buffer.tobytes()
+        
+        path = os.path.join(folder, date_folder(timestamp), f"{content_hash(data)}.jpg").replace(os.sep, '/')
+        full_path = os.path.join(self.uploads_dir, path)
+        # Identical bytes are already on disk under the same name
+        if not os.path.exists(full_path):
+            write_atomic(full_path, data)
+        
+        kinds = ('face',) if folder == 'faces' else ('list',)
+        for kind in kinds:
+            self.queue.put((path, kind))
+        return path
+    
+    def thumbnail_path(self, path, kind):
+        """
+        Get the thumbnail path for a stored image.
+        
+        Args:
+            path: Image path relative to the uploads folder
+            kind: Key of THUMBNAIL_SIZES
+        
+        Returns:
+            path: Thumbnail path relative to the uploads folder
+        """
+        stem = os.path.splitext(path)[0]
+        return f"thumbs/{stem}.{kind}{self.thumbnail_ext}"
+    
+    def source_for_thumbnail(self, thumbnail_path):
+        """
+        Map a thumbnail path back to (source path, kind), or None if it is not one.
+        """
+        if not thumbnail_path.startswith('thumbs/'):
+            return None
+        stem, ext = os.path.splitext(thumbnail_path[len('thumbs/'):])
+        stem, kind = os.path.splitext(stem)
+        kind = kind.lstrip('.')
+        if ext != self.thumbnail_ext or kind not in THUMBNAIL_SIZES:
+            return None
+        return f"{stem}.jpg", kind
+    
+    def render_thumbnail(self, path, kind):
+        """
+        Render one thumbnail if it does not exist yet.
+        
+        Returns:
+            thumbnail_path: Path relative to the uploads folder, or None if the source is missing
+        """
+        thumbnail_path = self.thumbnail_path(path, kind)
+        full_thumbnail_path = os.path.join(self.uploads_dir, thumbnail_path)
+        if os.path.exists(full_thumbnail_path):
+            return thumbnail_path
+        
+        image = cv2.imread(os.path.join(self.uploads_dir, path))
+        if image is None:
+            return None
+        
+        height, width = image.shape[:2]
+        size = fit_size(width, height, *THUMBNAIL_SIZES[kind])
+        thumbnail = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        
+        params = ([cv2.IMWRITE_WEBP_QUALITY, self.thumbnail_quality] if self.thumbnail_ext == '.webp'
+                  else [cv2.IMWRITE_JPEG_QUALITY, self.thumbnail_quality])
+        ret, buffer = cv2.imencode(self.thumbnail_ext, thumbnail, params)
+        if not ret:
+            return None
+        write_atomic(full_thumbnail_path, buffer.tobytes())
+        return thumbnail_path
+    
+    def _worker(self):
+        """Render queued thumbnails in the background."""
+        while True:
+            path, kind = self.queue.get()
+            try:
+                run_blocking(self.render_thumbnail, path, kind)
+            except Exception as e:
+                print(f"Error creating thumbnail for {path}: {e}")
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,201 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond stages up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value):
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    """Render a sorted label tuple in Prometheus text format."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    """Render a sample value, keeping integers free of a trailing .0"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """Monotonically increasing value per label set."""
+    
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, amount=1, **labels):
+        """Increase the counter for a label set."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def collect(self):
+        """Render the counter in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """Value that can go up and down per label set."""
+    
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def set(self, value, **labels):
+        """Set the gauge for a label set."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+    
+    def inc(self, amount=1, **labels):
+        """Increase the gauge for a label set."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        """Decrease the gauge for a label set."""
+        self.inc(-amount, **labels)
+    
+    def get(self, **labels):
+        """Get the current value for a label set."""
+        return self.values.get(tuple(sorted(labels.items())), 0)
+    
+    def collect(self):
+        """Render the gauge in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Bucketed distribution of observations per label set."""
+    
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # Label set -> [per-bucket counts (last is +Inf), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        """Record one observation."""
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.values[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def collect(self):
+        """Render the histogram (cumulative buckets, sum and count)."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self.values.items()]
+        
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(key + (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of pipeline metrics exposed on /metrics."""
+    
+    def __init__(self, prefix='vigileyex'):
+        """
+        Create the standard pipeline metrics.
+        
+        Args:
+            prefix: Prefix for every metric name
+        """
+        self.prefix = prefix
+        self.metrics = []
+        
+        self.stage_seconds = self.histogram('stage_seconds', 'Time spent in each pipeline stage (capture, preprocess, predict, smoothing, overlay, encode, face_detection, disk_write, notification)')
+        self.frames_total = self.counter('frames_total', 'Frames read from each camera')
+        self.frames_processed_total = self.counter('frames_processed_total', 'Frames run through the detector')
+        self.frames_dropped_total = self.counter('frames_dropped_total', 'Frames dropped per camera and reason')
+        self.frames_skipped_total = self.counter('frames_skipped_total', 'Frames read but left out of detection by design (only every other frame is analyzed)')
+        self.incidents_total = self.counter('incidents_total', 'Incidents recorded per camera')
+        self.queue_depth = self.gauge('queue_depth', 'Items waiting in each pipeline queue')
+        self.active_viewers = self.gauge('active_viewers', 'Clients currently streaming each camera')
+        self.stream_frames_sent_total = self.counter('stream_frames_sent_total', 'Frames sent to viewers per camera and transport')
+        self.stream_frames_skipped_total = self.counter('stream_frames_skipped_total', 'Frames a viewer never received (rate limit or backpressure) per camera and transport')
+        self.stream_ack_timeouts_total = self.counter('stream_ack_timeouts_total', 'WebSocket streams whose client stopped acknowledging frames')
+        self.cache_requests_total = self.counter('cache_requests_total', 'In-process cache lookups per cache and result (hit or miss)')
+        self.db_queries_total = self.counter('db_queries_total', 'Database queries per request endpoint')
+        self.model_active = self.gauge('model_active', 'Detection model variant in use (1) per model')
+        self.storage_bytes = self.gauge('storage_bytes', 'Bytes used by stored incident images and thumbnails')
+        self.retention_reclaimed_bytes_total = self.counter('retention_reclaimed_bytes_total', 'Bytes freed by the retention service per reason')
+        self.event_log_rows_total = self.counter('event_log_rows_total', 'Detection event log rows written per kind (sample or transition)')
+        self.worker_load = self.gauge('worker_load', 'Busy fraction of each camera worker process, summed over its cameras')
+        self.worker_restarts_total = self.counter('worker_restarts_total', 'Camera worker processes restarted after failing, per worker')
+        self.camera_moves_total = self.counter('camera_moves_total', 'Cameras moved between worker processes per reason')
+        self.incidents_merged_total = self.counter('incidents_merged_total', 'Incidents merged into another camera incident instead of recorded on their own, per camera')
+    
+    def counter(self, name, documentation):
+        """Register a counter."""
+        metric = Counter(f"{self.prefix}_{name}", documentation)
+        self.metrics.append(metric)
+        return metric
+    
+    def gauge(self, name, documentation):
+        """Register a gauge."""
+        metric = Gauge(f"{self.prefix}_{name}", documentation)
+        self.metrics.append(metric)
+        return metric
+    
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """Register a histogram."""
+        metric = Histogram(f"{self.prefix}_{name}", documentation, buckets)
+        self.metrics.append(metric)
+        return metric
+    
+    def observe_stage(self, stage, camera_id, seconds):
+        """Record the duration of a pipeline stage."""
+        self.stage_seconds.observe(seconds, stage=stage, camera=camera_id)
+    
+    @contextmanager
+    def timer(self, stage, camera_id):
+        """Time the enclosed block as a pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=stage, camera=camera_id)
+    
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry shared by the detector, notifier and web app
+metrics = MetricsRegistry()
@@ -0,0 +1,206 @@
+import math
+import time
+import cv2
+import numpy as np
+
+from .hub import IMAGE, run_blocking
+from .metrics import metrics
+from .streaming import FramePacket, encode_jpeg
+
+# Tile border colours (BGR) per detector state; MONITORING tiles get no border
+STATE_COLORS = {
+    'WARNING': (0, 165, 255),
+    'ALERT': (0, 0, 255)
+}
+
+# Most tiles in one mosaic (a 6x6 grid); more would shrink tiles to a few pixels
+MAX_TILES = 36
+
+def grid_shape(count):
+    """
+    Rows and columns of the most square grid holding count tiles.
+    
+    Returns:
+        (rows, cols)
+    """
+    cols = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / cols))
+    return rows, cols
+
+def parse_size(value, default=(1280, 720), minimum=(160, 90), maximum=(3840, 2160)):
+    """
+    Parse a WIDTHxHEIGHT size, clamped to a sane range.
+    
+    Args:
+        value: Size string such as '1280x720' (None for the default)
+    
+    Returns:
+        (width, height)
+    """
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except (AttributeError, ValueError):
+        return default
+    return (min(max(width, minimum[0]), maximum[0]), min(max(height, minimum[1]), maximum[1]))
+
+def mosaic_id(variant, size, camera_ids):
+    """Frame hub channel id of a mosaic, e.g. 'mosaic:raw:1280x720:camera_1,camera_2'."""
+    return f"mosaic:{variant}:{size[0]}x{size[1]}:{','.join(camera_ids)}"
+
+def parse_mosaic_id(channel_id):
+    """
+    Split a mosaic channel id built by mosaic_id().
+    
+    Returns:
+        (variant, size, camera_ids)
+    """
+    _, variant, size, cameras = channel_id.split(':', 3)
+    return variant, parse_size(size), cameras.split(',')
+
+class Mosaic:
+    """
+    Grid of camera tiles composed into one preallocated canvas.
+    
+    Each new frame is downscaled straight into its tile (letterboxed to keep
+    its aspect ratio), and only tiles with a new frame are redrawn, so the
+    cost of a tick depends on the canvas size and the tiles that changed,
+    not on the source resolutions.
+    """
+    
+    def __init__(self, count, size=(1280, 720), border=4):
+        """
+        Initialize the canvas.
+        
+        Args:
+            count: Number of tiles
+            size: Canvas (width, height) in pixels
+            border: Thickness of the alert border drawn around a tile
+        """
+        self.count = count
+        self.size = size
+        self.border = border
+        self.rows, self.cols = grid_shape(count)
+        self.cell_width = size[0] // self.cols
+        self.cell_height = size[1] // self.rows
+        self.canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        
+        # Fitted (x, y, width, height) of each tile, recomputed when a source changes shape
+        self.tiles = [None] * count
+        self.shapes = [None] * count
+    
+    def _fit(self, index, shape):
+        """Place a source of the given shape in its cell, letterboxed."""
+        height, width = shape[:2]
+        scale = min(self.cell_width / width, self.cell_height / height)
+        tile_width, tile_height = max(1, int(width * scale)), max(1, int(height * scale))
+        row, col = divmod(index, self.cols)
+        x = col * self.cell_width + (self.cell_width - tile_width) // 2
+        y = row * self.cell_height + (self.cell_height - tile_height) // 2
+        
+        # Clear the whole cell so a previous, differently shaped tile does not linger
+        cell_x, cell_y = col * self.cell_width, row * self.cell_height
+        self.canvas[cell_y:cell_y + self.cell_height, cell_x:cell_x + self.cell_width] = 0
+        self.tiles[index] = (x, y, tile_width, tile_height)
+        self.shapes[index] = shape
+    
+    def draw_tile(self, index, frame, label=None, state=None):
+        """
+        Downscale a frame into its tile and draw its label and alert border.
+        
+        Args:
+            index: Tile index (row-major)
+            frame: BGR frame
+            label: Text drawn in the tile's corner (camera name)
+            state: Detector state; WARNING and ALERT tiles get a coloured border
+        """
+        if self.shapes[index] != frame.shape:
+            self._fit(index, frame.shape)
+        x, y, width, height = self.tiles[index]
+        tile = self.canvas[y:y + height, x:x + width]
+        cv2.resize(frame, (width, height), dst=tile, interpolation=cv2.INTER_AREA)
+        
+        if label:
+            cv2.putText(tile, label, (8, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3)
+            cv2.putText(tile, label, (8, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        color = STATE_COLORS.get(state)
+        if color is not None:
+            cv2.rectangle(tile, (0, 0), (width - 1, height - 1), color, self.border)
+
+class MosaicProducer:
+    """
+    Frame hub producer composing several cameras into one mosaic stream.
+    
+    A mosaic is a channel of its own hub, identified by mosaic_id(), so all
+    viewers of the same mosaic share one composition and one JPEG encode per
+    tick. It reads the cameras' unencoded frames from the camera frame hub
+    (starting their pipelines like any other viewer) and publishes a frame
+    only when at least one tile changed.
+    """
+    
+    def __init__(self, frame_hub, fps=10.0, label=None, retry_interval=5.0):
+        """
+        Initialize the producer.
+        
+        Args:
+            frame_hub: FrameHub of the cameras
+            fps: Mosaic frames per second
+            label: Callable(camera_id) returning a tile label (None for no labels)
+            retry_interval: Seconds between restarts of a camera whose producer stopped
+        """
+        self.frame_hub = frame_hub
+        self.fps = fps
+        self.label = label
+        self.retry_interval = retry_interval
+    
+    def __call__(self, channel_id, hub):
+        """Compose and publish the mosaic until hub.active(channel_id) is False."""
+        variant, size, camera_ids = parse_mosaic_id(channel_id)
+        mosaic = Mosaic(len(camera_ids), size)
+        labels = [self.label(camera_id) if self.label else None for camera_id in camera_ids]
+        states = [None] * len(camera_ids)
+        seen = [0] * len(camera_ids)
+        
+        key = (variant, IMAGE)
+        for camera_id in camera_ids:
+            self.frame_hub.subscribe(camera_id, key)
+        subscribed = [time.time()] * len(camera_ids)
+        try:
+            while hub.active(channel_id):
+                tick_start = time.time()
+                changed = False
+                for index, camera_id in enumerate(camera_ids):
+                    sequence, packet, running = self.frame_hub.next_frame(camera_id, key, seen[index], timeout=0)
+                    if not running and tick_start - subscribed[index] >= self.retry_interval:
+                        # The camera's producer exited (e.g. the camera failed to
+                        # open): subscribing again starts a new one, then the
+                        # extra subscription is released
+                        self.frame_hub.subscribe(camera_id, key)
+                        self.frame_hub.unsubscribe(camera_id, key)
+                        subscribed[index] = tick_start
+                    if packet is None:
+                        continue
+                    seen[index] = sequence
+                    # Status messages (camera errors) are published as JPEG only
+                    image = packet.image
+                    if image is None:
+                        image = cv2.imdecode(np.frombuffer(packet.jpeg, np.uint8), cv2.IMREAD_COLOR)
+                        if image is None:
+                            continue
+                    states[index] = packet.meta.get('state')
+                    run_blocking(mosaic.draw_tile, index, image, labels[index], states[index])
+                    changed = True
+                
+                if changed:
+                    with metrics.timer('encode', 'mosaic'):
+                        jpeg = run_blocking(encode_jpeg, mosaic.canvas) or b''
+                    meta = {'mosaic': channel_id,
+                            'tiles': [{'camera_id': camera_id, 'state': state}
+                                      for camera_id, state in zip(camera_ids, states)]}
+                    hub.publish(channel_id, (variant, None), FramePacket(jpeg, tick_start, meta))
+                
+                delay = 1.0 / self.fps - (time.time() - tick_start)
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            for camera_id in camera_ids:
+                self.frame_hub.unsubscribe(camera_id, key)
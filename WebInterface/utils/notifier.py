@@ -84,6 +84,88 @@ class EmailNotifier:
         """Check if cooldown period has passed"""
         return time.time() - self.last_email_time > self.email_cooldown
     
+    def build_message(self, notification, recipients):
+        """
+        Build the MIME email for a notification.
+        
+        Args:
+            notification: Notification object
+            recipients: List of recipient emails
+        
+        Returns:
+            MIMEMultipart: Message with text, HTML and inline images
+        """
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.email_sender
+        msg['To'] = ', '.join(recipients)
+        msg['Subject'] = notification.get_subject()
+        
+        # Add text part
+        text = notification.get_message()
+        msg.attach(MIMEText(text, 'plain'))
+        
+        # Begin HTML email content
+        html = f"""
+        <html>
+        <body>
+            <h2>Violence Alert</h2>
+            <p>Violence detected at <strong>{notification.location}</strong> on {notification.timestamp}</p>
+            <p>Incident ID: {notification.id}</p>
+        """
+        
+        # Add incident image if available
+        if notification.image_path and os.path.exists(os.path.join('static', notification.image_path)):
+            with open(os.path.join('static', notification.image_path), 'rb') as img_file:
+                img = MIMEImage(img_file.read())
+                img.add_header('Content-ID', f'<image{notification.id}>')
+                img.add_header('Content-Disposition', 'inline', filename=f'incident_{notification.id}.jpg')
+                msg.attach(img)
+            
+            html += f"""
+            <h3>Incident Image:</h3>
+            <p><img src="cid:image{notification.id}" style="max-width: 800px; border: 1px solid #ddd;"></p>
+            """
+        
+        # Add face images if available
+        if notification.faces_detected and notification.face_paths:
+            html += f"<h3>Detected Faces:</h3><div style='display: flex; flex-wrap: wrap; gap: 10px;'>"
+            
+            for i, face_path in enumerate(notification.face_paths):
+                face_file_path = os.path.join('static', 'uploads', face_path)
+                if os.path.exists(face_file_path):
+                    with open(face_file_path, 'rb') as face_file:
+                        face_img = MIMEImage(face_file.read())
+                        face_cid = f"face{notification.id}_{i}"
+                        face_img.add_header('Content-ID', f'<{face_cid}>')
+                        face_img.add_header('Content-Disposition', 'inline', 
+                                           filename=f'face_{notification.id}_{i}.jpg')
+                        msg.attach(face_img)
+                    
+                    html += f"""
+                    <div style="text-align: center;">
+                        <img src="cid:{face_cid}" style="width: 150px; border: 2px solid #ff0000; border-radius: 5px;">
+                        <p style="margin: 5px 0; font-size: 12px;">Face #{i+1}</p>
+                    </div>
+                    """
+            
+            html += "</div>"
+        elif notification.faces_detected:
+            html += "<p><em>Faces were detected but images are not available.</em></p>"
+        else:
+            html += "<p><em>No faces were detected in this incident.</em></p>"
+        
+        # Complete the HTML email
+        html += """
+        </body>
+        </html>
+        """
+        
+        # Attach the HTML content
+        msg.attach(MIMEText(html, 'html'))
+        
+        return msg
+    
     def send_notification(self, notification, recipients=None):
         """
         Send email notification
@@ -112,74 +194,7 @@ class EmailNotifier:
             return False
         
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.email_sender
-            msg['To'] = ', '.join(email_recipients)
-            msg['Subject'] = notification.get_subject()
-            
-            # Add text part
-            text = notification.get_message()
-            msg.attach(MIMEText(text, 'plain'))
-            
-            # Begin HTML email content
-            html = f"""
-            <html>
-            <body>
-                <h2>Violence Alert</h2>
-                <p>Violence detected at <strong>{notification.location}</strong> on {notification.timestamp}</p>
-                <p>Incident ID: {notification.id}</p>
-            """
-            
-            # Add incident image if available
-            if notification.image_path and os.path.exists(os.path.join('static', notification.image_path)):
-                with open(os.path.join('static', notification.image_path), 'rb') as img_file:
-                    img = MIMEImage(img_file.read())
-                    img.add_header('Content-ID', f'<image{notification.id}>')
-                    img.add_header('Content-Disposition', 'inline', filename=f'incident_{notification.id}.jpg')
-                    msg.attach(img)
-                
-                html += f"""
-                <h3>Incident Image:</h3>
-                <p><img src="cid:image{notification.id}" style="max-width: 800px; border: 1px solid #ddd;"></p>
-                """
-            
-            # Add face images if available
-            if notification.faces_detected and notification.face_paths:
-                html += f"<h3>Detected Faces:</h3><div style='display: flex; flex-wrap: wrap; gap: 10px;'>"
-                
-                for i, face_path in enumerate(notification.face_paths):
-                    face_file_path = os.path.join('static', 'uploads', face_path)
-                    if os.path.exists(face_file_path):
-                        with open(face_file_path, 'rb') as face_file:
-                            face_img = MIMEImage(face_file.read())
-                            face_cid = f"face{notification.id}_{i}"
-                            face_img.add_header('Content-ID', f'<{face_cid}>')
-                            face_img.add_header('Content-Disposition', 'inline', 
-                                               filename=f'face_{notification.id}_{i}.jpg')
-                            msg.attach(face_img)
-                        
-                        html += f"""
-                        <div style="text-align: center;">
-                            <img src="cid:{face_cid}" style="width: 150px; border: 2px solid #ff0000; border-radius: 5px;">
-                            <p style="margin: 5px 0; font-size: 12px;">Face #{i+1}</p>
-                        </div>
-                        """
-                
-                html += "</div>"
-            elif notification.faces_detected:
-                html += "<p><em>Faces were detected but images are not available.</em></p>"
-            else:
-                html += "<p><em>No faces were detected in this incident.</em></p>"
-            
-            # Complete the HTML email
-            html += """
-            </body>
-            </html>
-            """
-            
-            # Attach the HTML content
-            msg.attach(MIMEText(html, 'html'))
+            msg = self.build_message(notification, email_recipients)
             
             # Connect to server and send email
             with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
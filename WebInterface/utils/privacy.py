@@ -0,0 +1,242 @@
+import time
+import threading
+import cv2
+import numpy as np
+
+from .faces import box_iou
+from .metrics import metrics
+
+def blur_regions(frame, boxes, block_size=12):
+    """
+    Pixelate rectangular regions of a frame in place.
+    
+    Pixelation costs two small resizes per region regardless of its size, so it
+    stays cheap where a Gaussian blur strong enough to hide a face would not.
+    
+    Args:
+        frame: BGR frame (modified in place)
+        boxes: (x, y, width, height) boxes in frame coordinates
+        block_size: Side of the blocks a region is reduced to, in pixels
+    
+    Returns:
+        frame: The same frame
+    """
+    frame_height, frame_width = frame.shape[:2]
+    for x, y, width, height in boxes:
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(frame_width, int(x + width)), min(frame_height, int(y + height))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            continue
+        region = frame[y1:y2, x1:x2]
+        small = cv2.resize(region, (max(1, (x2 - x1) // block_size), max(1, (y2 - y1) // block_size)),
+                           interpolation=cv2.INTER_AREA)
+        region[:] = cv2.resize(small, (x2 - x1, y2 - y1), interpolation=cv2.INTER_NEAREST)
+    return frame
+
+class PrivacyFilter:
+    """
+    Real-time face blurring for one outgoing stream.
+    
+    Faces are detected every detect_interval seconds on a frame reduced by
+    scale, in a background thread so a slow detector (MTCNN) never stalls the
+    stream. Between detections each face is tracked with sparse optical flow
+    on the reduced frame, and faces a detection pass missed are held for
+    hold seconds so a single miss does not expose them. Only the face regions
+    are blurred, in place on the outgoing frame; callers keep their own copy
+    of the raw frame for incident evidence.
+    
+    The filter fails closed: until a detection pass has succeeded, after a
+    pass failed (detect raised) and when no pass has succeeded for
+    stale_after seconds, the whole frame is pixelated.
+    
+    Target: a few milliseconds per 640x480 frame on one core (see the
+    privacy.* cases in benchmark.py), well inside a 30 fps frame budget.
+    """
+    
+    def __init__(self, detect, detect_interval=0.5, scale=0.5, padding=0.25, hold=1.0,
+                 block_size=12, asynchronous=True, camera_id=None, stale_after=5.0):
+        """
+        Initialize the filter.
+        
+        Args:
+            detect: Callable taking a BGR image and returning MTCNN-style detections ({'box': ...});
+                it must raise when faces cannot be detected (see ViolenceDetector.detect_faces strict)
+            detect_interval: Seconds between detection passes
+            scale: Resize factor of the frames detection and tracking run on
+            padding: Fraction of the box size added on every side before blurring
+            hold: Seconds a face missed by detection keeps being blurred
+            block_size: Pixelation block size in full-resolution pixels
+            asynchronous: Run detection in a background thread (False runs it inline)
+            camera_id: Camera the stream belongs to (for metrics)
+            stale_after: Seconds without a successful detection pass before whole frames are pixelated
+        """
+        self.detect = detect
+        self.detect_interval = detect_interval
+        self.scale = scale
+        self.padding = padding
+        self.hold = hold
+        self.block_size = block_size
+        self.asynchronous = asynchronous
+        self.camera_id = camera_id
+        self.stale_after = stale_after
+        
+        # Time of the last successful detection pass (None until one succeeded or after a failure)
+        self.detected_at = None
+        
+        # Tracks in reduced-frame coordinates: {'box': [x, y, w, h], 'points': Nx1x2, 'seen': time}
+        self.tracks = []
+        self.prev_gray = None
+        self.last_submit = 0.0
+        
+        # Single-slot hand-off to and from the detection thread
+        self.lock = threading.Lock()
+        self.pending = None
+        self.result = None
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = None
+        if asynchronous:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+    
+    def apply(self, frame):
+        """
+        Blur the faces in an outgoing frame in place.
+        
+        Args:
+            frame: BGR frame
+        
+        Returns:
+            frame: The same frame with faces blurred
+        """
+        start = time.perf_counter()
+        now = time.time()
+        
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        
+        if self.tracks and self.prev_gray is not None:
+            self.tracks = self._track(self.prev_gray, gray, self.tracks)
+        
+        # Merge finished detections, carried forward from the frame they ran on
+        with self.lock:
+            result, self.result = self.result, None
+        if result is not None:
+            detected_gray, boxes, detected_at = result
+            self._detected(boxes, detected_at)
+            if boxes is not None:
+                self._merge(self._track(detected_gray, gray, self._start_tracks(detected_gray, boxes, detected_at)), now)
+        
+        if now - self.last_submit >= self.detect_interval:
+            self.last_submit = now
+            if self.asynchronous:
+                with self.lock:
+                    self.pending = (small, gray, now)
+                self.wakeup.set()
+            else:
+                boxes = self._run_detection(small)
+                self._detected(boxes, now)
+                if boxes is not None:
+                    self._merge(self._start_tracks(gray, boxes, now), now)
+        
+        self.tracks = [track for track in self.tracks if now - track['seen'] <= self.hold]
+        self.prev_gray = gray
+        
+        if self.detected_at is None or now - self.detected_at > self.stale_after:
+            # No trustworthy detection: hide everything rather than expose a face
+            height, width = frame.shape[:2]
+            blur_regions(frame, [(0, 0, width, height)], max(self.block_size, width // 16))
+        else:
+            blur_regions(frame, [self._frame_box(track['box'], frame.shape) for track in self.tracks],
+                         self.block_size)
+        metrics.observe_stage('privacy_blur', self.camera_id, time.perf_counter() - start)
+        return frame
+    
+    def close(self):
+        """Stop the detection thread."""
+        self.closed = True
+        self.wakeup.set()
+    
+    def _run_detection(self, small):
+        """Detect faces on a reduced frame, returning (x, y, w, h) boxes (None if detection failed)."""
+        try:
+            faces = self.detect(small) or []
+        except Exception as e:
+            print(f"Error detecting faces for privacy blur: {e}")
+            return None
+        return [list(face['box']) if isinstance(face, dict) else list(face) for face in faces]
+    
+    def _detected(self, boxes, detected_at):
+        """Record the outcome of a detection pass (boxes None if it failed)."""
+        if boxes is None:
+            if self.detected_at is not None:
+                print(f"Privacy blur for {self.camera_id}: face detection failed, pixelating whole frames")
+            self.detected_at = None
+        else:
+            self.detected_at = max(self.detected_at or 0.0, detected_at)
+    
+    def _worker(self):
+        """Run detection on the latest submitted frame."""
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.closed:
+                return
+            with self.lock:
+                pending, self.pending = self.pending, None
+            if pending is None:
+                continue
+            small, gray, submitted_at = pending
+            boxes = self._run_detection(small)
+            with self.lock:
+                self.result = (gray, boxes, submitted_at)
+    
+    def _start_tracks(self, gray, boxes, seen):
+        """Create tracks for detected boxes, seeding feature points inside each."""
+        tracks = []
+        for box in boxes:
+            x, y, width, height = [int(v) for v in box]
+            mask = np.zeros_like(gray)
+            mask[max(0, y):max(0, y + height), max(0, x):max(0, x + width)] = 255
+            points = cv2.goodFeaturesToTrack(gray, maxCorners=20, qualityLevel=0.01, minDistance=3, mask=mask)
+            tracks.append({'box': [x, y, width, height], 'points': points, 'seen': seen})
+        return tracks
+    
+    def _track(self, prev_gray, gray, tracks):
+        """Move tracks by the median optical flow of their feature points."""
+        with_points = [track for track in tracks if track['points'] is not None and len(track['points'])]
+        if not with_points:
+            return tracks
+        
+        points = np.concatenate([track['points'] for track in with_points]).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        
+        offset = 0
+        for track in with_points:
+            count = len(track['points'])
+            good = status[offset:offset + count].ravel() == 1
+            if good.any():
+                shift = np.median((moved[offset:offset + count] - points[offset:offset + count])[good], axis=0).ravel()
+                track['box'][0] += float(shift[0])
+                track['box'][1] += float(shift[1])
+                track['points'] = moved[offset:offset + count][good].reshape(-1, 1, 2)
+            else:
+                # Lost the points: keep blurring where the face was until it ages out
+                track['points'] = None
+            offset += count
+        return tracks
+    
+    def _merge(self, detected, now):
+        """Replace tracks matched by a detection pass; keep unmatched ones until they age out."""
+        kept = [track for track in self.tracks
+                if not any(box_iou(track['box'], new['box']) > 0.2 for new in detected)]
+        for track in detected:
+            track['seen'] = now
+        self.tracks = detected + kept
+    
+    def _frame_box(self, box, shape):
+        """Scale a reduced-frame box to full resolution and pad it."""
+        x, y, width, height = [v / self.scale for v in box]
+        pad_x, pad_y = width * self.padding, height * self.padding
+        return (x - pad_x, y - pad_y, width + 2 * pad_x, height + 2 * pad_y)
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import socket
+import threading
+import numpy as np
+
+from .detector import model_input_size
+from .hub import run_blocking
+
+MODEL_EXTENSIONS = ('.h5', '.keras', '.tflite')
+
+class ModelRegistry:
+    """
+    Catalogue of detection model variants and their measured cost.
+    
+    Variants (full, pruned, quantized, other input sizes) are listed in a
+    JSON manifest in the models directory:
+    
+        {"variants": [{"name": "full", "path": "modelnew.h5", "accuracy": 0.96,
+                       "description": "MobileNetV2 128x128"}, ...]}
+    
+    Model files in the directory that the manifest does not list are added
+    under their file name. CPU latency depends on the machine, so measured
+    latencies are stored in the manifest per host name; select() picks the
+    most accurate variant whose latency on this host fits a budget.
+    """
+    
+    def __init__(self, models_dir='models', manifest='registry.json', loader=None):
+        """
+        Initialize the registry.
+        
+        Args:
+            models_dir: Directory holding the model files and the manifest
+            manifest: Manifest file name inside models_dir
+            loader: Callable(path) returning a loaded model (defaults to keras load_model,
+                or the edge TFLite runtime for .tflite files)
+        """
+        self.models_dir = models_dir
+        self.manifest_path = os.path.join(models_dir, manifest)
+        self.loader = loader
+        self.host = socket.gethostname()
+        self.lock = threading.Lock()
+        self.variants = {}
+        self.refresh()
+    
+    def refresh(self):
+        """Re-read the manifest and rescan the models directory."""
+        variants = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    for variant in json.load(f).get('variants', []):
+                        variants[variant['name']] = variant
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error reading model manifest {self.manifest_path}: {e}")
+        
+        listed = {variant.get('path') for variant in variants.values()}
+        if os.path.isdir(self.models_dir):
+            for filename in sorted(os.listdir(self.models_dir)):
+                name, extension = os.path.splitext(filename)
+                if extension in MODEL_EXTENSIONS and filename not in listed and name not in variants:
+                    variants[name] = {'name': name, 'path': filename}
+        
+        with self.lock:
+            self.variants = variants
+    
+    def save(self):
+        """Write the manifest, including measured latencies."""
+        with self.lock:
+            data = {'variants': list(self.variants.values())}
+        os.makedirs(self.models_dir, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+    
+    def list(self):
+        """
+        Variants with this host's measured latency.
+        
+        Returns:
+            variants: List of dicts (name, path, input_size, accuracy, latency_ms, description)
+        """
+        with self.lock:
+            variants = list(self.variants.values())
+        return [dict(variant, latency_ms=self.latency(variant['name'])) for variant in variants]
+    
+    def get(self, name):
+        """Manifest entry of a variant (None if unknown)."""
+        with self.lock:
+            return self.variants.get(name)
+    
+    def latency(self, name):
+        """Measured milliseconds per frame of a variant on this host (None if not measured)."""
+        variant = self.get(name)
+        measured = variant.get('latency_ms') if variant else None
+        # A plain number in a hand-written manifest applies to every host
+        return measured.get(self.host) if isinstance(measured, dict) else measured
+    
+    def load(self, name, warmup=3):
+        """
+        Load a variant and warm it up, ready to be swapped in.
+        
+        The first predictions of a Keras model build its graph and are much
+        slower than later ones, so they run here rather than on live frames.
+        
+        Args:
+            name: Variant name
+            warmup: Untimed predictions to run after loading
+        
+        Returns:
+            model: Loaded model
+        
+        Raises:
+            KeyError: If the variant is unknown
+        """
+        variant = self.get(name)
+        if variant is None:
+            raise KeyError(f"Unknown model variant: {name}")
+        
+        loader = self.loader
+        if loader is None and variant['path'].endswith('.tflite'):
+            from edge.runtime import TFLiteModel
+            loader = TFLiteModel
+        elif loader is None:
+            from keras.models import load_model
+            loader = load_model
+        model = loader(os.path.join(self.models_dir, variant['path']))
+        
+        size = model_input_size(model)
+        variant['input_size'] = size
+        sample = np.random.rand(1, size, size, 3).astype(np.float32)
+        for _ in range(warmup):
+            model.predict(sample, verbose=0)
+        return model
+    
+    def measure(self, name, model=None, iterations=20):
+        """
+        Measure a variant's single-frame CPU latency on this host and store it.
+        
+        Args:
+            name: Variant name
+            model: Already loaded model (loaded and warmed up if None)
+            iterations: Timed predictions
+        
+        Returns:
+            latency_ms: Median milliseconds per frame
+        """
+        if model is None:
+            model = self.load(name)
+        size = model_input_size(model)
+        sample = np.random.rand(1, size, size, 3).astype(np.float32)
+        
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model.predict(sample, verbose=0)
+            timings.append(time.perf_counter() - start)
+        latency_ms = round(float(np.median(timings)) * 1000, 2)
+        
+        with self.lock:
+            variant = self.variants[name]
+            if not isinstance(variant.get('latency_ms'), dict):
+                variant['latency_ms'] = {}
+            variant['latency_ms'][self.host] = latency_ms
+        return latency_ms
+    
+    def measure_all(self, iterations=20):
+        """Measure every variant not yet measured on this host, saving the manifest."""
+        for variant in self.list():
+            if variant['latency_ms'] is not None:
+                continue
+            try:
+                latency_ms = self.measure(variant['name'], iterations=iterations)
+                print(f"Model {variant['name']}: {latency_ms} ms per frame")
+            except Exception as e:
+                print(f"Error measuring model {variant['name']}: {e}")
+        self.save()
+    
+    def select(self, budget_ms):
+        """
+        Pick the variant to run within a per-frame latency budget.
+        
+        Among variants measured on this host, the most accurate one within the
+        budget wins (the faster one on ties). If none fits, the fastest is used.
+        
+        Args:
+            budget_ms: Milliseconds per frame the model may take
+        
+        Returns:
+            name: Variant name, or None if no variant has been measured
+        """
+        measured = [variant for variant in self.list() if variant['latency_ms'] is not None]
+        if not measured:
+            return None
+        
+        fitting = [variant for variant in measured if variant['latency_ms'] <= budget_ms]
+        if fitting:
+            best = max(fitting, key=lambda variant: (variant.get('accuracy') or 0.0, -variant['latency_ms']))
+        else:
+            best = min(measured, key=lambda variant: variant['latency_ms'])
+        return best['name']
+
+class ModelSwitcher:
+    """
+    Loads model variants in the background and swaps them into a detector.
+    
+    Loading and warming a model takes seconds, so it happens off the stream
+    path; the detector keeps analyzing frames with the current model until
+    the new one is ready, then swap_model() replaces it between frames.
+    """
+    
+    def __init__(self, registry, detector, start_task):
+        """
+        Initialize the switcher.
+        
+        Args:
+            registry: ModelRegistry with the available variants
+            detector: ViolenceDetector (or subclass) to swap models into
+            start_task: Callable(target, *args) starting a background task
+        """
+        self.registry = registry
+        self.detector = detector
+        self.start_task = start_task
+        self.lock = threading.Lock()
+        self.status = {'state': 'idle', 'model': None, 'error': None}
+    
+    def activate(self, name):
+        """
+        Start loading a variant in the background.
+        
+        Returns:
+            started: False if another switch is still in progress
+        
+        Raises:
+            ValueError: If the variant is unknown
+        """
+        if self.registry.get(name) is None:
+            raise ValueError(f"Unknown model variant: {name}")
+        with self.lock:
+            if self.status['state'] == 'loading':
+                return False
+            self.status = {'state': 'loading', 'model': name, 'error': None}
+        self.start_task(self._switch, name)
+        return True
+    
+    def auto_select(self, budget_ms):
+        """Measure unmeasured variants, then switch to the best one within budget_ms (in the background)."""
+        with self.lock:
+            if self.status['state'] == 'loading':
+                return False
+            self.status = {'state': 'loading', 'model': None, 'error': None}
+        self.start_task(self._auto_select, budget_ms)
+        return True
+    
+    def _auto_select(self, budget_ms):
+        """Measure, select and switch."""
+        run_blocking(self.registry.measure_all)
+        name = self.registry.select(budget_ms)
+        if name is None or name == self.detector.model_name:
+            with self.lock:
+                self.status = {'state': 'idle', 'model': self.detector.model_name, 'error': None}
+            return
+        print(f"Model {name} selected for a {budget_ms} ms budget")
+        self._switch(name)
+    
+    def _switch(self, name):
+        """Load, warm and swap in a variant."""
+        try:
+            model = run_blocking(self.registry.load, name)
+            self.detector.swap_model(model, name)
+            status = {'state': 'idle', 'model': name, 'error': None}
+        except Exception as e:
+            print(f"Error switching to model {name}: {e}")
+            status = {'state': 'failed', 'model': name, 'error': str(e)}
+        with self.lock:
+            self.status = status
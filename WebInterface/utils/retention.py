@@ -0,0 +1,465 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime
+import cv2
+
+from .media import THUMBNAIL_SIZES, date_folder, jpeg_quality
+from .enhance import enhanced_path
+from .metrics import metrics
+
+# Names written by MediaStore (<20 hex digits>.jpg), its thumbnails and enhanced face copies
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{20}(\.\w+)?\.\w+$')
+DATE_SHARD = re.compile(r'(^|/)\d{4}/\d{2}/\d{2}/[^/]+$')
+
+class RetentionService:
+    """
+    Background retention and compaction for incident images.
+    
+    Each pass works through the incident list in small, throttled batches:
+    
+    1. Expire incidents past their age limit (reviewed incidents live longer).
+    2. Enforce per-camera and global disk quotas, evicting unreviewed incidents
+       before reviewed ones, oldest first.
+    3. Re-encode older incident images at a lower JPEG quality (once: images
+       already at or below that quality are left alone).
+    4. Move files still in the flat legacy layout into date folders.
+    5. Delete content-addressed files and thumbnails nothing refers to.
+    
+    Thumbnails and enhanced face copies are derived from a stored file and
+    are deleted with it; they are orphaned only once their source is gone.
+    
+    Records are updated before files are removed, and new files are written
+    before records point at them, so a crash leaves at worst an orphaned file
+    for the next pass to sweep up. Files shared by several incidents (linked
+    faces) are only deleted with their last reference.
+    """
+    
+    def __init__(self, uploads_dir, incidents, media=None, face_store=None, face_index=None,
+                 max_bytes=None, camera_max_bytes=None, max_age_days=30, reviewed_max_age_days=180,
+                 recompress_after_days=7, recompress_quality=60, orphan_grace_hours=24,
+                 interval=3600, batch_size=50, pause=0.05, on_update=None, on_delete=None, stored_files=None):
+        """
+        Initialize the retention service.
+        
+        Args:
+            uploads_dir: Root folder of stored images (static/uploads)
+            incidents: Shared list of incident dictionaries (modified in place)
+            media: MediaStore used to write re-encoded images
+            face_store: FaceStore whose link index follows moved faces
+            face_index: FaceIndex whose entries follow moved faces
+            max_bytes: Global disk quota for uploads (None for unlimited)
+            camera_max_bytes: Disk quota per camera (None for unlimited)
+            max_age_days: Age at which unreviewed incidents are deleted (None to keep)
+            reviewed_max_age_days: Age at which reviewed incidents are deleted (None to keep)
+            recompress_after_days: Age at which incident images are re-encoded (None to skip)
+            recompress_quality: JPEG quality for re-encoded images
+            orphan_grace_hours: Minimum age of unreferenced files before they are deleted
+            interval: Seconds between passes when running in the background
+            batch_size: File operations between pauses
+            pause: Seconds to yield after each batch so the app is never stalled
+            on_update: Callback(incident, moves) after an incident's files moved (old -> new path)
+            on_delete: Callback(incident) after an incident was removed
+            stored_files: Callback returning the paths stored incident records refer to; the
+                orphan sweep keeps them even if the incident list is incomplete
+        """
+        self.uploads_dir = uploads_dir
+        self.incidents = incidents
+        self.media = media
+        self.face_store = face_store
+        self.face_index = face_index
+        self.max_bytes = max_bytes
+        self.camera_max_bytes = camera_max_bytes
+        self.max_age_days = max_age_days
+        self.reviewed_max_age_days = reviewed_max_age_days
+        self.recompress_after_days = recompress_after_days
+        self.recompress_quality = recompress_quality
+        self.orphan_grace_hours = orphan_grace_hours
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.on_update = on_update
+        self.on_delete = on_delete
+        self.stored_files = stored_files
+        
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.operations = 0
+        self.last_report = None
+    
+    def start(self):
+        """Run passes in a background thread every interval seconds."""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop the background thread after its current batch."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+    
+    def _loop(self):
+        """Background loop."""
+        while not self.stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in retention pass: {e}")
+            self.stop_event.wait(self.interval)
+    
+    def _throttle(self):
+        """Yield to the app after every batch of file operations."""
+        self.operations += 1
+        if self.operations % self.batch_size == 0:
+            time.sleep(self.pause)
+    
+    def run_once(self, now=None):
+        """
+        Run one retention pass.
+        
+        Args:
+            now: Current time in epoch seconds (defaults to time.time())
+        
+        Returns:
+            report: Dictionary of actions taken and bytes reclaimed
+        """
+        now = time.time() if now is None else now
+        start = time.perf_counter()
+        report = {'expired': 0, 'evicted': 0, 'recompressed': 0, 'sharded': 0, 'orphans': 0,
+                  'bytes_reclaimed': 0}
+        
+        with self.lock:
+            self._expire(now, report)
+            self._enforce_quotas(report)
+            self._recompress(now, report)
+            self._shard(report)
+            self._sweep_orphans(now, report)
+            
+            report['bytes_total'] = self._total_bytes()
+            report['incidents'] = len(self.incidents)
+            report['seconds'] = round(time.perf_counter() - start, 3)
+            report['finished'] = datetime.fromtimestamp(now).isoformat(timespec='seconds')
+            self.last_report = report
+        
+        metrics.storage_bytes.set(report['bytes_total'])
+        if report['bytes_reclaimed'] or report['expired'] or report['evicted']:
+            print(f"Retention: {report['expired']} expired, {report['evicted']} evicted, "
+                  f"{report['recompressed']} recompressed, {report['sharded']} sharded, "
+                  f"{report['orphans']} orphans, {report['bytes_reclaimed'] / 1e6:.1f} MB reclaimed")
+        return report
+    
+    # Incident bookkeeping
+    
+    def _incident_time(self, incident):
+        """Creation time of an incident in epoch seconds."""
+        if 'created_at' in incident:
+            return incident['created_at']
+        try:
+            return time.mktime(time.strptime(incident['timestamp'], '%Y-%m-%d %H:%M:%S'))
+        except (KeyError, ValueError):
+            return time.time()
+    
+    def _incident_files(self, incident):
+        """Image, face and merged evidence image paths of an incident, relative to the uploads folder."""
+        files = []
+        image_path = incident.get('image_path')
+        if image_path:
+            files.append(image_path[len('uploads/'):] if image_path.startswith('uploads/') else image_path)
+        files.extend(incident.get('face_paths') or [])
+        for evidence in incident.get('evidence') or []:
+            path = evidence.get('image_path')
+            if path:
+                files.append(path[len('uploads/'):] if path.startswith('uploads/') else path)
+        return files
+    
+    def _references(self):
+        """Count how many incidents refer to each file."""
+        references = {}
+        for incident in list(self.incidents):
+            for path in self._incident_files(incident):
+                references[path] = references.get(path, 0) + 1
+        return references
+    
+    def _thumbnails(self, path):
+        """Existing thumbnail paths of a stored image."""
+        stem = os.path.splitext(path)[0]
+        directory = os.path.join(self.uploads_dir, 'thumbs', os.path.dirname(stem))
+        prefix = os.path.basename(stem) + '.'
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join('thumbs', os.path.dirname(stem), name).replace(os.sep, '/')
+                for name in os.listdir(directory)
+                if name.startswith(prefix) and name[len(prefix):].split('.')[0] in THUMBNAIL_SIZES]
+    
+    def _derived(self, path):
+        """Existing thumbnails and enhanced copy of a stored image."""
+        derived = self._thumbnails(path)
+        enhanced = enhanced_path(path)
+        if enhanced != path and os.path.exists(os.path.join(self.uploads_dir, enhanced)):
+            derived.append(enhanced)
+        return derived
+    
+    def _size(self, path):
+        """Size of a stored file and its derived files in bytes."""
+        total = 0
+        for name in [path] + self._derived(path):
+            try:
+                total += os.path.getsize(os.path.join(self.uploads_dir, name))
+            except OSError:
+                pass
+        return total
+    
+    def _delete(self, path):
+        """Delete a stored file and its derived files, returning the bytes freed."""
+        freed = 0
+        for name in [path] + self._derived(path):
+            full_path = os.path.join(self.uploads_dir, name)
+            try:
+                size = os.path.getsize(full_path)
+                os.remove(full_path)
+                freed += size
+            except OSError:
+                pass
+            self._throttle()
+        return freed
+    
+    def _remove_incident(self, incident, references, reason):
+        """Drop an incident record, then the files no other incident uses."""
+        try:
+            self.incidents.remove(incident)
+        except ValueError:
+            return 0
+        if self.on_delete:
+            self.on_delete(incident)
+        
+        freed = 0
+        deleted_faces = {}
+        for path in self._incident_files(incident):
+            references[path] = references.get(path, 1) - 1
+            if references[path] <= 0:
+                freed += self._delete(path)
+                references.pop(path, None)
+                if path.startswith('faces/'):
+                    deleted_faces[path] = None
+        
+        self._follow_faces(deleted_faces)
+        metrics.retention_reclaimed_bytes_total.inc(freed, reason=reason)
+        return freed
+    
+    def _follow_faces(self, moves):
+        """Point the face link index and search index at moved or deleted faces."""
+        if not moves:
+            return
+        if self.face_store is not None:
+            self.face_store.relocate(moves)
+        if self.face_index is not None:
+            self.face_index.update_paths(moves)
+    
+    def _move_references(self, moves):
+        """Rewrite incident records after files were moved."""
+        for incident in list(self.incidents):
+            old_paths = self._incident_files(incident)
+            if not any(path in moves for path in old_paths):
+                continue
+            
+            image_path = incident.get('image_path')
+            if image_path:
+                relative = image_path[len('uploads/'):] if image_path.startswith('uploads/') else image_path
+                if relative in moves:
+                    incident['image_path'] = 'uploads/' + moves[relative]
+            if incident.get('face_paths'):
+                incident['face_paths'] = [moves.get(path, path) for path in incident['face_paths']]
+            for evidence in incident.get('evidence') or []:
+                path = evidence.get('image_path')
+                relative = path[len('uploads/'):] if path and path.startswith('uploads/') else path
+                if relative in moves:
+                    evidence['image_path'] = 'uploads/' + moves[relative]
+            
+            if self.on_update:
+                self.on_update(incident, moves)
+        
+        self._follow_faces({old: new for old, new in moves.items() if old.startswith('faces/')})
+    
+    # Policies
+    
+    def _expire(self, now, report):
+        """Delete incidents past their age limit."""
+        references = self._references()
+        for incident in list(self.incidents):
+            limit = self.reviewed_max_age_days if incident.get('reviewed') else self.max_age_days
+            if limit is None or now - self._incident_time(incident) < limit * 86400:
+                continue
+            report['bytes_reclaimed'] += self._remove_incident(incident, references, 'expired')
+            report['expired'] += 1
+    
+    def _enforce_quotas(self, report):
+        """Evict incidents until every camera and the whole store are within quota."""
+        if self.max_bytes is None and self.camera_max_bytes is None:
+            return
+        
+        references = self._references()
+        
+        # Shared faces are charged to each incident in proportion to its share
+        sizes = {}
+        for incident in list(self.incidents):
+            sizes[id(incident)] = sum(self._size(path) / references.get(path, 1)
+                                      for path in self._incident_files(incident))
+        
+        # Unreviewed incidents go first, oldest first within each group
+        order = sorted(self.incidents, key=lambda i: (bool(i.get('reviewed')), self._incident_time(i)))
+        
+        if self.camera_max_bytes is not None:
+            usage = {}
+            for incident in order:
+                camera = incident.get('camera_id', incident.get('location'))
+                usage[camera] = usage.get(camera, 0) + sizes[id(incident)]
+            for incident in order:
+                camera = incident.get('camera_id', incident.get('location'))
+                if usage[camera] <= self.camera_max_bytes:
+                    continue
+                usage[camera] -= sizes[id(incident)]
+                report['bytes_reclaimed'] += self._remove_incident(incident, references, 'camera_quota')
+                report['evicted'] += 1
+        
+        if self.max_bytes is not None:
+            total = self._total_bytes()
+            for incident in order:
+                if total <= self.max_bytes:
+                    break
+                if incident not in self.incidents:
+                    continue
+                freed = self._remove_incident(incident, references, 'global_quota')
+                total -= freed
+                report['bytes_reclaimed'] += freed
+                report['evicted'] += 1
+    
+    def _recompress(self, now, report):
+        """Re-encode incident images older than recompress_after_days at lower quality."""
+        if self.recompress_after_days is None or self.media is None:
+            return
+        
+        cutoff = now - self.recompress_after_days * 86400
+        for incident in list(self.incidents):
+            if incident.get('compacted') or self._incident_time(incident) > cutoff:
+                continue
+            
+            files = self._incident_files(incident)
+            path = files[0] if incident.get('image_path') else None
+            incident['compacted'] = True
+            if path is None:
+                continue
+            
+            # The flag above only lives in memory, so after a restart images already
+            # re-encoded (or saved at low quality) are recognized by their quality
+            full_path = os.path.join(self.uploads_dir, path)
+            quality = jpeg_quality(full_path)
+            if quality is not None and quality <= self.recompress_quality:
+                continue
+            image = cv2.imread(full_path)
+            if image is None:
+                continue
+            
+            old_size = os.path.getsize(full_path)
+            new_path = self.media.save_image(image, timestamp=self._incident_time(incident),
+                                             quality=self.recompress_quality)
+            self._throttle()
+            new_size = os.path.getsize(os.path.join(self.uploads_dir, new_path))
+            
+            if new_size >= old_size:
+                # Nothing gained; keep the original
+                if new_path != path:
+                    self._delete(new_path)
+                continue
+            
+            # Every record pointing at the old file now points at the new one
+            self._move_references({path: new_path})
+            freed = self._delete(path) - new_size
+            report['bytes_reclaimed'] += freed
+            metrics.retention_reclaimed_bytes_total.inc(freed, reason='recompressed')
+            report['recompressed'] += 1
+    
+    def _shard(self, report):
+        """Move files from the flat legacy layout into date folders."""
+        moves = {}
+        for incident in list(self.incidents):
+            timestamp = self._incident_time(incident)
+            for path in self._incident_files(incident):
+                if path in moves or DATE_SHARD.search(path):
+                    continue
+                
+                folder, name = os.path.split(path)
+                new_path = os.path.join(folder, date_folder(timestamp), name).replace(os.sep, '/')
+                source = os.path.join(self.uploads_dir, path)
+                target = os.path.join(self.uploads_dir, new_path)
+                if not os.path.exists(source):
+                    continue
+                
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                # Derived files are re-rendered on demand under the new name
+                for derived in self._derived(path):
+                    self._delete(derived)
+                moves[path] = new_path
+                report['sharded'] += 1
+                self._throttle()
+        
+        if moves:
+            self._move_references(moves)
+    
+    def _sweep_orphans(self, now, report):
+        """Delete content-addressed files and thumbnails that nothing refers to."""
+        references = set(self._references())
+        if self.stored_files is not None:
+            # Raises (and skips the sweep) if the records cannot be read
+            references.update(self.stored_files())
+        cutoff = now - self.orphan_grace_hours * 3600
+        
+        for root, _, names in os.walk(self.uploads_dir):
+            for name in names:
+                if not CONTENT_ADDRESSED.match(name):
+                    continue
+                
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.uploads_dir).replace(os.sep, '/')
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                # Recent files may belong to an incident that is still being recorded
+                if stat.st_mtime > cutoff:
+                    continue
+                
+                if path.startswith('thumbs/'):
+                    stem, _ = os.path.splitext(os.path.splitext(path[len('thumbs/'):])[0])
+                    orphaned = not os.path.exists(os.path.join(self.uploads_dir, stem + '.jpg'))
+                elif path.endswith('.enhanced.jpg'):
+                    source = path[:-len('.enhanced.jpg')] + '.jpg'
+                    orphaned = not os.path.exists(os.path.join(self.uploads_dir, source))
+                else:
+                    orphaned = path not in references
+                
+                if orphaned:
+                    os.remove(full_path)
+                    report['orphans'] += 1
+                    report['bytes_reclaimed'] += stat.st_size
+                    metrics.retention_reclaimed_bytes_total.inc(stat.st_size, reason='orphaned')
+                    if path.startswith('faces/'):
+                        self._follow_faces({path: None})
+                self._throttle()
+    
+    def _total_bytes(self):
+        """Total size of the uploads folder."""
+        total = 0
+        for root, _, names in os.walk(self.uploads_dir):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
@@ -0,0 +1,184 @@
+import os
+import numpy as np
+from keras.models import Model, load_model
+from .detector import ViolenceDetector
+
+class EmbeddingRingBuffer:
+    """Fixed-size ring buffer of per-frame embeddings for a single camera."""
+    
+    def __init__(self, window_size, embedding_dim, dtype=np.float32):
+        """
+        Initialize the ring buffer.
+        
+        Args:
+            window_size: Number of embeddings in the temporal window
+            embedding_dim: Length of each embedding vector
+            dtype: NumPy dtype used for storage
+        """
+        self.window_size = window_size
+        self.embedding_dim = embedding_dim
+        
+        # Every row is written twice (at i and i + window_size) so the most
+        # recent window is always one contiguous slice and never copied
+        self.storage = np.zeros((2 * window_size, embedding_dim), dtype=dtype)
+        self.position = 0
+        self.count = 0
+    
+    def append(self, embedding):
+        """Add an embedding, overwriting the oldest one when full."""
+        self.storage[self.position] = embedding
+        self.storage[self.position + self.window_size] = embedding
+        self.position = (self.position + 1) % self.window_size
+        self.count = min(self.count + 1, self.window_size)
+    
+    def is_full(self):
+        """Check if a complete window is available."""
+        return self.count == self.window_size
+    
+    def window(self):
+        """
+        Get the buffered embeddings ordered from oldest to newest.
+        
+        Returns:
+            window: View of shape (count, embedding_dim)
+        """
+        end = self.position + self.window_size
+        return self.storage[end - self.count:end]
+    
+    def clear(self):
+        """Drop all buffered embeddings."""
+        self.position = 0
+        self.count = 0
+
+class SequenceViolenceDetector(ViolenceDetector):
+    """
+    Violence detector that runs the MobileNetV2 backbone once per frame and
+    evaluates a temporal head over a sliding window of cached embeddings.
+    """
+    
+    def __init__(self, model_path='models/modelnew.h5', head_path='models/temporal_head.h5', window_size=16):
+        """
+        Initialize the sequence detector.
+        
+        Args:
+            model_path: Path to the trained per-frame model (backbone + classifier)
+            head_path: Path to the temporal head taking (window_size, embedding_dim) input
+            window_size: Number of frames in the temporal window
+        """
+        super().__init__(model_path)
+        
+        self.window_size = window_size
+        self.backbone = None
+        self.classifier = None
+        self.temporal_head = None
+        self.embedding_dim = 0
+        
+        # Per-camera embedding buffers
+        self.buffers = {}
+        
+        if self.model is None:
+            return
+        
+        self.backbone, self.classifier, self.embedding_dim = self.split_model(self.model)
+        
+        try:
+            if os.path.exists(head_path):
+                print(f"Loading temporal head from {head_path}...")
+                self.temporal_head = load_model(head_path)
+                print("Temporal head loaded successfully!")
+            else:
+                # Without a head sequence mode scores exactly like per-frame mode
+                print(f"Temporal head not found at {head_path}. Scoring the newest embedding only; "
+                      f"train one with train_temporal_head.py")
+        except Exception as e:
+            print(f"Error loading temporal head: {e}")
+    
+    @staticmethod
+    def split_model(model):
+        """
+        Split a trained model into the pooled backbone and its final dense layer.
+        
+        Returns:
+            (backbone, classifier, embedding_dim)
+        """
+        backbone = Model(inputs=model.input, outputs=model.layers[-2].output)
+        return backbone, model.layers[-1], int(backbone.output_shape[-1])
+    
+    def swap_model(self, model, name=None):
+        """
+        Replace the backbone and classifier with those of another model variant.
+        
+        The temporal head is kept, so the new backbone must produce embeddings
+        of the same size. Buffered windows are dropped because embeddings of
+        different backbones cannot be mixed.
+        
+        Raises:
+            ValueError: If the variant's embedding size does not match the temporal head
+        """
+        backbone, classifier, embedding_dim = self.split_model(model)
+        if self.temporal_head is not None and embedding_dim != self.embedding_dim:
+            raise ValueError(f"Model {name} produces {embedding_dim}-d embeddings, "
+                             f"the temporal head expects {self.embedding_dim}")
+        
+        self.backbone, self.classifier, self.embedding_dim = backbone, classifier, embedding_dim
+        self.reset()
+        super().swap_model(model, name)
+    
+    def get_buffer(self, camera_id):
+        """Get (or create) the embedding buffer for a camera."""
+        buffer = self.buffers.get(camera_id)
+        if buffer is None:
+            buffer = EmbeddingRingBuffer(self.window_size, self.embedding_dim)
+            self.buffers[camera_id] = buffer
+        return buffer
+    
+    def reset(self, camera_id=None):
+        """Clear buffered embeddings for one camera, or all cameras."""
+        if camera_id is None:
+            self.buffers = {}
+        elif camera_id in self.buffers:
+            self.buffers[camera_id].clear()
+    
+    def embed(self, processed):
+        """
+        Run the backbone on a preprocessed frame.
+        
+        Args:
+            processed: Output of preprocess_frame
+        
+        Returns:
+            embedding: 1-D float32 feature vector
+        """
+        # Calling the model directly avoids predict()'s per-call setup overhead
+        embedding = self.backbone(np.expand_dims(processed, axis=0), training=False)
+        return np.asarray(embedding)[0]
+    
+    def predict(self, processed, camera_id=None, model=None):
+        """
+        Embed the frame, push it into the camera's window and score the window.
+        
+        Args:
+            processed: Output of preprocess_frame
+            camera_id: Camera the frame belongs to
+            model: Unused; swap_model replaces the backbone and classifier together
+        
+        Returns:
+            preds: Array of model outputs, preds[0] is the violence probability
+        """
+        try:
+            embedding = self.embed(processed)
+            buffer = self.get_buffer(camera_id)
+            buffer.append(embedding)
+            
+            if self.temporal_head is not None and buffer.is_full():
+                window = np.expand_dims(buffer.window(), axis=0)
+                preds = np.asarray(self.temporal_head(window, training=False))[0]
+            else:
+                # Until a full window is available (or without a trained head)
+                # fall back to the per-frame classifier on the newest embedding
+                preds = np.asarray(self.classifier(np.expand_dims(embedding, axis=0)))[0]
+        except Exception as e:
+            print(f"Error during sequence prediction: {e}")
+            preds = np.array([0.0])
+        
+        return preds
@@ -0,0 +1,293 @@
+import time
+import threading
+import numpy as np
+
+# Detection states, indexed by the integer codes stored in the state arrays
+MONITORING = 0
+WARNING = 1
+ALERT = 2
+STATE_NAMES = ('MONITORING', 'WARNING', 'ALERT')
+
+class TemporalSmoother:
+    """
+    Constant-time temporal smoothing and alert state machine for many cameras.
+    
+    Each camera owns one row of a preallocated score ring buffer with a running
+    sum, so the moving average costs O(1) per frame regardless of window size.
+    An optional exponential moving average can replace the window mean. The
+    MONITORING/WARNING/ALERT decision is a hysteresis state machine: a state is
+    entered when the smoothed confidence rises above its threshold and only left
+    once it falls below that threshold minus release_margin. Sustained violence
+    also raises an ALERT through an evidence counter, subject to a cooldown.
+    
+    Camera threads share one smoother, so slot allocation, growth of the state
+    arrays and updates are serialized by a lock.
+    """
+    
+    # Per-camera settings accepted by configure()
+    SETTINGS = ('history_size', 'ema_alpha', 'violence_level', 'warning_threshold',
+                'alert_threshold', 'violence_threshold', 'alert_cooldown', 'release_margin')
+    
+    def __init__(self, history_size=10, ema_alpha=0.0, violence_level=0.50,
+                 warning_threshold=0.70, alert_threshold=0.85, violence_threshold=40,
+                 alert_cooldown=60, release_margin=0.05, max_history=64, capacity=8):
+        """
+        Initialize the smoother.
+        
+        Args:
+            history_size: Default moving-average window in frames
+            ema_alpha: Default EMA weight of the newest score (0 disables the EMA)
+            violence_level: Smoothed confidence counted as evidence of violence
+            warning_threshold: Smoothed confidence that enters WARNING
+            alert_threshold: Smoothed confidence that enters ALERT immediately
+            violence_threshold: Evidence count that raises an ALERT
+            alert_cooldown: Seconds between evidence-triggered alerts
+            release_margin: Hysteresis gap below a threshold before leaving its state
+            max_history: Largest window any camera may use
+            capacity: Initial number of camera slots
+        """
+        self.max_history = max_history
+        self.defaults = {
+            'history_size': history_size,
+            'ema_alpha': ema_alpha,
+            'violence_level': violence_level,
+            'warning_threshold': warning_threshold,
+            'alert_threshold': alert_threshold,
+            'violence_threshold': violence_threshold,
+            'alert_cooldown': alert_cooldown,
+            'release_margin': release_margin
+        }
+        self._check_settings(self.defaults)
+        
+        # Camera id -> row index in the state arrays
+        self.slots = {}
+        # Reentrant: update_batch and configure allocate slots while holding it
+        self.lock = threading.RLock()
+        self._allocate(capacity)
+    
+    def _allocate(self, capacity):
+        """Create or grow the per-camera state arrays."""
+        old_capacity = self.scores.shape[0] if hasattr(self, 'scores') else 0
+        
+        def grow(name, shape, dtype, fill):
+            array = np.full(shape, fill, dtype=dtype)
+            if old_capacity:
+                array[:old_capacity] = getattr(self, name)
+            setattr(self, name, array)
+        
+        # Score ring buffers and their running sums
+        grow('scores', (capacity, self.max_history), np.float64, 0.0)
+        grow('sums', capacity, np.float64, 0.0)
+        grow('counts', capacity, np.int32, 0)
+        grow('positions', capacity, np.int32, 0)
+        # NaN until the camera's first score seeds the EMA
+        grow('ema', capacity, np.float64, np.nan)
+        
+        # State machine
+        grow('states', capacity, np.int8, MONITORING)
+        grow('counters', capacity, np.float64, 0.0)
+        grow('last_alert', capacity, np.float64, -np.inf)
+        grow('confidence', capacity, np.float64, 0.0)
+        
+        # Per-camera settings
+        for name in self.SETTINGS:
+            dtype = np.int32 if name in ('history_size', 'violence_threshold') else np.float64
+            grow(name, capacity, dtype, self.defaults[name])
+    
+    def _check_settings(self, settings):
+        """Validate a dictionary of settings."""
+        for name in settings:
+            if name not in self.SETTINGS:
+                raise ValueError(f"Unknown smoothing setting: {name}")
+        
+        history_size = settings.get('history_size')
+        if history_size is not None and not 1 <= history_size <= self.max_history:
+            raise ValueError(f"history_size must be between 1 and {self.max_history}")
+        
+        ema_alpha = settings.get('ema_alpha')
+        if ema_alpha is not None and not 0.0 <= ema_alpha <= 1.0:
+            raise ValueError("ema_alpha must be between 0 and 1")
+    
+    def slot(self, camera_id):
+        """Get (or allocate) the state row for a camera."""
+        with self.lock:
+            index = self.slots.get(camera_id)
+            if index is None:
+                index = len(self.slots)
+                if index >= self.scores.shape[0]:
+                    self._allocate(2 * self.scores.shape[0])
+                self.slots[camera_id] = index
+            return index
+    
+    def configure(self, camera_id, **settings):
+        """
+        Override smoothing settings for one camera.
+        
+        Changing history_size discards the camera's buffered scores.
+        
+        Args:
+            camera_id: Camera to configure
+            **settings: Any of SETTINGS
+        """
+        self._check_settings(settings)
+        with self.lock:
+            index = self.slot(camera_id)
+            
+            for name, value in settings.items():
+                getattr(self, name)[index] = value
+            
+            if 'history_size' in settings:
+                self._clear_buffer(index)
+    
+    def get_settings(self, camera_id):
+        """Get the effective settings for a camera."""
+        with self.lock:
+            index = self.slot(camera_id)
+            return {name: getattr(self, name)[index].item() for name in self.SETTINGS}
+    
+    def _clear_buffer(self, index):
+        """Drop buffered scores for a state row."""
+        self.scores[index] = 0.0
+        self.sums[index] = 0.0
+        self.counts[index] = 0
+        self.positions[index] = 0
+    
+    def reset(self, camera_id):
+        """Return a camera to its initial MONITORING state."""
+        with self.lock:
+            index = self.slot(camera_id)
+            self._clear_buffer(index)
+            self.ema[index] = np.nan
+            self.states[index] = MONITORING
+            self.counters[index] = 0.0
+            self.last_alert[index] = -np.inf
+            self.confidence[index] = 0.0
+    
+    def update(self, camera_id, score, now=None):
+        """
+        Add one model score for a camera.
+        
+        Args:
+            camera_id: Camera the score belongs to
+            score: Raw violence probability for the newest frame
+            now: Timestamp in seconds (defaults to time.time())
+        
+        Returns:
+            confidence: Smoothed confidence
+            state: State name (MONITORING, WARNING or ALERT)
+        """
+        confidence, states = self.update_batch([camera_id], [score], now)
+        return float(confidence[0]), STATE_NAMES[states[0]]
+    
+    def update_batch(self, camera_ids, scores, now=None):
+        """
+        Add one model score for each of several cameras in a single vectorized step.
+        
+        Args:
+            camera_ids: Sequence of distinct camera ids
+            scores: Raw violence probabilities, aligned with camera_ids
+            now: Timestamp in seconds (defaults to time.time())
+        
+        Returns:
+            confidence: Array of smoothed confidences
+            states: Array of integer state codes (see STATE_NAMES)
+        """
+        with self.lock:
+            idx = np.fromiter((self.slot(camera_id) for camera_id in camera_ids), dtype=np.intp)
+            if len(np.unique(idx)) != len(idx):
+                raise ValueError("camera_ids must be distinct within a batch")
+            return self.update_slots(idx, scores, now)
+    
+    def update_slots(self, idx, scores, now=None):
+        """
+        Advance state rows by index, without camera id lookups.
+        
+        Used by update_batch and by offline replays that run one row per
+        parameter combination (see utils/calibration.py).
+        
+        Args:
+            idx: Array of distinct row indices
+            scores: Raw violence probabilities aligned with idx, or one score for all rows
+            now: Timestamp in seconds (defaults to time.time())
+        
+        Returns:
+            confidence: Array of smoothed confidences
+            states: Array of integer state codes (see STATE_NAMES)
+        """
+        if now is None:
+            now = time.time()
+        scores = np.asarray(scores, dtype=np.float64)
+        
+        with self.lock:
+            # Ring buffer with running sum
+            window = self.history_size[idx]
+            position = self.positions[idx]
+            count = self.counts[idx]
+            evicted = np.where(count == window, self.scores[idx, position], 0.0)
+            self.scores[idx, position] = scores
+            self.sums[idx] += scores - evicted
+            count = np.minimum(count + 1, window)
+            position = (position + 1) % window
+            self.counts[idx] = count
+            self.positions[idx] = position
+            
+            # Re-sum once per lap so floating point drift never accumulates
+            wrapped = idx[position == 0]
+            if len(wrapped):
+                self.sums[wrapped] = self.scores[wrapped].sum(axis=1)
+            
+            mean = self.sums[idx] / count
+            
+            # Optional EMA, seeded with the first score
+            alpha = self.ema_alpha[idx]
+            previous = self.ema[idx]
+            ema = np.where(np.isnan(previous), scores, alpha * scores + (1.0 - alpha) * previous)
+            self.ema[idx] = ema
+            confidence = np.where(alpha > 0.0, ema, mean)
+            self.confidence[idx] = confidence
+            
+            # Evidence counter: rises by 1 on violent frames, decays by 0.5 otherwise
+            violence_threshold = self.violence_threshold[idx]
+            counter = np.where(confidence > self.violence_level[idx],
+                               self.counters[idx] + 1.0,
+                               np.maximum(0.0, self.counters[idx] - 0.5))
+            
+            # Hysteresis: a state persists until confidence drops below threshold - margin
+            state = self.states[idx]
+            margin = self.release_margin[idx]
+            alert_level = np.where(state == ALERT, self.alert_threshold[idx] - margin, self.alert_threshold[idx])
+            warning_level = np.where(state >= WARNING, self.warning_threshold[idx] - margin, self.warning_threshold[idx])
+            
+            sustained = ((counter >= violence_threshold) &
+                         (now - self.last_alert[idx] > self.alert_cooldown[idx]))
+            alert = sustained | (confidence > alert_level)
+            
+            new_state = np.where(alert, ALERT, np.where(confidence > warning_level, WARNING, MONITORING))
+            
+            # Every ALERT frame restarts the cooldown and partially resets the evidence
+            # counter, as the original per-camera loop did, to avoid continuous alerts
+            self.last_alert[idx] = np.where(alert, now, self.last_alert[idx])
+            counter = np.where(alert, violence_threshold // 2, counter)
+            
+            self.counters[idx] = counter
+            self.states[idx] = new_state
+            
+            return confidence, new_state.astype(np.int8)
+    
+    def get_state(self, camera_id):
+        """Get the current state name for a camera."""
+        with self.lock:
+            index = self.slot(camera_id)
+            return STATE_NAMES[self.states[index]]
+    
+    def get_confidence(self, camera_id):
+        """Get the latest smoothed confidence for a camera."""
+        with self.lock:
+            index = self.slot(camera_id)
+            return float(self.confidence[index])
+    
+    def get_counter(self, camera_id):
+        """Get the evidence counter for a camera."""
+        with self.lock:
+            index = self.slot(camera_id)
+            return float(self.counters[index])
@@ -0,0 +1,99 @@
+import time
+import threading
+
+from .streaming import encode_jpeg, scale_to_width
+from .privacy import blur_regions
+
+class Snapshot:
+    """Latest still of one camera and the JPEGs derived from it."""
+    
+    def __init__(self, frame, timestamp, sequence, private=None):
+        self.frame = frame
+        self.private = private
+        self.timestamp = timestamp
+        self.sequence = sequence
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+class SnapshotCache:
+    """
+    In-memory latest still per camera, for previews, links and integrations.
+    
+    Camera producers hand in a copy of their current frame at most once per
+    interval. Requests are served from memory only and never open a capture
+    device. Each (width, private) rendition is encoded on its first request
+    and reused until the next frame arrives, so repeated requests cost a
+    dictionary lookup.
+    
+    Private snapshots are the copies producers blurred with the camera's
+    PrivacyFilter; without one the whole frame is pixelated, so a private
+    request never gets an unblurred face.
+    """
+    
+    def __init__(self, interval=0.5, quality=85):
+        """
+        Initialize the cache.
+        
+        Args:
+            interval: Minimum seconds between stored frames of a camera
+            quality: JPEG quality of the snapshots
+        """
+        self.interval = interval
+        self.quality = quality
+        self.snapshots = {}
+        self.sequence = 0
+        self.lock = threading.Lock()
+    
+    def due(self, camera_id):
+        """Whether a camera's snapshot is older than the refresh interval."""
+        snapshot = self.snapshots.get(camera_id)
+        return snapshot is None or time.time() - snapshot.timestamp >= self.interval
+    
+    def update(self, camera_id, frame, timestamp=None, private=None):
+        """
+        Store a camera's latest frame.
+        
+        Args:
+            camera_id: Camera the frame belongs to
+            frame: BGR frame (not modified afterwards; pass a copy)
+            timestamp: Capture time (epoch seconds)
+            private: The same frame with faces blurred, if the producer has one
+        """
+        with self.lock:
+            self.sequence += 1
+            self.snapshots[camera_id] = Snapshot(frame, timestamp or time.time(), self.sequence, private)
+    
+    def get(self, camera_id, width=None, private=False):
+        """
+        Get a camera's latest snapshot as JPEG.
+        
+        Args:
+            camera_id: Camera to read
+            width: Maximum width in pixels (None for full size)
+            private: Blur faces
+        
+        Returns:
+            (jpeg, timestamp, etag), or None if the camera has no snapshot yet
+        """
+        snapshot = self.snapshots.get(camera_id)
+        if snapshot is None:
+            return None
+        
+        rendition = (width, private)
+        with snapshot.lock:
+            jpeg = snapshot.encoded.get(rendition)
+            if jpeg is None:
+                frame = snapshot.frame
+                if private:
+                    frame = snapshot.private
+                    if frame is None:
+                        height, width_full = snapshot.frame.shape[:2]
+                        frame = blur_regions(snapshot.frame.copy(), [(0, 0, width_full, height)],
+                                             max(12, width_full // 16))
+                jpeg = encode_jpeg(scale_to_width(frame, width), self.quality)
+                if jpeg is None:
+                    return None
+                snapshot.encoded[rendition] = jpeg
+        
+        etag = f"{camera_id}-{snapshot.sequence}-{width or 'full'}{'-private' if private else ''}"
+        return jpeg, snapshot.timestamp, etag
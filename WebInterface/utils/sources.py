@@ -0,0 +1,442 @@
+import os
+import time
+import urllib.parse
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# Bounds of the URL parameters that size what a source allocates, since any
+# logged-in user can register a camera URL
+MAX_MEMORY_FRAMES = 3000
+MAX_MEMORY_BYTES = 2 * 1024 ** 3
+MIN_SIZE = (16, 16)
+MAX_SIZE = (3840, 2160)
+
+class FrameClock:
+    """
+    Paces frame delivery at a fixed rate.
+    
+    Deadlines are scheduled on an absolute timeline (start + n / fps) so sleep
+    jitter does not accumulate into drift. If the consumer falls more than one
+    frame behind, the schedule is re-anchored instead of bursting to catch up.
+    """
+    
+    def __init__(self, fps):
+        """
+        Initialize the clock.
+        
+        Args:
+            fps: Target frames per second (0 or less disables pacing)
+        """
+        self.fps = fps
+        self.period = 1.0 / fps if fps and fps > 0 else 0.0
+        self.next_deadline = None
+    
+    def wait(self):
+        """Block until the next frame is due."""
+        if not self.period:
+            return
+        
+        now = time.perf_counter()
+        if self.next_deadline is None or now - self.next_deadline > self.period:
+            self.next_deadline = now
+        elif self.next_deadline > now:
+            time.sleep(self.next_deadline - now)
+        self.next_deadline += self.period
+
+class VirtualSource:
+    """
+    Base class for sources that mimic the cv2.VideoCapture interface.
+    
+    Subclasses implement _next_frame(); read() adds pacing and bookkeeping so
+    the sources can be dropped in wherever a VideoCapture is used.
+    """
+    
+    def __init__(self, fps=30.0, width=640, height=480):
+        """
+        Initialize the source.
+        
+        Args:
+            fps: Delivery rate in frames per second (0 for as fast as possible)
+            width: Frame width reported through get()
+            height: Frame height reported through get()
+        """
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.clock = FrameClock(fps)
+        self.position = 0
+        self.opened = True
+    
+    def _next_frame(self):
+        """Produce the next frame, or None when the source is exhausted."""
+        raise NotImplementedError
+    
+    def frame_count(self):
+        """Number of frames in one pass over the source (-1 if unbounded)."""
+        return -1
+    
+    def isOpened(self):
+        """Check whether the source can deliver frames."""
+        return self.opened
+    
+    def read(self):
+        """Get the next frame as (success, frame)."""
+        if not self.opened:
+            return False, None
+        
+        frame = self._next_frame()
+        if frame is None:
+            return False, None
+        
+        self.clock.wait()
+        self.position += 1
+        return True, frame
+    
+    def grab(self):
+        """Advance one frame without returning it."""
+        success, _ = self.read()
+        return success
+    
+    def get(self, prop):
+        """Query a capture property (the subset sources can answer)."""
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count())
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+    
+    def set(self, prop, value):
+        """Virtual sources have a fixed format, so properties cannot be changed."""
+        return False
+    
+    def release(self):
+        """Stop delivering frames."""
+        self.opened = False
+
+class VideoFileSource(VirtualSource):
+    """Video file played at a fixed rate, optionally looping forever."""
+    
+    def __init__(self, path, fps=None, loop=False):
+        """
+        Initialize the source.
+        
+        Args:
+            path: Video file path
+            fps: Delivery rate (defaults to the rate stored in the file)
+            loop: Restart from the first frame at the end of the file
+        """
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        
+        native_fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(native_fps if fps is None else fps,
+                         int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                         int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.opened = self.capture.isOpened()
+    
+    def frame_count(self):
+        return int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    
+    def _next_frame(self):
+        success, frame = self.capture.read()
+        if not success and self.loop:
+            # Seeking back is cheaper than reopening the container
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.capture.read()
+        return frame if success else None
+    
+    def release(self):
+        super().release()
+        self.capture.release()
+
+class ImageSequenceSource(VirtualSource):
+    """Directory of still images played in filename order."""
+    
+    def __init__(self, directory, fps=10.0, loop=True):
+        """
+        Initialize the source.
+        
+        Args:
+            directory: Directory containing the images
+            fps: Delivery rate in frames per second
+            loop: Restart from the first image after the last one
+        """
+        self.loop = loop
+        self.paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                      if name.lower().endswith(IMAGE_EXTENSIONS)] if os.path.isdir(directory) else []
+        
+        first = cv2.imread(self.paths[0]) if self.paths else None
+        height, width = first.shape[:2] if first is not None else (0, 0)
+        super().__init__(fps, width, height)
+        self.opened = first is not None
+        self.index = 0
+    
+    def frame_count(self):
+        return len(self.paths)
+    
+    def _next_frame(self):
+        # Skip unreadable files rather than ending the stream on them
+        for _ in range(len(self.paths)):
+            if self.index >= len(self.paths):
+                if not self.loop:
+                    return None
+                self.index = 0
+            
+            frame = cv2.imread(self.paths[self.index])
+            self.index += 1
+            if frame is not None:
+                return frame
+        return None
+
+class MemorySource(VirtualSource):
+    """
+    Frames decoded once up front and replayed from memory.
+    
+    Removes decoding from the measurement entirely, so benchmarks see only the
+    cost of the pipeline downstream of capture.
+    """
+    
+    def __init__(self, frames, fps=30.0, loop=True):
+        """
+        Initialize the source.
+        
+        Args:
+            frames: Non-empty list of BGR frames
+            fps: Delivery rate (0 for as fast as possible)
+            loop: Restart from the first frame after the last one
+        """
+        self.frames = frames
+        self.loop = loop
+        height, width = frames[0].shape[:2] if frames else (0, 0)
+        super().__init__(fps, width, height)
+        self.opened = bool(frames)
+        self.index = 0
+    
+    @classmethod
+    def from_video(cls, path, max_frames=300, fps=None, loop=True, max_bytes=MAX_MEMORY_BYTES):
+        """
+        Decode up to max_frames frames of a video file into memory.
+        
+        Args:
+            path: Video file path
+            max_frames: Frame limit, bounding memory use
+            fps: Delivery rate (defaults to the rate stored in the file)
+            loop: Restart from the first frame after the last one
+            max_bytes: Decoding stops before the frames would exceed this many bytes
+        """
+        capture = cv2.VideoCapture(path)
+        native_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frames = []
+        size = 0
+        while len(frames) < max_frames:
+            success, frame = capture.read()
+            if not success:
+                break
+            size += frame.nbytes
+            if size > max_bytes:
+                print(f"Memory source {path} stopped at {len(frames)} frames ({max_bytes} byte limit)")
+                break
+            frames.append(frame)
+        capture.release()
+        return cls(frames, native_fps if fps is None else fps, loop)
+    
+    def frame_count(self):
+        return len(self.frames)
+    
+    def _next_frame(self):
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return None
+            self.index = 0
+        
+        frame = self.frames[self.index]
+        self.index += 1
+        # Consumers draw overlays in place, so hand out a copy
+        return frame.copy()
+
+class SyntheticSource(VirtualSource):
+    """Generated test patterns that need no input files at all."""
+    
+    PATTERNS = ('bars', 'gradient', 'noise', 'motion')
+    
+    # BGR colour bars (white, yellow, cyan, green, magenta, red, blue, black)
+    BAR_COLOURS = np.array([
+        [255, 255, 255], [0, 255, 255], [255, 255, 0], [0, 255, 0],
+        [255, 0, 255], [0, 0, 255], [255, 0, 0], [0, 0, 0]
+    ], dtype=np.uint8)
+    
+    def __init__(self, pattern='bars', fps=30.0, width=640, height=480, seed=0, frames=-1):
+        """
+        Initialize the source.
+        
+        Args:
+            pattern: One of PATTERNS
+            fps: Delivery rate (0 for as fast as possible)
+            width: Frame width
+            height: Frame height
+            seed: Random seed for the noise pattern, for repeatable runs
+            frames: Number of frames before the source ends (-1 for unbounded)
+        """
+        if pattern not in self.PATTERNS:
+            raise ValueError(f"Unknown synthetic pattern: {pattern}")
+        
+        super().__init__(fps, width, height)
+        self.pattern = pattern
+        self.limit = frames
+        self.rng = np.random.default_rng(seed)
+        
+        # Static parts of each pattern are rendered once
+        if pattern == 'bars':
+            columns = np.arange(width) * len(self.BAR_COLOURS) // width
+            self.base = np.ascontiguousarray(np.broadcast_to(self.BAR_COLOURS[columns], (height, width, 3)))
+        elif pattern == 'gradient':
+            ramp = np.linspace(0, 255, width, dtype=np.uint8)
+            self.base = np.ascontiguousarray(np.broadcast_to(ramp[None, :, None], (height, width, 3)))
+        else:
+            self.base = np.zeros((height, width, 3), dtype=np.uint8)
+    
+    def frame_count(self):
+        return self.limit
+    
+    def _next_frame(self):
+        if 0 <= self.limit <= self.position:
+            return None
+        
+        if self.pattern == 'noise':
+            frame = self.rng.integers(0, 256, self.base.shape, dtype=np.uint8)
+        elif self.pattern == 'gradient':
+            # Scroll the ramp so consecutive frames differ
+            frame = np.roll(self.base, self.position * 4, axis=1)
+        else:
+            frame = self.base.copy()
+        
+        if self.pattern in ('bars', 'motion'):
+            # A box bouncing across the frame gives the stream visible motion
+            size = max(8, min(self.width, self.height) // 6)
+            span_x = max(1, self.width - size)
+            span_y = max(1, self.height - size)
+            x = abs((self.position * 7) % (2 * span_x) - span_x)
+            y = abs((self.position * 5) % (2 * span_y) - span_y)
+            cv2.rectangle(frame, (x, y), (x + size, y + size), (40, 40, 220), -1)
+        
+        cv2.putText(frame, str(self.position), (10, self.height - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        return frame
+
+def _query_value(query, name, default, cast, minimum=None, maximum=None):
+    """Read one typed query parameter, optionally bounded to [minimum, maximum]."""
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = cast(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}: {values[0]}")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def _flag(value):
+    """Parse a boolean query parameter."""
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def parse_source(source):
+    """
+    Parse and validate a virtual source URL without opening it.
+    
+    Args:
+        source: Device index, digit string or URL
+    
+    Returns:
+        (scheme, target, options): scheme is None for anything handed to
+            cv2.VideoCapture as is; target is the pattern or path
+    
+    Raises:
+        ValueError: If a parameter is malformed or outside its bounds
+            (memory frames up to MAX_MEMORY_FRAMES, synthetic sizes up to MAX_SIZE)
+    """
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return None, int(source), {}
+    
+    parsed = urllib.parse.urlsplit(source)
+    scheme = parsed.scheme.lower()
+    if scheme not in ('file', 'loop', 'memory', 'images', 'synthetic'):
+        return None, source, {}
+    
+    query = urllib.parse.parse_qs(parsed.query)
+    fps = _query_value(query, 'fps', None, float)
+    if fps is not None and not np.isfinite(fps):
+        raise ValueError(f"Invalid value for fps: {fps}")
+    
+    if scheme == 'synthetic':
+        pattern = parsed.netloc or parsed.path.strip('/') or 'bars'
+        if pattern not in SyntheticSource.PATTERNS:
+            raise ValueError(f"Unknown synthetic pattern: {pattern}")
+        return scheme, pattern, {
+            'fps': 30.0 if fps is None else fps,
+            'width': _query_value(query, 'width', 640, int, MIN_SIZE[0], MAX_SIZE[0]),
+            'height': _query_value(query, 'height', 480, int, MIN_SIZE[1], MAX_SIZE[1]),
+            'seed': _query_value(query, 'seed', 0, int),
+            'frames': _query_value(query, 'frames', -1, int)
+        }
+    
+    # Both file:///abs/path and file://relative/path forms are accepted
+    path = urllib.parse.unquote(parsed.netloc + parsed.path)
+    
+    if scheme in ('file', 'loop'):
+        return scheme, path, {'fps': fps}
+    if scheme == 'memory':
+        return scheme, path, {'max_frames': _query_value(query, 'frames', 300, int, 1, MAX_MEMORY_FRAMES),
+                              'fps': fps, 'loop': _query_value(query, 'loop', True, _flag)}
+    return scheme, path, {'fps': 10.0 if fps is None else fps, 'loop': _query_value(query, 'loop', True, _flag)}
+
+def open_source(source):
+    """
+    Open a camera source from a device index or URL.
+    
+    Besides anything cv2.VideoCapture accepts (device indexes, RTSP/HTTP URLs,
+    file paths), these virtual schemes are supported:
+    
+    - file:///path/video.mp4?fps=25 - play a file once at a fixed rate
+    - loop:///path/video.mp4?fps=25 - play a file forever
+    - memory:///path/video.mp4?frames=300&fps=0 - pre-decode and replay from RAM
+      (at most MAX_MEMORY_FRAMES frames)
+    - images:///path/to/dir?fps=10&loop=1 - image directory in filename order
+    - synthetic://bars?fps=30&width=640&height=480 - generated pattern
+      (bars, gradient, noise or motion; noise takes a seed; at most 3840x2160)
+    
+    fps defaults to the file's own rate (30 for synthetic sources) and fps=0
+    delivers frames as fast as they are read.
+    
+    Args:
+        source: Device index, digit string or URL
+    
+    Returns:
+        capture: Object with the cv2.VideoCapture read/grab/get/set/release API
+    
+    Raises:
+        ValueError: If a virtual source URL is invalid (see parse_source)
+    """
+    scheme, target, options = parse_source(source)
+    
+    if scheme is None:
+        return cv2.VideoCapture(target)
+    if scheme == 'synthetic':
+        return SyntheticSource(pattern=target, **options)
+    if scheme == 'file':
+        return VideoFileSource(target, options['fps'], loop=False)
+    if scheme == 'loop':
+        return VideoFileSource(target, options['fps'], loop=True)
+    if scheme == 'memory':
+        return MemorySource.from_video(target, **options)
+    return ImageSequenceSource(target, **options)
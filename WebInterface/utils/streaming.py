@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+def encode_jpeg(frame, quality=95):
+    """
+    Encode a frame as JPEG bytes.
+    
+    Args:
+        frame: BGR image
+        quality: JPEG quality (0-100)
+    
+    Returns:
+        bytes: Encoded image, or None if encoding failed
+    """
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    return buffer.tobytes()
+
+def scale_to_width(frame, width):
+    """
+    Downscale a frame to a maximum width, keeping its aspect ratio.
+    
+    Args:
+        frame: BGR image
+        width: Maximum width in pixels (None keeps the frame as is)
+    
+    Returns:
+        frame: The scaled frame (the input itself if it is already narrow enough)
+    """
+    height, frame_width = frame.shape[:2]
+    if width is None or frame_width <= width:
+        return frame
+    return cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+
+def mjpeg_part(jpeg_bytes, timestamp=None):
+    """
+    Wrap JPEG bytes as one part of a multipart/x-mixed-replace stream.
+    
+    Args:
+        jpeg_bytes: Encoded image
+        timestamp: Optional capture time (epoch seconds), sent as X-Capture-Time
+            so clients can measure end-to-end latency
+    """
+    headers = b'Content-Type: image/jpeg\r\nContent-Length: ' + str(len(jpeg_bytes)).encode() + b'\r\n'
+    if timestamp is not None:
+        headers += b'X-Capture-Time: ' + f'{timestamp:.6f}'.encode() + b'\r\n'
+    return b'--frame\r\n' + headers + b'\r\n' + jpeg_bytes + b'\r\n'
+
+def encode_frame(frame, quality=95, timestamp=None):
+    """Encode a frame straight into an MJPEG stream part."""
+    return mjpeg_part(encode_jpeg(frame, quality) or b'', timestamp)
+
+class FramePacket:
+    """
+    One encoded frame as published to viewers.
+    
+    The JPEG is encoded once and shared by every viewer of a stream; the MJPEG
+    part is built on first use, so WebSocket-only streams never pay for it.
+    """
+    
+    def __init__(self, jpeg, timestamp=None, meta=None, image=None):
+        """
+        Args:
+            jpeg: Encoded JPEG bytes (None for unencoded packets)
+            timestamp: Capture time (epoch seconds)
+            meta: Detection metadata sent alongside the frame (JSON-serializable dict)
+            image: Unencoded BGR frame, for consumers that compose frames themselves
+        """
+        self.jpeg = jpeg
+        self.timestamp = timestamp
+        self.meta = meta or {}
+        self.image = image
+        self._mjpeg = None
+    
+    @property
+    def mjpeg(self):
+        """The frame as one multipart/x-mixed-replace part."""
+        if self._mjpeg is None:
+            self._mjpeg = mjpeg_part(self.jpeg, self.timestamp)
+        return self._mjpeg
+
+def message_frame(message, width=640, height=480, position=(50, 240), scale=1.0):
+    """
+    Create a black frame with a red status message (camera errors, etc.).
+    
+    Returns:
+        frame: BGR image
+    """
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.putText(frame, message, position, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 255), 2)
+    return frame
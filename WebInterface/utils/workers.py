@@ -0,0 +1,699 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+from multiprocessing.connection import Listener
+
+import cv2
+import numpy as np
+
+from .hub import run_blocking
+from .metrics import metrics
+from .sources import open_source
+from .streaming import encode_jpeg, message_frame
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'camera_worker.py')
+
+# Environment variable passing the connection key to worker processes (kept off the command line)
+AUTHKEY_VARIABLE = 'VIGILEYEX_WORKER_KEY'
+
+STATE_SEVERITY = {'MONITORING': 0, 'WARNING': 1, 'ALERT': 2}
+
+def decode_jpeg(data):
+    """Decode JPEG bytes into a BGR frame (None if invalid)."""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+class WorkerHandle:
+    """Supervisor-side state of one worker process."""
+    
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.connection = None
+        self.send_lock = threading.Lock()
+        self.generation = 0
+        self.started_at = 0.0
+        self.last_heartbeat = 0.0
+        self.ready = False
+        self.model = None
+        self.restarts = 0
+        self.load = 0.0
+    
+    def send(self, *message):
+        """Send a command; False if the worker is not connected."""
+        with self.send_lock:
+            if self.connection is None:
+                return False
+            try:
+                self.connection.send(message)
+                return True
+            except (OSError, ValueError):
+                return False
+
+class CameraSupervisor:
+    """
+    Shards registered cameras across local worker processes.
+    
+    One Python process cannot decode and analyze dozens of cameras: every
+    camera shares one GIL and one TensorFlow thread pool. The supervisor
+    starts `workers` processes (camera_worker.py), each loading its own model
+    and running capture, detection and incident assembly for the cameras it
+    owns, with `threads` TensorFlow threads so the workers do not fight over
+    cores. Workers talk to the web process over a local authenticated
+    connection: they send heartbeats with per-camera load, annotated JPEG
+    frames of cameras that have viewers, and finished incidents, which the
+    web process records like its own.
+    
+    A camera's load is the fraction of wall time its worker spends analyzing
+    it. New cameras go to the least-loaded ready worker; a worker that exits,
+    disconnects or stops sending heartbeats is restarted and its cameras move
+    to the other workers; a worker whose load exceeds max_load hands one
+    camera per rebalance_interval to a worker that has room for it.
+    """
+    
+    def __init__(self, workers=2, threads=1, stream_fps=15.0, max_load=0.9, heartbeat_timeout=15.0,
+                 startup_timeout=180.0, rebalance_interval=10.0, move_cooldown=60.0,
+                 on_incident=None, start_task=None, worker_args=None):
+        """
+        Initialize the supervisor (start() launches the workers).
+        
+        Args:
+            workers: Number of worker processes
+            threads: TensorFlow threads per worker
+            stream_fps: Frames per second a worker sends of each watched camera
+            max_load: Worker load (busy fraction, summed over its cameras) treated as overloaded
+            heartbeat_timeout: Seconds without a heartbeat before a ready worker is restarted
+            startup_timeout: Seconds a starting worker may take to load its model
+            rebalance_interval: Seconds between overload checks
+            move_cooldown: Seconds before a moved camera can be moved again
+            on_incident: Callable(camera_id, event) recording a finished incident
+            start_task: Callable(target, *args) starting a background task (socketio.start_background_task)
+            worker_args: Extra command line arguments for camera_worker.py
+        """
+        self.workers = [WorkerHandle(worker_id) for worker_id in range(workers)]
+        self.threads = threads
+        self.stream_fps = stream_fps
+        self.max_load = max_load
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.rebalance_interval = rebalance_interval
+        self.move_cooldown = move_cooldown
+        self.on_incident = on_incident
+        self.start_task = start_task or (lambda target, *args: threading.Thread(target=target, args=args, daemon=True).start())
+        self.worker_args = list(worker_args or [])
+        
+        # Camera id -> source URL, owning worker id, measured load, last move time
+        self.sources = {}
+        self.assignments = {}
+        self.costs = {}
+        self.moved_at = {}
+        # Camera id -> latest heartbeat statistics
+        self.stats = {}
+        self.watched = set()
+        self.lock = threading.RLock()
+        
+        # Latest frame of each watched camera: camera id -> (sequence, jpeg, meta)
+        self.frames = {}
+        self.frame_sequence = 0
+        self.frame_condition = threading.Condition()
+        
+        self.listener = None
+        self.authkey = os.urandom(32)
+        self.running = False
+    
+    def start(self):
+        """Start the worker processes and the supervision tasks (once)."""
+        with self.lock:
+            if self.running:
+                return
+            self._start()
+    
+    def _start(self):
+        """Start the worker processes and the supervision tasks."""
+        self.listener = Listener(authkey=self.authkey)
+        self.running = True
+        self.start_task(self._accept)
+        for handle in self.workers:
+            self._spawn(handle)
+        self.start_task(self._monitor)
+        print(f"Camera supervisor started {len(self.workers)} workers")
+    
+    def stop(self):
+        """Stop every worker."""
+        self.running = False
+        for handle in self.workers:
+            handle.send('stop')
+            if handle.process is not None:
+                try:
+                    handle.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    handle.process.kill()
+        if self.listener is not None:
+            self.listener.close()
+    
+    def _spawn(self, handle):
+        """Start (or restart) the process of a worker."""
+        handle.generation += 1
+        handle.connection = None
+        handle.ready = False
+        handle.started_at = time.time()
+        handle.last_heartbeat = 0.0
+        env = dict(os.environ, **{AUTHKEY_VARIABLE: self.authkey.hex()})
+        command = [sys.executable, WORKER_SCRIPT, '--connect', str(self.listener.address),
+                   '--worker-id', str(handle.worker_id), '--threads', str(self.threads),
+                   '--stream-fps', str(self.stream_fps)] + self.worker_args
+        handle.process = subprocess.Popen(command, env=env)
+        print(f"Camera worker {handle.worker_id} started (pid {handle.process.pid})")
+    
+    def _accept(self):
+        """Accept worker connections and start a reader for each."""
+        while self.running:
+            try:
+                connection = run_blocking(self.listener.accept)
+                worker_id, pid = run_blocking(connection.recv)[1:]
+            except Exception as e:
+                if self.running:
+                    print(f"Rejected worker connection: {e}")
+                continue
+            
+            handle = self.workers[worker_id]
+            if handle.process is None or handle.process.pid != pid:
+                # A worker that was already replaced
+                connection.close()
+                continue
+            with handle.send_lock:
+                handle.connection = connection
+            # Cameras assigned while the worker was starting
+            with self.lock:
+                for camera_id, owner in self.assignments.items():
+                    if owner == worker_id:
+                        handle.send('add', camera_id, self.sources[camera_id])
+                        if camera_id in self.watched:
+                            handle.send('watch', camera_id, True)
+            self.start_task(self._read, handle, connection, handle.generation)
+    
+    def _read(self, handle, connection, generation):
+        """Handle the messages of one worker connection until it closes."""
+        while True:
+            try:
+                message = run_blocking(connection.recv)
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == 'frame':
+                camera_id, jpeg, meta = message[1:]
+                if self.assignments.get(camera_id) == handle.worker_id:
+                    with self.frame_condition:
+                        self.frame_sequence += 1
+                        self.frames[camera_id] = (self.frame_sequence, jpeg, meta)
+                        self.frame_condition.notify_all()
+            elif kind == 'heartbeat':
+                self._heartbeat(handle, message[1])
+            elif kind == 'incident':
+                camera_id, event = message[1:]
+                if self.on_incident is not None:
+                    self.start_task(self.on_incident, camera_id, event)
+            elif kind == 'ready':
+                handle.ready = True
+                handle.model = message[1]
+                handle.last_heartbeat = time.time()
+                print(f"Camera worker {handle.worker_id} ready (model {handle.model})")
+        
+        if handle.generation == generation:
+            with handle.send_lock:
+                handle.connection = None
+    
+    def _heartbeat(self, handle, cameras):
+        """Store a worker's per-camera statistics and forward its frame counters to the metrics."""
+        handle.last_heartbeat = time.time()
+        with self.lock:
+            for camera_id, stats in cameras.items():
+                if self.assignments.get(camera_id) != handle.worker_id:
+                    continue
+                self.stats[camera_id] = stats
+                self.costs[camera_id] = stats['load']
+                metrics.frames_total.inc(stats['frames'], camera=camera_id)
+                metrics.frames_processed_total.inc(stats['analyzed'], camera=camera_id)
+                metrics.frames_skipped_total.inc(stats.get('skipped', 0), camera=camera_id)
+                for reason, count in stats['dropped'].items():
+                    metrics.frames_dropped_total.inc(count, camera=camera_id, reason=reason)
+            handle.load = self._load(handle.worker_id)
+        metrics.worker_load.set(round(handle.load, 3), worker=str(handle.worker_id))
+    
+    def _load(self, worker_id):
+        """Summed load of the cameras assigned to a worker."""
+        known = list(self.costs.values())
+        default = sum(known) / len(known) if known else 0.0
+        return sum(self.costs.get(camera_id, default)
+                   for camera_id, owner in self.assignments.items() if owner == worker_id)
+    
+    def _least_loaded(self, exclude=None):
+        """Worker for a camera: the least-loaded ready one, else the least-loaded running one."""
+        candidates = [handle for handle in self.workers if handle.worker_id != exclude]
+        ready = [handle for handle in candidates if handle.ready and handle.connection is not None]
+        candidates = ready or candidates
+        if not candidates:
+            return None
+        return min(candidates, key=lambda handle: (
+            self._load(handle.worker_id),
+            sum(1 for owner in self.assignments.values() if owner == handle.worker_id)
+        ))
+    
+    def owns(self, camera_id):
+        """Whether a camera runs in a worker process."""
+        return camera_id in self.sources
+    
+    def add_camera(self, camera_id, source):
+        """
+        Start a camera on the least-loaded worker.
+        
+        The workers are started on the first camera if start() has not been
+        called, so entry points other than `python app.py` (e.g. a WSGI
+        server) still run them.
+        
+        Args:
+            camera_id: Registered camera id
+            source: Camera URL (anything open_source accepts)
+        """
+        with self.lock:
+            if not self.running:
+                self._start()
+            self.sources[camera_id] = source
+            self._assign(camera_id, self._least_loaded())
+    
+    def remove_camera(self, camera_id):
+        """Stop a camera in its worker."""
+        with self.lock:
+            self.sources.pop(camera_id, None)
+            self.costs.pop(camera_id, None)
+            self.stats.pop(camera_id, None)
+            worker_id = self.assignments.pop(camera_id, None)
+            if worker_id is not None:
+                self.workers[worker_id].send('remove', camera_id)
+    
+    def _assign(self, camera_id, handle, reason=None):
+        """Hand a camera to a worker (it is stopped on its previous worker first)."""
+        previous = self.assignments.get(camera_id)
+        if previous is not None and previous != handle.worker_id:
+            self.workers[previous].send('remove', camera_id)
+        self.assignments[camera_id] = handle.worker_id
+        handle.send('add', camera_id, self.sources[camera_id])
+        if camera_id in self.watched:
+            handle.send('watch', camera_id, True)
+        if reason is not None:
+            self.moved_at[camera_id] = time.time()
+            metrics.camera_moves_total.inc(reason=reason)
+            print(f"Camera {camera_id} moved from worker {previous} to worker {handle.worker_id} ({reason})")
+    
+    def watch(self, camera_id, watched):
+        """
+        Start or stop a worker sending a camera's frames (the camera has viewers).
+        
+        Args:
+            camera_id: Camera to stream
+            watched: True while the camera has viewers
+        """
+        with self.lock:
+            if watched:
+                self.watched.add(camera_id)
+            else:
+                self.watched.discard(camera_id)
+                with self.frame_condition:
+                    self.frames.pop(camera_id, None)
+            worker_id = self.assignments.get(camera_id)
+            if worker_id is not None:
+                self.workers[worker_id].send('watch', camera_id, watched)
+    
+    def next_frame(self, camera_id, seen=0, timeout=1.0):
+        """
+        Wait for a frame of a watched camera newer than the one last seen.
+        
+        Returns:
+            (sequence, jpeg, meta): jpeg is None if nothing newer arrived in time
+        """
+        with self.frame_condition:
+            sequence, jpeg, meta = self.frames.get(camera_id, (seen, None, None))
+            if sequence == seen:
+                self.frame_condition.wait(timeout)
+                sequence, jpeg, meta = self.frames.get(camera_id, (seen, None, None))
+            if sequence == seen:
+                return seen, None, None
+            return sequence, jpeg, meta
+    
+    def _monitor(self):
+        """Restart failed workers and move cameras off overloaded ones."""
+        last_rebalance = time.time()
+        while self.running:
+            time.sleep(1.0)
+            now = time.time()
+            for handle in self.workers:
+                reason = self._failure(handle, now)
+                if reason is not None:
+                    self._restart(handle, reason)
+            if now - last_rebalance >= self.rebalance_interval:
+                last_rebalance = now
+                with self.lock:
+                    self._rebalance(now)
+    
+    def _failure(self, handle, now):
+        """Why a worker must be restarted (None while it is healthy)."""
+        if handle.process is None:
+            return None
+        if handle.process.poll() is not None:
+            return f"exited with code {handle.process.returncode}"
+        if handle.ready and handle.connection is None:
+            return 'connection lost'
+        if handle.ready and now - handle.last_heartbeat > self.heartbeat_timeout:
+            return 'heartbeat timeout'
+        if not handle.ready and now - handle.started_at > self.startup_timeout:
+            return 'startup timeout'
+        return None
+    
+    def _restart(self, handle, reason):
+        """Replace a failed worker and move its cameras to the healthy ones."""
+        print(f"Camera worker {handle.worker_id} failed ({reason}), restarting")
+        metrics.worker_restarts_total.inc(worker=str(handle.worker_id))
+        handle.restarts += 1
+        if handle.process.poll() is None:
+            handle.process.kill()
+            handle.process.wait()
+        
+        with self.lock:
+            self._spawn(handle)
+            for camera_id, owner in list(self.assignments.items()):
+                if owner != handle.worker_id:
+                    continue
+                target = self._least_loaded(exclude=handle.worker_id)
+                if target is not None and target.ready:
+                    self._assign(camera_id, target, reason='worker_failed')
+                # Otherwise the camera stays with the replacement, which gets it once connected
+    
+    def _rebalance(self, now):
+        """Move one camera from the most overloaded worker to one with room for it."""
+        loads = {handle.worker_id: self._load(handle.worker_id) for handle in self.workers}
+        for source in sorted(self.workers, key=lambda handle: -loads[handle.worker_id]):
+            if loads[source.worker_id] <= self.max_load:
+                return
+            cameras = sorted((self.costs.get(camera_id, 0.0), camera_id)
+                             for camera_id, owner in self.assignments.items()
+                             if owner == source.worker_id and now - self.moved_at.get(camera_id, 0) >= self.move_cooldown)
+            for cost, camera_id in cameras:
+                targets = [handle for handle in self.workers
+                           if handle is not source and handle.ready and handle.connection is not None
+                           and loads[handle.worker_id] + cost <= self.max_load]
+                if targets:
+                    target = min(targets, key=lambda handle: loads[handle.worker_id])
+                    self._assign(camera_id, target, reason='overloaded')
+                    return
+    
+    def states(self):
+        """Latest detection state of every worker camera."""
+        with self.lock:
+            return {camera_id: stats.get('state', 'MONITORING') for camera_id, stats in self.stats.items()}
+    
+    def status(self):
+        """Workers, their cameras and load, for /api/workers."""
+        with self.lock:
+            workers = []
+            for handle in self.workers:
+                cameras = {camera_id: self.stats.get(camera_id, {})
+                           for camera_id, owner in self.assignments.items() if owner == handle.worker_id}
+                workers.append({
+                    'id': handle.worker_id,
+                    'pid': handle.process.pid if handle.process is not None else None,
+                    'ready': handle.ready,
+                    'connected': handle.connection is not None,
+                    'model': handle.model,
+                    'load': round(self._load(handle.worker_id), 3),
+                    'restarts': handle.restarts,
+                    'cameras': {camera_id: {key: value for key, value in stats.items()
+                                            if key not in ('frames', 'analyzed', 'skipped', 'dropped')}
+                                for camera_id, stats in cameras.items()}
+                })
+            return {'workers': workers, 'threads_per_worker': self.threads, 'max_load': self.max_load}
+
+class CameraShard:
+    """
+    Worker-process side: runs the cameras the supervisor assigned to this process.
+    
+    Each camera gets a thread running the same loop as the server's own
+    camera producer (analyze every analyze_every-th frame, collect frames
+    and faces while the camera is in ALERT, report the incident when it
+    ends). Results go back over the supervisor connection; frames only for
+    cameras that have viewers, at most stream_fps per camera.
+    """
+    
+    def __init__(self, connection, worker_id, detector, stream_fps=15.0, analyze_every=2,
+                 max_incident_frames=30, face_sample_interval=10, heartbeat_interval=1.0):
+        """
+        Initialize the shard.
+        
+        Args:
+            connection: multiprocessing Connection to the supervisor
+            worker_id: Index of this worker
+            detector: ViolenceDetector (or SequenceViolenceDetector) of this process
+            stream_fps: Frames per second sent of each watched camera
+            analyze_every: Run the detector on every n-th frame
+            max_incident_frames: Frames kept per incident to pick its image
+            face_sample_interval: Look for faces in every n-th incident frame
+            heartbeat_interval: Seconds between heartbeats
+        """
+        self.connection = connection
+        self.worker_id = worker_id
+        self.detector = detector
+        self.stream_fps = stream_fps
+        self.analyze_every = analyze_every
+        self.max_incident_frames = max_incident_frames
+        self.face_sample_interval = face_sample_interval
+        self.heartbeat_interval = heartbeat_interval
+        
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        # Camera id -> {'stop', 'thread', 'watched', counters}
+        self.cameras = {}
+    
+    def send(self, *message):
+        """Send a message to the supervisor (False once the connection is gone)."""
+        with self.send_lock:
+            try:
+                self.connection.send(message)
+                return True
+            except (OSError, ValueError):
+                return False
+    
+    def run(self):
+        """Handle supervisor commands until told to stop or disconnected."""
+        self.send('ready', self.detector.model_name)
+        threading.Thread(target=self._heartbeats, daemon=True).start()
+        while True:
+            try:
+                command = self.connection.recv()
+            except (EOFError, OSError):
+                # The web process is gone
+                break
+            kind = command[0]
+            if kind == 'add':
+                self.add(*command[1:])
+            elif kind == 'remove':
+                self.remove(command[1])
+            elif kind == 'watch':
+                with self.lock:
+                    camera = self.cameras.get(command[1])
+                    if camera is not None:
+                        camera['watched'] = command[2]
+            elif kind == 'stop':
+                break
+        
+        for camera_id in list(self.cameras):
+            self.remove(camera_id)
+    
+    def add(self, camera_id, source):
+        """Start a camera's thread."""
+        with self.lock:
+            if camera_id in self.cameras:
+                return
+            camera = self.cameras[camera_id] = {
+                'stop': threading.Event(), 'watched': False, 'frames': 0, 'analyzed': 0,
+                'skipped': 0, 'dropped': {}, 'busy': 0.0, 'error': None, 'tokens': 2.0, 'token_time': time.perf_counter()
+            }
+        camera['thread'] = threading.Thread(target=self._run_camera, args=(camera_id, source, camera), daemon=True)
+        camera['thread'].start()
+        print(f"Worker {self.worker_id}: started {camera_id}")
+    
+    def remove(self, camera_id):
+        """Stop a camera; an incident in progress is reported first."""
+        with self.lock:
+            camera = self.cameras.pop(camera_id, None)
+        if camera is not None:
+            camera['stop'].set()
+            camera['thread'].join(timeout=10)
+            print(f"Worker {self.worker_id}: stopped {camera_id}")
+    
+    def _heartbeats(self):
+        """Report per-camera counters and load every heartbeat_interval."""
+        last = time.perf_counter()
+        while True:
+            time.sleep(self.heartbeat_interval)
+            now = time.perf_counter()
+            elapsed = now - last
+            last = now
+            # Take and reset the counters in one step under the lock the camera
+            # threads count under, so no frame is lost or counted twice
+            with self.lock:
+                counters = {}
+                for camera_id, camera in self.cameras.items():
+                    counters[camera_id] = {key: camera[key] for key in ('frames', 'analyzed', 'skipped', 'dropped', 'busy', 'error')}
+                    camera.update(frames=0, analyzed=0, skipped=0, dropped={}, busy=0.0)
+            
+            cameras = {}
+            for camera_id, counter in counters.items():
+                cameras[camera_id] = {
+                    'frames': counter['frames'],
+                    'analyzed': counter['analyzed'],
+                    'skipped': counter['skipped'],
+                    'dropped': counter['dropped'],
+                    'fps': round(counter['frames'] / elapsed, 1),
+                    'analyzed_fps': round(counter['analyzed'] / elapsed, 1),
+                    'load': round(counter['busy'] / elapsed, 3),
+                    'state': self.detector.smoother.get_state(camera_id),
+                    'confidence': round(self.detector.smoother.get_confidence(camera_id), 3),
+                    'error': counter['error']
+                }
+            if not self.send('heartbeat', cameras):
+                return
+    
+    def _count(self, camera, key, amount=1):
+        """Add to one of a camera's heartbeat counters."""
+        with self.lock:
+            camera[key] += amount
+    
+    def _drop(self, camera, reason):
+        """Count a frame that was lost before it could be analyzed."""
+        with self.lock:
+            camera['dropped'][reason] = camera['dropped'].get(reason, 0) + 1
+    
+    def _send_frame(self, camera_id, camera, frame, meta):
+        """Send a watched camera's frame unless that exceeds stream_fps."""
+        if not camera['watched']:
+            return
+        if self.stream_fps > 0:
+            # Token bucket: frames often come in pairs (an analyzed one, then one read
+            # right after), so allow a burst of two and limit the average rate
+            now = time.perf_counter()
+            camera['tokens'] = min(2.0, camera['tokens'] + (now - camera['token_time']) * self.stream_fps)
+            camera['token_time'] = now
+            if camera['tokens'] < 1:
+                return
+            camera['tokens'] -= 1
+        jpeg = encode_jpeg(frame)
+        if jpeg:
+            self.send('frame', camera_id, jpeg, meta)
+    
+    def _send_message(self, camera_id, camera, message):
+        """Send a status message frame (camera errors) to the viewers of a camera."""
+        camera['error'] = message
+        if camera['watched']:
+            self.send('frame', camera_id, encode_jpeg(message_frame(message)) or b'',
+                      {'camera_id': camera_id, 'message': message})
+    
+    def _run_camera(self, camera_id, source, camera):
+        """Capture and analyze one camera until it is removed."""
+        stop = camera['stop']
+        capture = None
+        incident = None
+        incident_frames = []
+        face_samples = []
+        frame_number = 0
+        prev_frame_time = 0
+        
+        try:
+            capture = open_source(source)
+            if not capture.isOpened():
+                while not stop.wait(1.0):
+                    self._send_message(camera_id, camera, "Camera failed to open")
+                return
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            
+            while not stop.is_set():
+                success, frame = capture.read()
+                if not success:
+                    self._drop(camera, 'read_failed')
+                    self._send_message(camera_id, camera, "Camera disconnected")
+                    stop.wait(1.0)
+                    continue
+                camera['error'] = None
+                self._count(camera, 'frames')
+                frame_number += 1
+                
+                current_time = time.time()
+                fps = 1 / (current_time - prev_frame_time) if prev_frame_time > 0 else 30
+                prev_frame_time = current_time
+                meta = {'camera_id': camera_id, 'frame': frame_number, 'timestamp': current_time,
+                        'analyzed': False, 'worker': self.worker_id}
+                
+                if frame_number % self.analyze_every:
+                    self._count(camera, 'skipped')
+                    self._send_frame(camera_id, camera, frame, meta)
+                    continue
+                
+                start = time.perf_counter()
+                try:
+                    processed_frame, is_violence = self.detector.process_frame(frame, camera_id)
+                except Exception as e:
+                    print(f"Worker {self.worker_id}: error processing frame of {camera_id}: {e}")
+                    processed_frame, is_violence = frame.copy(), False
+                self._count(camera, 'analyzed')
+                
+                if is_violence:
+                    if incident is None:
+                        incident = {'started_at': current_time, 'confidence': 0.0}
+                        incident_frames = []
+                        face_samples = []
+                    incident['confidence'] = max(incident['confidence'], self.detector.smoother.get_confidence(camera_id))
+                    if len(incident_frames) < self.max_incident_frames:
+                        incident_frames.append(frame.copy())
+                        if len(incident_frames) % self.face_sample_interval == 0:
+                            faces = self.detector.detect_faces(frame, camera_id)
+                            if faces:
+                                face_samples.append((frame.copy(), faces))
+                elif incident is not None:
+                    self._report(camera_id, incident, incident_frames, face_samples)
+                    incident = None
+                
+                cv2.putText(processed_frame, f"FPS: {int(fps)}",
+                            (processed_frame.shape[1] - 120, processed_frame.shape[0] - 20),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                meta.update(analyzed=True, state=self.detector.smoother.get_state(camera_id),
+                            confidence=round(self.detector.smoother.get_confidence(camera_id), 3))
+                self._send_frame(camera_id, camera, processed_frame, meta)
+                self._count(camera, 'busy', time.perf_counter() - start)
+        except Exception as e:
+            print(f"Worker {self.worker_id}: critical error on {camera_id}: {e}")
+            camera['error'] = str(e)[:100]
+        finally:
+            # Moved or removed mid-incident: report what was collected
+            if incident is not None and incident_frames:
+                self._report(camera_id, incident, incident_frames, face_samples)
+            if capture is not None:
+                try:
+                    capture.release()
+                except Exception:
+                    pass
+    
+    def _report(self, camera_id, incident, incident_frames, face_samples):
+        """Send a finished incident: its middle frame and the frames faces were found in."""
+        image = encode_jpeg(incident_frames[len(incident_frames) // 2])
+        event = {
+            'started_at': incident['started_at'],
+            'ended_at': time.time(),
+            'confidence': round(incident['confidence'], 3),
+            'frames': len(incident_frames),
+            'image': image,
+            'face_samples': [(encode_jpeg(frame), faces) for frame, faces in face_samples]
+        }
+        print(f"Worker {self.worker_id}: incident on {camera_id} with {len(incident_frames)} frames")
+        self.send('incident', camera_id, event)
@@ -0,0 +1,123 @@
+import time
+import threading
+
+from .metrics import metrics
+
+# Widths a client may request; requests snap down to one of these so viewers
+# share encodes (None is the camera's own resolution)
+STREAM_WIDTHS = (160, 320, 480, 640, None)
+
+def stream_width(requested):
+    """
+    Snap a client's requested maximum width to a shared stream width.
+    
+    Args:
+        requested: Maximum width in pixels (None or 0 for full resolution)
+    
+    Returns:
+        width: Largest entry of STREAM_WIDTHS not above the request (None for full resolution)
+    """
+    if not requested:
+        return None
+    fitting = [width for width in STREAM_WIDTHS if width is not None and width <= requested]
+    return fitting[-1] if fitting else STREAM_WIDTHS[0]
+
+class SocketFrameStream:
+    """
+    Pushes one camera's frames to one Socket.IO client as binary messages.
+    
+    Each message carries the frame's detection metadata and its JPEG bytes.
+    The client acknowledges every frame; at most window frames are in flight,
+    and while the window is full newer frames replace older ones in the hub
+    (latest wins), so a slow or backgrounded client only ever receives the
+    newest frame and never builds up a backlog. Glass-to-glass latency is thus
+    bounded by window frames plus the network round trip. max_fps caps the send
+    rate requested by the client. A client that stops acknowledging gets a new
+    window every ack_timeout seconds, so a lost ack cannot stall the stream.
+    """
+    
+    def __init__(self, hub, camera_id, key, emit, max_fps=15.0, window=2, ack_timeout=2.0):
+        """
+        Initialize the stream.
+        
+        Args:
+            hub: FrameHub the camera's frames are published to
+            camera_id: Camera to stream
+            key: Stream key to subscribe to, e.g. ('raw', 320)
+            emit: Callable(event, args, callback) sending one event to the client
+            max_fps: Maximum frames per second sent to the client
+            window: Maximum frames sent but not yet acknowledged
+            ack_timeout: Seconds to wait for an acknowledgement before reopening the window
+        """
+        self.hub = hub
+        self.camera_id = camera_id
+        self.key = key
+        self.emit = emit
+        self.max_fps = max_fps
+        self.window = window
+        self.ack_timeout = ack_timeout
+        
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.stopped = False
+        self.sent = 0
+        self.skipped = 0
+    
+    def run(self):
+        """Send frames until stop() is called or the camera's producer ends."""
+        self.hub.subscribe(self.camera_id, self.key)
+        try:
+            seen = 0
+            last_frame = None
+            last_sent = 0.0
+            while not self.stopped:
+                # Wait for the client to catch up; the hub keeps only the newest frame meanwhile
+                with self.condition:
+                    if self.in_flight >= self.window and not self.stopped:
+                        self.condition.wait(self.ack_timeout)
+                        if self.in_flight >= self.window:
+                            metrics.stream_ack_timeouts_total.inc(camera=self.camera_id)
+                            self.in_flight = 0
+                if self.stopped:
+                    break
+                
+                delay = last_sent + 1.0 / self.max_fps - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                
+                sequence, packet, running = self.hub.next_frame(self.camera_id, self.key, seen)
+                if packet is None:
+                    if not running:
+                        self.emit('stream_end', ({'camera_id': self.camera_id},), None)
+                        break
+                    continue
+                seen = sequence
+                
+                # Frames of this camera the client never saw (rate limit or backpressure)
+                frame_number = packet.meta.get('frame')
+                if frame_number is not None and last_frame is not None and frame_number > last_frame + 1:
+                    skipped = frame_number - last_frame - 1
+                    self.skipped += skipped
+                    metrics.stream_frames_skipped_total.inc(skipped, camera=self.camera_id, transport='websocket')
+                last_frame = frame_number
+                
+                with self.condition:
+                    self.in_flight += 1
+                last_sent = time.time()
+                self.emit('frame', (dict(packet.meta, sequence=sequence), packet.jpeg), self.ack)
+                self.sent += 1
+                metrics.stream_frames_sent_total.inc(camera=self.camera_id, transport='websocket')
+        finally:
+            self.hub.unsubscribe(self.camera_id, self.key)
+    
+    def ack(self, *args):
+        """Client acknowledged a frame."""
+        with self.condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.condition.notify()
+    
+    def stop(self):
+        """Stop sending after the current frame."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()